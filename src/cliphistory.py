@@ -0,0 +1,236 @@
+import collections
+import os
+import queue
+import shutil
+import threading
+import time
+import zlib
+
+from clipsync import unpack_formats
+
+SPILL_THRESHOLD = 1024 * 1024  # bytes, larger entries are kept on disk
+PREVIEW_LENGTH = 40
+
+
+def preview(formats):
+    """Short label for a clipboard content, for the history menu."""
+    text = formats.get('text/plain')
+    if text:
+        # Enough bytes for the first line, whatever the encoding of the rest
+        lines = str(text[:PREVIEW_LENGTH * 4], 'utf-8', errors='replace').strip().splitlines()
+        line = lines[0].strip() if lines else ''
+        return line if len(line) <= PREVIEW_LENGTH else line[:PREVIEW_LENGTH - 3] + '...'
+    if 'text/uri-list' in formats:
+        count = sum(1 for line in bytes(formats['text/uri-list']).splitlines() if line and not line.startswith(b'#'))
+        return f"{count} file{'s' if count != 1 else ''}"
+    if 'image/png' in formats:
+        return 'Image'
+    if 'text/html' in formats:
+        return 'HTML'
+    return ', '.join(formats)
+
+
+class HistoryEntry:
+    """One clipboard content, packed as by pack_formats(); payload is None
+    once it is on disk."""
+
+    def __init__(self, digest, layout, payload):
+        self.digest = digest
+        self.layout = layout
+        self.payload = payload
+        self.size = len(payload)
+        self.stored = self.size  # bytes counted against the history's limit
+        self.preview = preview(unpack_formats(layout, memoryview(payload)))
+        self.time = time.time()
+        self.path = None
+
+    def label(self):
+        for unit, scale in (('MB', 1024 ** 2), ('KB', 1024)):
+            if self.size >= scale:
+                return f'{self.preview}  ({self.size / scale:.1f} {unit})'
+        return f'{self.preview}  ({self.size} B)'
+
+
+class ClipboardHistory:
+    """Recent clipboard contents keyed by content hash, the least recently
+    used evicted first once there are over max_entries or over max_bytes.
+
+    Entries of spill_threshold bytes or more are written zlib compressed to
+    files in directory by a background thread, and from then on count
+    against max_bytes at their size on disk. load() reads them back on that
+    thread too. The files only live as long as the history: the directory
+    is emptied when it is created and on close().
+    """
+
+    def __init__(self, directory, max_entries=50, max_bytes=256 * 1024 * 1024, spill_threshold=SPILL_THRESHOLD):
+        self.directory = str(directory)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.spill_threshold = spill_threshold
+        self.total_bytes = 0
+        self._entries = collections.OrderedDict()  # digest -> entry, least recently used first
+        self._lock = threading.Lock()
+        self._spill_queue = queue.Queue()
+        self._spiller = None
+        # Left over from a run that did not get to close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def add(self, digest, layout, payload):
+        """Keep packed formats under digest, or mark it as just used if
+        already kept. The payload is kept as it is, not copied. Returns the
+        entry, or None if it is too large to keep."""
+        if self.max_entries <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                self._entries.move_to_end(digest)
+                entry.time = time.time()
+                return entry
+            entry = HistoryEntry(digest, layout, payload)
+            if entry.stored > self.max_bytes:
+                return None  # rather than evict everything else for it
+            self._entries[digest] = entry
+            self.total_bytes += entry.stored
+            self._evict()
+        if entry.size >= self.spill_threshold:
+            self._spill(entry)
+        return entry
+
+    def get(self, digest):
+        """(layout, payload) kept under digest, marking it as just used;
+        None if it is not kept (any more). Reads and decompresses an entry
+        on disk right here, use load() on the GUI thread."""
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            self._entries.move_to_end(digest)
+        return self._read(entry)
+
+    def load(self, digest, callback):
+        """Call callback with what get() returns. Entries in memory (and
+        misses) are answered right away; one on disk is read on the spill
+        thread, which calls callback from there."""
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                self._entries.move_to_end(digest)
+            on_disk = entry is not None and entry.payload is None
+        if not on_disk:
+            callback(None if entry is None else self._read(entry))
+            return
+        self._start_spiller()
+        self._spill_queue.put((entry, callback))
+
+    def __contains__(self, digest):
+        with self._lock:
+            return digest in self._entries
+
+    def _read(self, entry):
+        with self._lock:
+            payload, path, digest = entry.payload, entry.path, entry.digest
+        if payload is None:
+            try:
+                with open(path, 'rb') as f:
+                    payload = zlib.decompress(f.read())
+            except (OSError, zlib.error) as e:
+                # Evicted meanwhile, or the file is gone
+                print(f'Clipboard history entry {digest[:12]} unreadable: {e}')
+                with self._lock:
+                    if self._entries.get(digest) is entry:
+                        self._drop(digest)
+                return None
+        return entry.layout, payload
+
+    def entries(self):
+        """All entries, most recently used first."""
+        with self._lock:
+            return list(reversed(self._entries.values()))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.total_bytes,
+                'on_disk': sum(1 for entry in self._entries.values() if entry.path is not None),
+            }
+
+    def clear(self):
+        with self._lock:
+            for digest in list(self._entries):
+                self._drop(digest)
+
+    def close(self):
+        if self._spiller is not None:
+            self._spill_queue.put(None)
+            self._spiller.join()
+            self._spiller = None
+        self.clear()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _evict(self):
+        # Called with the lock held
+        while self._entries and (len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes):
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, digest):
+        # Called with the lock held
+        entry = self._entries.pop(digest)
+        self.total_bytes -= entry.stored
+        if entry.path is not None:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def _start_spiller(self):
+        if self._spiller is None:
+            self._spiller = threading.Thread(target=self._spill_loop, name='clipboard-history-spill', daemon=True)
+            self._spiller.start()
+
+    def _spill(self, entry):
+        self._start_spiller()
+        self._spill_queue.put(entry)
+
+    def _spill_loop(self):
+        # Compressing or decompressing tens of megabytes would stall the GUI thread
+        while True:
+            entry = self._spill_queue.get()
+            if entry is None:
+                return
+            if isinstance(entry, tuple):
+                entry, callback = entry
+                callback(self._read(entry))
+                continue
+            with self._lock:
+                if self._entries.get(entry.digest) is not entry:
+                    continue  # evicted while queued
+                payload = entry.payload
+            data = zlib.compress(payload, 1)
+            path = os.path.join(self.directory, entry.digest)
+            try:
+                # Clipboard contents may be private, like the config file: the
+                # file is only ever readable by us, and O_EXCL refuses a file
+                # or symlink someone else put there first
+                os.makedirs(self.directory, mode=0o700, exist_ok=True)
+                # makedirs leaves an existing directory as it is; this also
+                # fails on one owned by someone else
+                os.chmod(self.directory, 0o700)
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o600)
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+            except OSError as e:
+                print(f'Clipboard history kept in memory, cannot write {path}: {e}')
+                continue
+            with self._lock:
+                if self._entries.get(entry.digest) is not entry:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    continue
+                entry.path = path
+                entry.payload = None
+                self.total_bytes += len(data) - entry.stored
+                entry.stored = len(data)
@@ -0,0 +1,1120 @@
+import collections
+import ctypes
+import ctypes.util
+import hashlib
+import json
+import os
+import platform
+import shutil
+import socket
+import struct
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt6.QtCore import QBuffer, QIODevice, QMimeData, QObject, pyqtSignal
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
+MAGIC = b'LCS1'
+SALT_SIZE = 16
+NONCE_SIZE = 12
+KDF_ITERATIONS = 200_000
+PROTOCOL_VERSION = 5
+MAX_FRAME = 4 * 1024 * 1024
+HANDSHAKE_TIMEOUT = 5.0
+# A peer's writer sends a ping after HEARTBEAT_INTERVAL with nothing else to
+# send; a peer silent for HEARTBEAT_TIMEOUT is taken for dead and dropped
+HEARTBEAT_INTERVAL = 5.0
+HEARTBEAT_TIMEOUT = 15.0
+# Content up to STREAM_THRESHOLD goes in one message on the priority lane;
+# larger content is streamed in CHUNK_SIZE pieces on the bulk lane, so a
+# screenshot in flight does not hold up the next copied line of text
+STREAM_THRESHOLD = 64 * 1024
+CHUNK_SIZE = 256 * 1024
+# zlib runs at some 25 MiB/s, slower than a fast link: a stream has the
+# next COMPRESS_AHEAD chunks compressed on a pool while the current one is
+# sent, so the writer seldom waits for it
+COMPRESS_AHEAD = 3
+# Messages waiting on a peer's priority lane; a peer that lets more pile up
+# is not reading and is dropped
+MAX_QUEUED = 64
+# Clipboard formats that are synced, in the order they are read
+FORMATS = ('text/plain', 'text/html', 'text/uri-list', 'image/png')
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+# Offered in the hello, in order of preference; a peer uses the first both support
+COMPRESSIONS = ('zlib',)
+COMPRESS_THRESHOLD = 1024  # bytes, smaller payloads are sent as they are
+# A piece that zlib shrinks by less than this fraction is sent as it is, and
+# so is the rest of that content: PNG and other packed data never shrinks
+COMPRESS_MIN_SAVING = 0.1
+# Where Qt does not signal copies made in other apps, the clipboard is
+# checked this often instead; the slack lets it share wakeups with other tasks
+POLL_INTERVAL = 1.0
+POLL_SLACK = 0.5
+
+
+def derive_key(password, salt):
+    """AES-256 key from the shared clipboard password and a per-connection salt."""
+    kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=KDF_ITERATIONS)
+    return kdf.derive(password.encode('utf-8'))
+
+
+class Cipher:
+    """AES-GCM for one connection, the nonce prepended to the ciphertext.
+
+    The nonce is the sender's direction label followed by a count of the
+    messages it has sealed, and open() takes only the peer's label with the
+    next count. A message recorded on the connection can then be neither
+    replayed, reordered, dropped unnoticed nor reflected back at its sender.
+    Both sides share the key, so the labels keep their nonces apart.
+    """
+    SERVER = b'srv>'
+    CLIENT = b'cli>'
+
+    def __init__(self, key, server_side):
+        self._aead = AESGCM(key)
+        self._label, self._peer_label = (self.SERVER, self.CLIENT) if server_side else (self.CLIENT, self.SERVER)
+        self._sent = 0
+        self._received = 0
+
+    def seal(self, plaintext):
+        nonce = self._label + struct.pack('>Q', self._sent)
+        self._sent += 1
+        return nonce + self._aead.encrypt(nonce, plaintext, None)
+
+    def open(self, data):
+        expected = self._peer_label + struct.pack('>Q', self._received)
+        if data[:NONCE_SIZE] != expected:
+            raise PermissionError('Message out of order, replayed or reflected')
+        try:
+            plaintext = self._aead.decrypt(expected, data[NONCE_SIZE:], None)
+        except InvalidTag:
+            raise PermissionError('Message failed authentication, wrong clipboard password?') from None
+        self._received += 1
+        return plaintext
+
+
+def send_frame(sock, data):
+    sock.sendall(struct.pack('>I', len(data)) + data)
+
+
+def _recv_exact(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if not count:
+            raise ConnectionError('Connection closed by peer')
+        received += count
+    return bytes(buffer)
+
+
+def recv_frame(sock):
+    (size,) = struct.unpack('>I', _recv_exact(sock, 4))
+    if size > MAX_FRAME:
+        raise ValueError(f'Frame of {size} bytes exceeds {MAX_FRAME}')
+    return _recv_exact(sock, size)
+
+
+def encode_message(header, body=b''):
+    """A message is a JSON header followed by an opaque body."""
+    encoded = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    return struct.pack('>I', len(encoded)) + encoded + body
+
+
+def decode_message(data):
+    (size,) = struct.unpack('>I', data[:4])
+    return json.loads(data[4:4 + size]), data[4 + size:]
+
+
+def content_hash(layout, payload):
+    digest = hashlib.sha256()
+    for mime, data in unpack_formats(layout, memoryview(payload)).items():
+        digest.update(mime.encode('utf-8') + struct.pack('>Q', len(data)))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def pack_formats(formats):
+    """Formats dict -> ([[mime, size], ...], all data concatenated)."""
+    return [[mime, len(data)] for mime, data in formats.items()], b''.join(formats.values())
+
+
+def unpack_formats(layout, payload):
+    """The inverse of pack_formats(); given a memoryview of the payload the
+    formats are views into it rather than copies."""
+    formats = {}
+    offset = 0
+    for mime, size in layout:
+        formats[mime] = payload[offset:offset + size]
+        offset += size
+    if offset != len(payload):
+        raise ValueError('Clipboard payload does not match its format sizes')
+    return formats
+
+
+def _read_format(mime_data, mime):
+    if mime == 'text/plain':
+        return mime_data.text().encode('utf-8') if mime_data.hasText() and mime_data.text() else None
+    if mime == 'text/html':
+        return mime_data.html().encode('utf-8') if mime_data.hasHtml() else None
+    if mime == 'image/png' and not mime_data.hasFormat(mime):
+        if not mime_data.hasImage():
+            return None
+        # Only raw images (e.g. a screenshot tool's) need encoding here
+        buffer = QBuffer()
+        buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+        mime_data.imageData().save(buffer, 'PNG')
+        return bytes(buffer.data())
+    return bytes(mime_data.data(mime)) if mime_data.hasFormat(mime) else None
+
+
+def read_mime_data(mime_data, max_bytes):
+    """Syncable formats of mime_data as {mime: bytes}, and the mime types
+    left out for being over their limit in max_bytes."""
+    formats = {}
+    skipped = []
+    for mime in FORMATS:
+        if mime not in max_bytes:
+            continue
+        data = _read_format(mime_data, mime)
+        if data is None:
+            continue
+        if len(data) > max_bytes[mime]:
+            skipped.append(mime)
+            continue
+        formats[mime] = data
+    return formats, skipped
+
+
+def make_mime_data(formats):
+    mime_data = QMimeData()
+    for mime, data in formats.items():
+        if mime == 'text/plain':
+            mime_data.setText(str(data, 'utf-8', errors='replace'))
+        elif mime == 'text/html':
+            mime_data.setHtml(str(data, 'utf-8', errors='replace'))
+        elif mime == 'image/png':
+            from PyQt6.QtGui import QImage
+            # The decoded image for native image formats, the PNG as it came
+            # so reading it back hashes the same
+            mime_data.setImageData(QImage.fromData(data, 'PNG'))
+            mime_data.setData(mime, data)
+        else:
+            mime_data.setData(mime, data)
+    return mime_data
+
+
+def compress(encoding, body):
+    if encoding == 'zlib':
+        # Level 1: most of the gain on text at a fraction of the CPU time
+        return zlib.compress(body, 1)
+    raise ValueError(f'Unknown encoding: {encoding}')
+
+
+def decompress(encoding, body, limit=MAX_FRAME):
+    if encoding != 'zlib':
+        raise ValueError(f'Unknown encoding: {encoding}')
+    decompressor = zlib.decompressobj()
+    data = decompressor.decompress(body, limit)
+    if decompressor.unconsumed_tail:
+        raise ValueError(f'Payload expands beyond {limit} bytes')
+    return data
+
+
+class SyncCounters:
+    """Traffic and suppression counters, for one peer or a whole engine."""
+    FIELDS = ('messages_out', 'messages_in', 'bytes_out', 'bytes_in', 'bytes_saved',
+              'echoes_suppressed', 'duplicates_suppressed', 'formats_skipped', 'transfers_cancelled',
+              'heartbeats_missed', 'refs_sent', 'history_hits', 'history_misses', 'clips_superseded')
+
+    def __init__(self):
+        for field in self.FIELDS:
+            setattr(self, field, 0)
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+
+def local_ip():
+    """Address other hosts on the LAN reach us at; no packet is sent."""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        try:
+            sock.connect(('10.255.255.255', 1))
+            return sock.getsockname()[0]
+        except OSError:
+            return '127.0.0.1'
+
+
+def clipboard_needs_polling():
+    """Whether QClipboard.dataChanged misses copies made in other apps.
+
+    On macOS Qt only looks at the pasteboard when the app is activated, and
+    on Wayland only the focused client is sent selection changes; a tray
+    app is almost never either.
+    """
+    if platform.system() == 'Darwin':
+        return True
+    from PyQt6.QtGui import QGuiApplication
+    return QGuiApplication.platformName().startswith('wayland')
+
+
+class MacPasteboardCounter:
+    """NSPasteboard changeCount of the general pasteboard, through the
+    Objective-C runtime: a cheap way to tell that something was copied."""
+
+    def __init__(self):
+        objc = ctypes.cdll.LoadLibrary(ctypes.util.find_library('objc'))
+        ctypes.cdll.LoadLibrary(ctypes.util.find_library('AppKit'))
+        objc.objc_getClass.restype = ctypes.c_void_p
+        objc.objc_getClass.argtypes = [ctypes.c_char_p]
+        objc.sel_registerName.restype = ctypes.c_void_p
+        objc.sel_registerName.argtypes = [ctypes.c_char_p]
+        # objc_msgSend must be called through a prototype matching the method
+        send_object = ctypes.CFUNCTYPE(ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p)(('objc_msgSend', objc))
+        self._send_long = ctypes.CFUNCTYPE(ctypes.c_long, ctypes.c_void_p, ctypes.c_void_p)(('objc_msgSend', objc))
+        self._pasteboard = send_object(objc.objc_getClass(b'NSPasteboard'), objc.sel_registerName(b'generalPasteboard'))
+        if not self._pasteboard:
+            raise OSError('No general pasteboard')
+        self._change_count = objc.sel_registerName(b'changeCount')
+
+    def __call__(self):
+        return self._send_long(self._pasteboard, self._change_count)
+
+
+class MemoryClipboard(QObject):
+    """Stand-in for QClipboard, so several engines can run in one process."""
+    dataChanged = pyqtSignal()
+
+    def __init__(self):
+        super().__init__()
+        self._mime_data = QMimeData()
+
+    def mimeData(self):
+        return self._mime_data
+
+    def setMimeData(self, mime_data):
+        self._mime_data = mime_data
+        self.dataChanged.emit()
+
+    def text(self):
+        return self._mime_data.text()
+
+    def setText(self, text):
+        mime_data = QMimeData()
+        mime_data.setText(text)
+        self.setMimeData(mime_data)
+
+
+_compressor = None
+
+
+def _compress_pool():
+    global _compressor
+    if _compressor is None:
+        _compressor = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1),
+                                         thread_name_prefix='clipsync-compress')
+    return _compressor
+
+
+class OutgoingContent:
+    """Clipboard content on its way to one or more peers.
+
+    Each piece of the payload is compressed at most once per encoding, by
+    the writer of whichever peer gets to it first or ahead of time by
+    prefetch(), and the result is shared with the other peers' writers; a
+    piece is dropped again once every peer it was meant for has taken it.
+    """
+
+    def __init__(self, content_id, layout, payload):
+        self.id = content_id
+        self.layout = layout
+        self.payload = memoryview(payload)
+        self._lock = threading.Lock()
+        self._takers = collections.Counter()  # encoding -> peers it is sent to with it
+        self._pieces = {}  # (encoding, offset) -> [lock, compressed body, takers left]
+        self._incompressible = set()  # encodings that did not pay off on an earlier piece
+
+    def __len__(self):
+        return len(self.payload)
+
+    def add_taker(self, encoding):
+        with self._lock:
+            self._takers[encoding] += 1
+
+    def prefetch(self, encoding, offset, size):
+        """Start compressing a piece that piece() will be asked for soon."""
+        if encoding is not None and len(self.payload) - offset >= COMPRESS_THRESHOLD:
+            _compress_pool().submit(self._compressed, encoding, offset, size)
+
+    def _compressed(self, encoding, offset, size):
+        # The piece compressed, or b'' when compression does not make it smaller
+        body = self.payload[offset:offset + size]
+        key = (encoding, offset)
+        with self._lock:
+            slot = self._pieces.get(key)
+            if slot is None:
+                slot = self._pieces[key] = [threading.Lock(), None, self._takers[encoding]]
+        with slot[0]:
+            if slot[1] is None:
+                if encoding in self._incompressible:
+                    slot[1] = b''
+                    return slot
+                packed = compress(encoding, body)
+                if len(packed) <= len(body) * (1 - COMPRESS_MIN_SAVING):
+                    slot[1] = packed
+                else:
+                    slot[1] = b''
+                    self._incompressible.add(encoding)
+            return slot
+
+    def piece(self, encoding, offset, size):
+        """(body, encoding) of payload[offset:offset + size], encoding None
+        if it goes as it is."""
+        body = self.payload[offset:offset + size]
+        if encoding is None or len(body) < COMPRESS_THRESHOLD:
+            return body, None
+        key = (encoding, offset)
+        slot = self._compressed(encoding, offset, size)
+        packed = slot[1]
+        with self._lock:
+            slot[2] -= 1
+            if slot[2] <= 0:
+                self._pieces.pop(key, None)
+        return (packed, encoding) if packed else (body, None)
+
+
+Piece = collections.namedtuple('Piece', 'content offset size')
+
+
+class Peer:
+    """One authenticated connection to another host.
+
+    The handshake and all reads happen on a reader thread and all writes on
+    a writer thread, so a slow peer never blocks the GUI or other peers.
+    The writer serves two lanes: single messages first, then the next chunk
+    of the one content being streamed. It only takes a chunk once the last
+    one is on the wire, so a slow link holds back the stream instead of
+    filling memory.
+
+    Received content is handed to the GUI thread through a single slot: if
+    the GUI has not taken the last one yet, the new one replaces it. With
+    the one stream being received, that is at most two payloads per peer
+    in memory however fast the peer sends.
+    """
+
+    def __init__(self, engine, sock, address, server_side):
+        self.engine = engine
+        self.sock = sock
+        self.address = address
+        self.server_side = server_side
+        self.name = f'{address[0]}:{address[1]}'
+        self.cipher = None
+        self.compression = None
+        # Hash of the content this peer's clipboard was last synced to, and
+        # whether it came from the peer (a resend would be an echo)
+        self.last_hash = None
+        self.last_hash_from_peer = False
+        self.counters = SyncCounters()
+        self._lanes = threading.Condition()
+        self._urgent = collections.deque()
+        self._transfer = None  # (content id, message iterator) on the bulk lane
+        self._incoming = None  # (header, buffer) of the stream being received
+        self._delivery_lock = threading.Lock()
+        self._delivery = None  # (header, body) waiting for the GUI thread
+        self._closed = threading.Event()
+        self._reader = None
+        self._writer = None
+
+    def handshake(self):
+        """Derive the session key and prove both sides know the password.
+
+        The accepting side picks a fresh salt and sends it in the clear; the
+        first sealed message in each direction only opens with the right key.
+        """
+        self.sock.settimeout(HANDSHAKE_TIMEOUT)
+        if self.server_side:
+            salt = os.urandom(SALT_SIZE)
+            send_frame(self.sock, MAGIC + salt)
+            self.cipher = Cipher(derive_key(self.engine.password, salt), server_side=True)
+            header, _ = decode_message(self.cipher.open(recv_frame(self.sock)))
+            send_frame(self.sock, self.cipher.seal(encode_message(self._hello())))
+        else:
+            hello = recv_frame(self.sock)
+            if hello[:len(MAGIC)] != MAGIC:
+                raise ConnectionError('Not a clipboard sync server')
+            self.cipher = Cipher(derive_key(self.engine.password, hello[len(MAGIC):]), server_side=False)
+            send_frame(self.sock, self.cipher.seal(encode_message(self._hello())))
+            try:
+                reply = recv_frame(self.sock)
+            except ConnectionError:
+                # The server hangs up on a hello it cannot open
+                raise PermissionError('Server closed the connection, wrong clipboard password?') from None
+            header, _ = decode_message(self.cipher.open(reply))
+        if header.get('type') != 'hello' or header.get('version') != PROTOCOL_VERSION:
+            raise ConnectionError(f'Unsupported peer protocol: {header}')
+        self.name = f"{header.get('host') or self.address[0]}:{self.address[1]}"
+        self.compression = next((c for c in COMPRESSIONS if c in header.get('compression', ())), None)
+        # Pings keep an idle connection talking, so silence this long means it is gone
+        self.sock.settimeout(HEARTBEAT_TIMEOUT)
+
+    def _hello(self):
+        return {'type': 'hello', 'version': PROTOCOL_VERSION, 'host': socket.gethostname(),
+                'compression': list(COMPRESSIONS)}
+
+    def start(self, handshake_done=False):
+        if handshake_done:
+            # Usable as soon as connect_to() returns
+            self._ready()
+        self._reader = threading.Thread(target=self._read_loop, args=(handshake_done,),
+                                        name=f'clipsync-read-{self.name}', daemon=True)
+        self._reader.start()
+
+    def send(self, header, body=b''):
+        with self._lanes:
+            self._queue(header, body)
+            self._lanes.notify()
+
+    def _queue(self, header, body):
+        # Called with the lanes lock held
+        if self._closed.is_set():
+            return
+        if len(self._urgent) >= MAX_QUEUED:
+            print(f'Clipboard peer {self.name} is not reading, disconnecting')
+            self.close()
+            return
+        self._urgent.append((header, body))
+
+    def _drop_queued_content(self):
+        # Called with the lanes lock held: content not sent yet is outdated
+        # by the content about to be queued, only the newest copy matters
+        queued = [message for message in self._urgent if message[0]['type'] not in ('clip', 'ref')]
+        if len(queued) != len(self._urgent):
+            self._urgent = collections.deque(queued)
+
+    def _cancel_transfer(self):
+        # Called with the lanes lock held
+        if self._transfer is not None:
+            self._queue({'type': 'cancel', 'id': self._transfer[0]}, b'')
+            self._transfer = None
+            self.count('transfers_cancelled')
+
+    def send_content(self, content):
+        """Send an OutgoingContent, replacing any still being streamed: the
+        clipboard only holds the newest copy anyway. The content must have
+        had add_taker() called for this peer's compression."""
+        with self._lanes:
+            self._cancel_transfer()
+            self._drop_queued_content()
+            if len(content) <= STREAM_THRESHOLD:
+                header = {'type': 'clip', 'id': content.id, 'formats': content.layout}
+                self._queue(header, Piece(content, 0, len(content)))
+            else:
+                self._transfer = (content.id, self._chunks(content, self.compression))
+            self._lanes.notify()
+
+    def send_ref(self, digest):
+        """Send only the hash of content the peer has probably kept in its
+        history; it asks for the content if not."""
+        with self._lanes:
+            self._cancel_transfer()
+            self._drop_queued_content()
+            self._queue({'type': 'ref', 'hash': digest}, b'')
+            self.count('refs_sent')
+            self._lanes.notify()
+
+    @staticmethod
+    def _chunks(content, encoding):
+        for offset in range(0, COMPRESS_AHEAD * CHUNK_SIZE, CHUNK_SIZE):
+            content.prefetch(encoding, offset, CHUNK_SIZE)
+        yield {'type': 'clip-start', 'id': content.id, 'formats': content.layout, 'total': len(content)}, b''
+        for offset in range(0, len(content), CHUNK_SIZE):
+            content.prefetch(encoding, offset + COMPRESS_AHEAD * CHUNK_SIZE, CHUNK_SIZE)
+            yield {'type': 'chunk', 'id': content.id, 'offset': offset}, Piece(content, offset, CHUNK_SIZE)
+
+    def count(self, field, amount=1):
+        # Reader, writer and GUI threads of every peer update the engine totals
+        with self.engine._counter_lock:
+            setattr(self.counters, field, getattr(self.counters, field) + amount)
+            setattr(self.engine.counters, field, getattr(self.engine.counters, field) + amount)
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        with self._lanes:
+            self._lanes.notify()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+    def _read_loop(self, handshake_done):
+        try:
+            if not handshake_done:
+                self.handshake()
+                self._ready()
+            while not self._closed.is_set():
+                frame = recv_frame(self.sock)
+                header, body = decode_message(self.cipher.open(frame))
+                self.count('messages_in')
+                self.count('bytes_in', 4 + len(frame))
+                if 'encoding' in header:
+                    body = decompress(header.pop('encoding'), body)
+                self._on_message(header, body)
+        except socket.timeout:
+            if not self._closed.is_set():
+                self.count('heartbeats_missed')
+                print(f'Clipboard peer {self.name} silent for {HEARTBEAT_TIMEOUT:.0f}s, disconnecting')
+        except (OSError, ValueError, struct.error) as e:
+            if not self._closed.is_set():
+                print(f'Clipboard peer {self.name} disconnected: {e}')
+        finally:
+            self.close()
+            self.engine._peer_closed(self)
+
+    def _ready(self):
+        self._writer = threading.Thread(target=self._write_loop, name=f'clipsync-write-{self.name}', daemon=True)
+        self._writer.start()
+        self.engine._peer_ready(self)
+
+    def _on_message(self, header, body):
+        kind = header.get('type')
+        if kind == 'clip-start':
+            # A new stream replaces any unfinished one, like on the sending side
+            if header['total'] > self.engine.max_transfer:
+                self._incoming = None
+                self.count('formats_skipped', len(header['formats']))
+            else:
+                # Grown as chunks arrive, so memory follows what was actually
+                # sent rather than what the peer announced
+                self._incoming = (header, bytearray())
+        elif kind == 'chunk':
+            incoming = self._incoming
+            if incoming is None or incoming[0]['id'] != header['id']:
+                return
+            start_header, buffer = incoming
+            # Chunks of a stream are written in order on one connection
+            if header['offset'] != len(buffer):
+                raise ValueError('Chunk out of order')
+            if len(buffer) + len(body) > start_header['total']:
+                raise ValueError('Chunk beyond the announced size')
+            buffer += body
+            if len(buffer) == start_header['total']:
+                self._incoming = None
+                # Handed over as it is, a copy would double the peak memory use
+                self._deliver(dict(start_header, type='clip'), buffer)
+        elif kind in ('clip', 'ref'):
+            self._deliver(header, body)
+        elif kind == 'cancel':
+            if self._incoming is not None and self._incoming[0]['id'] == header['id']:
+                self._incoming = None
+        elif kind == 'ping':
+            pass  # only here to show the connection is alive
+        else:
+            self.engine.received.emit(self, header, body)
+
+    def _deliver(self, header, body):
+        with self._delivery_lock:
+            waiting = self._delivery is not None
+            self._delivery = (header, body)
+        if waiting:
+            self.count('clips_superseded')
+        else:
+            self.engine.delivered.emit(self)
+
+    def take_delivery(self):
+        """The newest (header, body) of content received, or None."""
+        with self._delivery_lock:
+            delivery, self._delivery = self._delivery, None
+        return delivery
+
+    def _next_message(self):
+        with self._lanes:
+            while True:
+                if self._closed.is_set():
+                    return None
+                if self._urgent:
+                    return self._urgent.popleft()
+                if self._transfer is not None:
+                    message = next(self._transfer[1], None)
+                    if message is not None:
+                        return message
+                    self._transfer = None
+                    continue
+                if not self._lanes.wait(HEARTBEAT_INTERVAL):
+                    return {'type': 'ping'}, b''
+
+    def _write_loop(self):
+        while True:
+            message = self._next_message()
+            if message is None:
+                return
+            header, body = message
+            if isinstance(body, Piece):
+                # Compressed here rather than on the GUI thread, and only by
+                # the first peer to need it
+                piece = body
+                body, encoding = piece.content.piece(self.compression, piece.offset, piece.size)
+                if encoding is not None:
+                    raw = min(piece.size, len(piece.content) - piece.offset)
+                    self.count('bytes_saved', raw - len(body))
+                    header = dict(header, encoding=encoding)
+            try:
+                frame = self.cipher.seal(encode_message(header, body))
+                send_frame(self.sock, frame)
+                self.count('messages_out')
+                self.count('bytes_out', 4 + len(frame))
+            except OSError:
+                self.close()
+                return
+
+
+class ClipSync(QObject):
+    """Clipboard sync between hosts over TCP.
+
+    Local clipboard changes are pushed to every connected peer as soon as
+    the clipboard signals them. Where Qt misses copies made in other apps
+    (see clipboard_needs_polling), macOS has NSPasteboard's change counter
+    checked once a second and Wayland is told of changes by
+    `wl-paste --watch`; only without wl-paste, and with poll=True, is the
+    Wayland clipboard checked once a second, by its formats and text length
+    before anything is read in full. A host that listens relays what one
+    peer sends to the others, so clients only need to reach it.
+
+    max_bytes maps each mime type to sync to its size limit; formats over
+    their limit are left out of what is sent and of what is accepted.
+
+    With a history (cliphistory.ClipboardHistory), everything copied or
+    received is kept in it, and recall() puts an entry back on the
+    clipboard while peers are sent just its hash.
+    """
+    received = pyqtSignal(object, dict, object)
+    delivered = pyqtSignal(object)  # peer with content waiting in take_delivery()
+    history_loaded = pyqtSignal(object, object)  # callback, (layout, payload) or None
+    peers_changed = pyqtSignal()
+    # Reported on the GUI thread, for whoever supervises the engine
+    peer_disconnected = pyqtSignal(object)
+    connected = pyqtSignal(object)
+    connect_failed = pyqtSignal(str, int, object)  # host, port, exception
+    listening_failed = pyqtSignal(object)  # exception
+
+    def __init__(self, password, clipboard=None, max_bytes=None, history=None, poll=False):
+        super().__init__()
+        self.password = password
+        self.history = history
+        self.poll = poll
+        self.max_bytes = dict(max_bytes) if max_bytes is not None else dict.fromkeys(FORMATS, DEFAULT_MAX_BYTES)
+        self.max_transfer = sum(self.max_bytes.values())
+        self._content_id = 0
+        # Hash of what the clipboard holds, as last read or set by us
+        self._current_hash = None
+        self._setting_clipboard = False
+        self._poll_task = None
+        self._watcher = None
+        if clipboard is None:
+            from PyQt6.QtGui import QGuiApplication
+            clipboard = QGuiApplication.clipboard()
+            self.clipboard = clipboard
+            self._start_polling()
+        else:
+            self.clipboard = clipboard
+        self.clipboard.dataChanged.connect(self._on_clipboard_changed)
+        # Peer threads hand messages to the GUI thread through this signal
+        self.received.connect(self._on_received)
+        self.delivered.connect(self._on_delivered)
+        # History entries on disk are read on the history's own thread
+        self.history_loaded.connect(lambda callback, kept: callback(kept))
+        self.peers = []
+        self.counters = SyncCounters()
+        self._lock = threading.Lock()
+        self._counter_lock = threading.Lock()
+        self._server = None
+        self._accept_thread = None
+
+    def listen(self, host='0.0.0.0', port=0):
+        """Start accepting peers; returns the port listened on."""
+        self.stop_listening()
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((host, port))
+        server.listen()
+        self._server = server
+        self._accept_thread = threading.Thread(target=self._accept_loop, args=(server,),
+                                               name='clipsync-accept', daemon=True)
+        self._accept_thread.start()
+        return server.getsockname()[1]
+
+    def stop_listening(self):
+        if self._server is not None:
+            server, self._server = self._server, None
+            # close() alone does not wake a thread blocked in accept() on Linux
+            try:
+                server.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            server.close()
+            for peer in self.connected_peers():
+                if peer.server_side:
+                    self._close_peer(peer)
+
+    def connect_to(self, host, port, timeout=HANDSHAKE_TIMEOUT):
+        """Connect and authenticate; raises OSError (PermissionError on a
+        wrong password) so the caller can report it right away."""
+        sock = socket.create_connection((host, port), timeout=timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        peer = Peer(self, sock, (host, port), server_side=False)
+        try:
+            peer.handshake()
+        except (OSError, ValueError, struct.error):
+            sock.close()
+            raise
+        peer.start(handshake_done=True)
+        return peer
+
+    def connect_async(self, host, port, timeout=HANDSHAKE_TIMEOUT):
+        """connect_to() on a worker thread; the outcome arrives as the
+        connected or connect_failed signal."""
+        def run():
+            try:
+                peer = self.connect_to(host, port, timeout)
+            except (OSError, ValueError, struct.error) as e:
+                self.connect_failed.emit(host, port, e)
+            else:
+                self.connected.emit(peer)
+        threading.Thread(target=run, name=f'clipsync-connect-{host}:{port}', daemon=True).start()
+
+    def disconnect_clients(self):
+        for peer in self.connected_peers():
+            if not peer.server_side:
+                self._close_peer(peer)
+
+    def close(self):
+        self.stop_listening()
+        for peer in self.connected_peers():
+            self._close_peer(peer)
+        if self._watcher is not None:
+            watcher, self._watcher = self._watcher, None
+            watcher.finished.disconnect()
+            watcher.kill()
+            watcher.waitForFinished(1000)
+        if self._poll_task is not None:
+            from scheduler import get_scheduler
+            get_scheduler().remove(self._poll_task)
+            self._poll_task = None
+
+    def _start_polling(self):
+        self._change_counter = None
+        self._last_change_count = None
+        if not clipboard_needs_polling():
+            return
+        if platform.system() == 'Darwin':
+            try:
+                self._change_counter = MacPasteboardCounter()
+            except (OSError, AttributeError, TypeError) as e:
+                print(f'NSPasteboard changeCount unavailable, checking formats and text length instead: {e}')
+                self._change_counter = self._clipboard_fingerprint
+            self._start_poll_task()
+        elif not self._start_watcher():
+            self._fall_back_to_polling('wl-paste (wl-clipboard) not found')
+
+    def _start_watcher(self):
+        wl_paste = shutil.which('wl-paste')
+        if wl_paste is None:
+            return False
+        from PyQt6.QtCore import QProcess
+        watcher = QProcess(self)
+        # wl-paste runs echo on every selection change, so each line is a copy
+        watcher.readyReadStandardOutput.connect(self._on_watcher_output)
+        watcher.finished.connect(self._on_watcher_finished)
+        watcher.start(wl_paste, ['--watch', 'echo'])
+        if not watcher.waitForStarted(1000):
+            return False
+        self._watcher = watcher
+        return True
+
+    def _on_watcher_output(self):
+        self._watcher.readAllStandardOutput()
+        self._poll_clipboard()
+
+    def _on_watcher_finished(self):
+        # Compositors without the data-control protocol (GNOME) make it exit
+        error = bytes(self._watcher.readAllStandardError()).decode(errors='replace').strip()
+        self._watcher = None
+        self._fall_back_to_polling(f"wl-paste --watch exited: {error or 'no reason given'}")
+
+    def _fall_back_to_polling(self, reason):
+        if not self.poll:
+            print(f'{reason}; copies made in other apps are only synced once the tray sees them '
+                  f'(CLIPBOARD_POLL checks the clipboard once a second)')
+            return
+        print(f'{reason}; checking the clipboard once a second')
+        self._change_counter = self._clipboard_fingerprint
+        self._start_poll_task()
+
+    def _start_poll_task(self):
+        from scheduler import get_scheduler
+        self._last_change_count = self._change_counter()
+        self._poll_task = get_scheduler().add('clipboard poll', self._poll_clipboard, POLL_INTERVAL, POLL_SLACK)
+        self._poll_task.start()
+
+    def _clipboard_fingerprint(self):
+        # Far cheaper than reading every format: nothing is encoded or
+        # hashed. A copy with the same formats and text length as the last
+        # one, such as one image after another, goes unnoticed
+        mime_data = self.clipboard.mimeData()
+        if mime_data is None:
+            return None  # nothing copied yet
+        return tuple(mime_data.formats()), len(mime_data.text()) if mime_data.hasText() else -1
+
+    def _poll_clipboard(self):
+        if self._change_counter is not None:
+            count = self._change_counter()
+            if count == self._last_change_count:
+                return
+            self._last_change_count = count
+        # Also sees our own setMimeData() and copies dataChanged did report,
+        # which hash the same as what we last read or set
+        layout, payload, skipped = self._read_clipboard()
+        if layout and content_hash(layout, payload) != self._current_hash:
+            self._local_copy(layout, payload, skipped)
+
+    def _close_peer(self, peer):
+        # Forget the peer now rather than when its reader thread notices,
+        # which may be after the engine itself is gone
+        peer.close()
+        self._peer_closed(peer)
+
+    def connected_peers(self):
+        with self._lock:
+            return list(self.peers)
+
+    def _accept_loop(self, server):
+        while True:
+            try:
+                sock, address = server.accept()
+            except OSError as e:
+                # Closed by stop_listening(), or the socket broke under us
+                if server is self._server:
+                    self._server = None
+                    server.close()
+                    self.listening_failed.emit(e)
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            Peer(self, sock, address, server_side=True).start()
+
+    def _peer_ready(self, peer):
+        with self._lock:
+            self.peers.append(peer)
+        print(f'Clipboard peer {peer.name} connected')
+        self.peers_changed.emit()
+
+    def _peer_closed(self, peer):
+        with self._lock:
+            if peer not in self.peers:
+                return
+            self.peers.remove(peer)
+        self.peers_changed.emit()
+        self.peer_disconnected.emit(peer)
+
+    def _count(self, field, amount=1):
+        with self._counter_lock:
+            setattr(self.counters, field, getattr(self.counters, field) + amount)
+
+    def broadcast(self, layout, payload, digest, exclude=None, ref=False):
+        """Send clipboard content to every peer that does not have it yet,
+        or with ref=True only its hash, for content peers should have kept."""
+        targets = []
+        for peer in self.connected_peers():
+            if peer is exclude:
+                continue
+            if peer.last_hash == digest:
+                # Setting the clipboard for a peer makes it signal a change
+                # we must not send back; other repeats are just redundant
+                peer.count('echoes_suppressed' if peer.last_hash_from_peer else 'duplicates_suppressed')
+                continue
+            peer.last_hash = digest
+            peer.last_hash_from_peer = False
+            targets.append(peer)
+        if ref:
+            for peer in targets:
+                peer.send_ref(digest)
+            return
+        if not targets:
+            return
+        self._content_id += 1
+        content = OutgoingContent(self._content_id, layout, payload)
+        # All takers are known before any writer starts on the content
+        for peer in targets:
+            content.add_taker(peer.compression)
+        for peer in targets:
+            peer.send_content(content)
+
+    def _load_history(self, digest, callback):
+        """Call callback on the GUI thread with what history.get(digest)
+        returns, unless the clipboard has changed in the meantime."""
+        if self.history is None:
+            callback(None)
+            return
+        current = self._current_hash
+
+        def loaded(kept):
+            if self._current_hash == current:
+                callback(kept)
+
+        self.history.load(digest, lambda kept: self.history_loaded.emit(loaded, kept))
+
+    def recall(self, digest):
+        """Put a history entry back on the clipboard; False if it is no
+        longer kept. An entry on disk is put back once it has been read."""
+        if self.history is None or digest not in self.history:
+            return False
+
+        def loaded(kept):
+            if kept is None:
+                return
+            self._current_hash = digest
+            self.broadcast(*kept, digest, ref=True)
+            self._set_clipboard(*kept)
+
+        self._load_history(digest, loaded)
+        return True
+
+    def _read_clipboard(self):
+        # Packed straight away: history, peers and the hash all share the one
+        # payload, and the per-format bytes go once this returns
+        mime_data = self.clipboard.mimeData()
+        formats, skipped = read_mime_data(mime_data, self.max_bytes) if mime_data is not None else ({}, [])
+        return (*pack_formats(formats), skipped)
+
+    def _set_clipboard(self, layout, payload):
+        mime_data = make_mime_data(unpack_formats(layout, memoryview(payload)))
+        # The change signalled from within setMimeData() is our own; reading
+        # it back would only hash the same, at the cost of two more copies
+        self._setting_clipboard = True
+        try:
+            self.clipboard.setMimeData(mime_data)
+        finally:
+            self._setting_clipboard = False
+
+    def _on_clipboard_changed(self):
+        if not self._setting_clipboard:
+            self._local_copy(*self._read_clipboard())
+
+    def _local_copy(self, layout, payload, skipped):
+        if skipped:
+            print(f"Clipboard formats over their size limit not synced: {', '.join(skipped)}")
+            self._count('formats_skipped', len(skipped))
+        if layout:
+            self._current_hash = content_hash(layout, payload)
+            if self.history is not None:
+                self.history.add(self._current_hash, layout, payload)
+            self.broadcast(layout, payload, self._current_hash)
+
+    def _on_delivered(self, peer):
+        delivery = peer.take_delivery()
+        if delivery is not None:
+            self._on_received(peer, *delivery)
+
+    def _on_received(self, peer, header, body):
+        kind = header.get('type')
+        if kind in ('ref', 'need'):
+            digest = header.get('hash')
+            if isinstance(digest, str):
+                (self._on_ref if kind == 'ref' else self._on_need)(peer, digest)
+            return
+        if kind != 'clip':
+            return
+        try:
+            layout = header['formats']
+            received = unpack_formats(layout, memoryview(body))
+        except (KeyError, TypeError, ValueError) as e:
+            # An exception escaping a slot would abort the app
+            print(f'Malformed clipboard content from {peer.name}: {e}')
+            return
+        formats = {}
+        for mime, data in received.items():
+            if len(data) <= self.max_bytes.get(mime, -1):
+                formats[mime] = data
+            else:
+                peer.count('formats_skipped')
+        if not formats:
+            return
+        payload = body
+        if len(formats) != len(layout):
+            # Only repacked when something was left out
+            layout, payload = pack_formats(formats)
+        del received, formats
+        self._apply(peer, layout, payload, content_hash(layout, payload))
+
+    def _on_ref(self, peer, digest):
+        def loaded(kept):
+            if kept is None:
+                peer.count('history_misses')
+                peer.send({'type': 'need', 'hash': digest})
+                return
+            peer.count('history_hits')
+            self._apply(peer, *kept, digest, ref=True)
+
+        self._load_history(digest, loaded)
+
+    def _on_need(self, peer, digest):
+        # A peer that did not have what we sent the hash of
+        def loaded(kept):
+            if kept is None:
+                return  # gone from our history too, the peer keeps what it has
+            self._content_id += 1
+            content = OutgoingContent(self._content_id, *kept)
+            content.add_taker(peer.compression)
+            peer.last_hash = digest
+            peer.last_hash_from_peer = False
+            peer.send_content(content)
+
+        self._load_history(digest, loaded)
+
+    def _apply(self, peer, layout, payload, digest, ref=False):
+        """Put content from peer on the clipboard and relay it."""
+        peer.last_hash = digest
+        peer.last_hash_from_peer = True
+        if digest == self._current_hash:
+            # Reached us over another path too, when hosts are linked in a
+            # loop; stopping here keeps it from circling forever
+            peer.count('duplicates_suppressed')
+            return
+        self._current_hash = digest
+        if self.history is not None:
+            self.history.add(digest, layout, payload)
+        # Relay first, so every client of a listening host sees each other's
+        # copies and the change signalled by setMimeData() below finds them synced
+        self.broadcast(layout, payload, digest, exclude=peer, ref=ref)
+        self._set_clipboard(layout, payload)
+
+    def stats(self):
+        return {
+            'total': self.counters.as_dict(),
+            'peers': {peer.name: dict(peer.counters.as_dict(), compression=peer.compression)
+                      for peer in self.connected_peers()},
+        }
+
+    def format_summary(self):
+        c = self.counters
+        lines = [
+            f'Sent {c.messages_out} ({c.bytes_out / 1024:.1f} KiB), received {c.messages_in} '
+            f'({c.bytes_in / 1024:.1f} KiB)',
+            f'Saved by compression: {c.bytes_saved / 1024:.1f} KiB',
+            f'Echoes suppressed: {c.echoes_suppressed}, duplicates suppressed: {c.duplicates_suppressed}',
+            f'Formats over their size limit: {c.formats_skipped}, transfers replaced: {c.transfers_cancelled}, '
+            f'received copies replaced before applied: {c.clips_superseded}',
+            f'Peers dropped for missed heartbeats: {c.heartbeats_missed}',
+            f'Sent as hash only: {c.refs_sent}, found in history: {c.history_hits}, '
+            f'fetched for lack of it: {c.history_misses}',
+        ]
+        for peer in self.connected_peers():
+            lines.append(f'{peer.name}: {peer.counters.messages_out} sent, {peer.counters.messages_in} received, '
+                         f'compression {peer.compression or "off"}')
+        return '\n'.join(lines)
@@ -0,0 +1,230 @@
+import json
+import os
+import signal
+import socket
+import sys
+
+from settings import settings_manager
+
+USAGE = '''Headless Flow: edge detection and channel switching without the tray.
+
+    python src/daemon.py [--socket PATH] [--group-access | --group NAME] [--stopped]
+    python src/daemon.py ctl [--socket PATH] COMMAND
+
+The socket is /run/lcsd/lcsd.sock for a daemon run as root, where every
+user's tray and ctl look first, and $XDG_RUNTIME_DIR/lcsd.sock otherwise.
+--group NAME lets members of group NAME use it, --group-access the
+daemon's own group.
+
+Commands (one per line on the control socket, one JSON reply per line):
+
+    status                      state, channel cache, devices and switch latency
+    start | stop                start or stop edge detection
+    switch N [DEVICE,...]       switch all (or the listed) devices to channel N
+    reload                      re-read ~/.lcs_config/config.json
+'''
+
+
+# A daemon run as root (for HID access) listens here, so the tray of
+# whichever user is logged in finds it; its home is not theirs
+SYSTEM_SOCKET_DIR = '/run/lcsd' if os.path.isdir('/run') else '/var/run/lcsd'
+SYSTEM_SOCKET = os.path.join(SYSTEM_SOCKET_DIR, 'lcsd.sock')
+
+
+def user_socket_path():
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'lcsd.sock')
+    return str(settings_manager.config_path.with_name('lcsd.sock'))
+
+
+def default_socket_path():
+    """Where a daemon started by this user listens."""
+    if hasattr(os, 'geteuid') and os.geteuid() == 0:
+        return SYSTEM_SOCKET
+    return user_socket_path()
+
+
+def find_socket_path():
+    """Where to reach a daemon: the system one if there is one, this
+    user's own otherwise."""
+    if os.path.exists(SYSTEM_SOCKET):
+        return SYSTEM_SOCKET
+    return user_socket_path()
+
+
+def send_command(command, path=None, timeout=2.0):
+    """Send one command to a running daemon and return its reply dict.
+
+    Raises OSError if no daemon is listening on path.
+    """
+    if not hasattr(socket, 'AF_UNIX'):
+        raise OSError('Unix domain sockets are not supported on this platform')
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path or find_socket_path())
+        sock.sendall((command.strip() + '\n').encode())
+        data = b''
+        while not data.endswith(b'\n'):
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+    return json.loads(data.decode())
+
+
+def daemon_available(path=None):
+    try:
+        send_command('status', path, timeout=0.5)
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+def serve(path, group_access=False, start_flow=True, group=None):
+    # Qt and Flow are only loaded for the daemon itself, `ctl` stays cheap
+    from PyQt6.QtCore import QSocketNotifier
+    from PyQt6.QtGui import QGuiApplication
+    from PyQt6.QtNetwork import QLocalServer
+    from flow import Flow
+    from scheduler import get_scheduler
+    from settings import trigger_config_reload
+
+    class ControlServer:
+        def __init__(self, flow):
+            self.flow = flow
+            self.server = QLocalServer()
+            self.server.setSocketOptions(
+                QLocalServer.SocketOption.GroupAccessOption if group_access or group
+                else QLocalServer.SocketOption.UserAccessOption)
+            self.server.newConnection.connect(self._on_new_connection)
+
+        def listen(self):
+            # A socket file left behind by a crashed daemon blocks listen()
+            QLocalServer.removeServer(path)
+            directory = os.path.dirname(path)
+            if directory == SYSTEM_SOCKET_DIR:
+                os.makedirs(directory, exist_ok=True)
+                # Nobody outside the group can even reach the socket
+                os.chmod(directory, 0o750 if group is not None else 0o700)
+                if group is not None:
+                    os.chown(directory, -1, group)
+            if not self.server.listen(path):
+                return False
+            if group is not None:
+                os.chown(path, -1, group)
+                os.chmod(path, 0o660)
+            return True
+
+        def _on_new_connection(self):
+            while self.server.hasPendingConnections():
+                connection = self.server.nextPendingConnection()
+                connection.readyRead.connect(lambda connection=connection: self._on_ready_read(connection))
+                connection.disconnected.connect(connection.deleteLater)
+
+        def _on_ready_read(self, connection):
+            while connection.canReadLine():
+                line = bytes(connection.readLine()).decode(errors='replace').strip()
+                if not line:
+                    continue
+                try:
+                    reply = self.handle(line)
+                except Exception as e:
+                    reply = {'ok': False, 'error': str(e)}
+                connection.write((json.dumps(reply) + '\n').encode())
+                connection.flush()
+
+        def handle(self, line):
+            command, *args = line.split()
+            if command == 'status':
+                return dict(self.flow.status(), scheduler=get_scheduler().stats(), ok=True)
+            if command == 'start':
+                self.flow.start()
+                return {'ok': True}
+            if command == 'stop':
+                self.flow.stop()
+                return {'ok': True}
+            if command == 'switch':
+                if not args or not args[0].isdigit() or not 1 <= int(args[0]) <= 3:
+                    return {'ok': False, 'error': 'usage: switch N [DEVICE,...] with N in 1-3'}
+                devices = [d.strip() for d in args[1].split(',') if d.strip()] if len(args) > 1 else None
+                return {'ok': True, 'devices': self.flow.switch_channel(int(args[0]), devices)}
+            if command == 'reload':
+                if not trigger_config_reload():
+                    return {'ok': False, 'error': f'could not read {settings_manager.config_path}'}
+                self.flow.reload_config()
+                return {'ok': True}
+            return {'ok': False, 'error': f'unknown command: {command}'}
+
+    if daemon_available(path):
+        print(f'A daemon is already listening on {path}')
+        return 1
+
+    app = QGuiApplication(sys.argv)
+    flow = Flow(QGuiApplication.screens())
+    flow.watch_screens(app)
+    control = ControlServer(flow)
+    if not control.listen():
+        print(f'Cannot listen on {path}: {control.server.errorString()}')
+        return 1
+    print(f'Listening on {path}')
+
+    # Python signal handlers only run when the interpreter gets control.
+    # A signal also writes a byte to this socket pair, which wakes Qt's event
+    # loop into Python, so nothing has to wake up periodically to check.
+    signal.signal(signal.SIGTERM, lambda *_: app.quit())
+    signal.signal(signal.SIGINT, lambda *_: app.quit())
+    wakeup, wakeup_writer = socket.socketpair()
+    wakeup.setblocking(False)
+    wakeup_writer.setblocking(False)
+    signal.set_wakeup_fd(wakeup_writer.fileno())
+    notifier = QSocketNotifier(wakeup.fileno(), QSocketNotifier.Type.Read)
+    notifier.activated.connect(lambda: wakeup.recv(64))
+
+    if start_flow:
+        flow.start()
+    code = app.exec()
+    flow.close()
+    control.server.close()
+    return code
+
+
+def main():
+    args = sys.argv[1:]
+    if '-h' in args or '--help' in args:
+        print(USAGE)
+        return 0
+    path = None
+    if '--socket' in args:
+        idx = args.index('--socket')
+        path = args[idx + 1]
+        args = args[:idx] + args[idx + 2:]
+    group = None
+    if '--group' in args:
+        import grp
+        idx = args.index('--group')
+        try:
+            group = grp.getgrnam(args[idx + 1]).gr_gid
+        except KeyError:
+            print(f'No such group: {args[idx + 1]}')
+            return 2
+        args = args[:idx] + args[idx + 2:]
+
+    if args and args[0] == 'ctl':
+        if len(args) < 2:
+            print(USAGE)
+            return 2
+        try:
+            reply = send_command(' '.join(args[1:]), path)
+        except OSError as e:
+            print(f'No daemon on {path or find_socket_path()}: {e}')
+            return 1
+        print(json.dumps(reply, indent=2))
+        return 0 if reply.get('ok') else 1
+
+    return serve(path or default_socket_path(), group_access='--group-access' in args,
+                 start_flow='--stopped' not in args, group=group)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
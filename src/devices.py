@@ -0,0 +1,63 @@
+import hidpp
+
+PROTOCOLS = ('bolt', 'unifying')
+
+
+def default_receiver(name='receiver', protocol='bolt', vendor_id=0x046D, product_id=0xC548):
+    return {
+        'name': name,
+        'protocol': protocol,
+        'vendor_id': vendor_id,
+        'product_id': product_id,
+        # hidraw node or hidapi path, only needed to tell identical receivers apart
+        'path': '',
+    }
+
+
+def default_devices(receiver='receiver'):
+    return [
+        {'name': 'keyboard', 'receiver': receiver, 'slot': 0x01, 'feature_index': 0x09},
+        {'name': 'mouse', 'receiver': receiver, 'slot': 0x02, 'feature_index': 0x0a},
+    ]
+
+
+def build_switch_command(protocol, slot, feature_index, channel):
+    """CHANGE_HOST setCurrentHost for the device in receiver slot `slot`."""
+    if protocol == 'bolt':
+        return [hidpp.LONG_REPORT, slot, feature_index, 0x1E, channel - 1] + [0x00] * 15
+    # unifying
+    return [hidpp.SHORT_REPORT, slot, feature_index, 0x1C, channel - 1, 0x00, 0x00]
+
+
+class DeviceRegistry:
+    """Device names as used by targets, resolved to the receiver each device
+    is paired with and its HID++ addressing on that receiver."""
+
+    def __init__(self, receivers, devices):
+        self.receivers = {receiver['name']: receiver for receiver in receivers}
+        self.devices = {}
+        for device in devices:
+            if device['receiver'] not in self.receivers:
+                raise ValueError(f"Device {device['name']} uses unknown receiver {device['receiver']}")
+            self.devices[device['name']] = device
+
+    def __contains__(self, name):
+        return name in self.devices
+
+    def names(self):
+        return list(self.devices)
+
+    def receiver(self, name):
+        return self.receivers[self.devices[name]['receiver']]
+
+    def switch_command(self, name, channel):
+        device = self.devices[name]
+        return build_switch_command(self.receiver(name)['protocol'], device['slot'], device['feature_index'], channel)
+
+    def names_on(self, receiver, slot=None):
+        """Devices paired with the named receiver, only the one in slot if given."""
+        return [name for name, device in self.devices.items()
+                if device['receiver'] == receiver and slot in (None, device['slot'])]
+
+    def ping(self, name):
+        return hidpp.ping_message(self.receiver(name)['protocol'], self.devices[name]['slot'])
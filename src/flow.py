@@ -1,178 +1,522 @@
-import platform
-import subprocess
+import os
+import threading
 import time
-from PyQt6.QtCore import Qt, QTimer, QPoint, QThread, pyqtSignal
-from PyQt6.QtGui import QCursor
-from PyQt6.QtWidgets import QApplication
+from concurrent.futures import ThreadPoolExecutor
+from PyQt6.QtCore import Qt, QPoint, QThread, pyqtSignal
+from PyQt6.QtGui import QCursor, QGuiApplication
 
+import hidpp
+from devices import DeviceRegistry
+from hid_transport import TransportPool, create_backend
+from input_source import create_cursor_source
+from latency import LatencyRecorder, SwitchTrace
+from prediction import PredictiveTrigger
+from scheduler import get_scheduler
 from settings import config
-from utils import get_absolute_file_data_path, creation_flags
+from zones import ZoneIndex
 
 
-class ChannelSwitchThread(QThread):
-    """#13: Run HID commands in a background thread to avoid blocking the GUI."""
-    finished = pyqtSignal(bool, bool, str)  # success_ms, success_kb, position
+class SwitchResult:
+    """Outcome and timing of one device's channel switch write.
 
-    def __init__(self, ms_cmd, kb_cmd, position):
+    outcome is the hidpp outcome of the last attempt: ACK (device answered),
+    LEFT (device dropped off this receiver, i.e. it switched), ERROR,
+    TIMEOUT or WRITE_FAILED, or CANCELLED if a newer switch superseded it.
+    """
+
+    def __init__(self, device, started):
+        self.device = device
+        self.outcome = None
+        self.error = None  # (error report type, code) for hidpp.ERROR
+        self.started = started  # time.monotonic()
+        self.finished = None
+        self.attempts = []  # [(started, finished, outcome)] per attempt
+
+    @property
+    def success(self):
+        return self.outcome in (hidpp.ACK, hidpp.LEFT)
+
+    @property
+    def duration(self):
+        return self.finished - self.started
+
+
+CANCELLED = 'cancelled'
+
+
+class _SwitchJob:
+    """Pending or in-flight write of one device's switch command."""
+
+    def __init__(self, device, receiver, msg, trace):
+        self.device = device
+        self.receiver = receiver
+        self.msg = msg
+        self.traces = [trace]  # every switch waiting on this write
+        self.superseded = threading.Event()
+
+
+class SwitchWorker(QThread):
+    """#13: Long-lived thread that runs HID commands off the GUI thread.
+
+    The queue holds at most one pending job per device: a newer switch
+    replaces the pending command for each of its devices (latest wins) and
+    cancels an in-flight one between retries, so the devices always end
+    up where the last switch asked. A device gets a new write only once its
+    previous one has finished; different devices are written in parallel
+    on the executor.
+    """
+    finished = pyqtSignal(object)  # SwitchTrace with one SwitchResult per device
+    # receiver, device index (None: any) and whether it is connected now, from the transports
+    link_changed = pyqtSignal(object, object, bool)
+
+    def __init__(self, executor, transports):
         super().__init__()
-        self._ms_cmd = ms_cmd
-        self._kb_cmd = kb_cmd
-        self._position = position
+        self._executor = executor
+        self.transports = transports
+        self._condition = threading.Condition()
+        self._pending = {}  # device -> _SwitchJob
+        self._in_flight = {}  # device -> _SwitchJob
+        self._remaining = {}  # SwitchTrace -> number of devices without a result yet
+        self._stopping = False
+
+    def submit(self, trace, commands):
+        """Queue (device, receiver, msg) commands for trace; finished is
+        emitted for trace once every device has a result."""
+        cancelled = []
+        with self._condition:
+            self._remaining[trace] = len(commands)
+            for device, receiver, msg in commands:
+                in_flight = self._in_flight.get(device)
+                if in_flight and in_flight.msg == msg and not in_flight.superseded.is_set():
+                    # Already being sent, just wait for it
+                    in_flight.traces.append(trace)
+                    old = self._pending.pop(device, None)
+                    if old:
+                        cancelled.append(old)
+                    continue
+                if in_flight:
+                    in_flight.superseded.set()
+                old = self._pending.get(device)
+                if old:
+                    cancelled.append(old)
+                self._pending[device] = _SwitchJob(device, receiver, msg, trace)
+            self._condition.notify()
+        for job in cancelled:
+            now = time.monotonic()
+            result = SwitchResult(job.device, now)
+            result.outcome, result.finished = CANCELLED, now
+            self._complete(job, result)
+
+    def stop(self):
+        with self._condition:
+            self._stopping = True
+            for job in self._in_flight.values():
+                job.superseded.set()
+            self._condition.notify()
+        self.wait()
 
     def run(self):
-        success_ms = _write_to_adu(self._ms_cmd)
-        success_kb = _write_to_adu(self._kb_cmd)
-        self.finished.emit(success_ms, success_kb, self._position)
-
-
-def _get_hidapi_executable_full_path():
-    arch = platform.machine()
-    system = platform.system().lower()
-    executable = None
-
-    if system == 'windows':
-        if arch in ('x86_64', 'AMD64'):
-            executable = 'hidapitester-windows-x86_64.exe'
-    elif system == 'linux':
-        if arch == 'x86_64':
-            executable = 'hidapitester-linux-x86_64'
-        elif arch == 'armv7l':
-            executable = 'hidapitester-linux-armv7l'
-    elif system == 'darwin':
-        if arch == 'arm64':
-            executable = 'hidapitester-macos-arm64'
-        elif arch == 'x86_64':
-            executable = 'hidapitester-macos-x86_64'
-
-    # #2: Raise instead of UnboundLocalError on unsupported arch
-    if executable is None:
-        raise RuntimeError(f"Unsupported platform: {system} {arch}")
-
-    return get_absolute_file_data_path('hidapitester', executable)
-
-
-def _build_hidapi_command(msg_str):
-    exec_path = _get_hidapi_executable_full_path()
-    hex_string = ','.join(f'0x{byte:02X}' for byte in msg_str)
-    length = str(len(msg_str))
-    usage = '2' if config.PROTOCOL == 'bolt' else '1'
-    cmd = [
-        exec_path, '--vidpid', f'{config.VENDOR_ID:04X}:{config.PRODUCT_ID:04X}',
-        '--usage', usage, '--usagePage', '0xFF00', '--open',
-        '--length', length, '--send-output', hex_string,
-        '--length', length, '--send-output', hex_string,
-    ]
-    return cmd
-
-
-def _write_to_adu(msg_str):
-    cmd = _build_hidapi_command(msg_str)
-    print('Writing command: {}'.format(' '.join(cmd)))
+        while True:
+            with self._condition:
+                ready = [device for device in self._pending if device not in self._in_flight]
+                while not ready and not self._stopping:
+                    self._condition.wait()
+                    ready = [device for device in self._pending if device not in self._in_flight]
+                if self._stopping:
+                    return
+                jobs = [self._pending.pop(device) for device in ready]
+                for job in jobs:
+                    self._in_flight[job.device] = job
+            now = time.monotonic()
+            for job in jobs:
+                for trace in job.traces:
+                    if trace.thread_started is None:
+                        trace.thread_started = now
+                self._executor.submit(self._run_job, job)
+
+    def _run_job(self, job):
+        try:
+            result = _write_to_adu(self.transports.get(job.receiver), job.receiver, job.msg,
+                                   job.device, job.superseded)
+        except Exception as e:
+            print('Error switching {}: {}'.format(job.device, e))
+            result = SwitchResult(job.device, time.monotonic())
+            result.outcome, result.finished = hidpp.WRITE_FAILED, time.monotonic()
+        with self._condition:
+            del self._in_flight[job.device]
+            self._condition.notify()
+        self._complete(job, result)
+
+    def _complete(self, job, result):
+        done = []
+        with self._condition:
+            for trace in job.traces:
+                trace.results.append(result)
+                self._remaining[trace] -= 1
+                if not self._remaining[trace]:
+                    del self._remaining[trace]
+                    done.append(trace)
+        for trace in done:
+            self.finished.emit(trace)
+
+
+def _write_to_adu(transport, receiver, msg_str, device=None, cancelled=None):
+    """Send msg_str and wait until the device confirms it; returns a SwitchResult.
+
+    A device that switches host may drop its link before answering, so a
+    link-lost notification, or an unreachable-device error after an earlier
+    unanswered attempt, also counts as confirmation. Response timeouts and
+    retry back-off come from the device's observed response times.
+    cancelled: optional threading.Event that stops further retries.
+    """
+    print('Writing command: {}'.format(' '.join(f'{byte:02X}' for byte in msg_str)))
     # #12: Reduced retries from 10 to 3, added delay between attempts
     max_retries = 3
-    success_msg = f"wrote {len(msg_str)} bytes"
+    result = SwitchResult(device, time.monotonic())
+    timer = transport.response_timer(msg_str[1])
 
     for attempt in range(1, max_retries + 1):
+        started = time.monotonic()
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, creationflags=creation_flags)
+            outcome, error = transport.request(receiver['vendor_id'], receiver['product_id'], msg_str)
         except Exception as e:
             print('Error writing command: {}'.format(e))
-            if attempt < max_retries:
-                time.sleep(0.1)
-            continue
+            outcome, error = hidpp.WRITE_FAILED, None
+        if (outcome == hidpp.ERROR and error in hidpp.UNREACHABLE_ERRORS
+                and any(a[2] == hidpp.TIMEOUT for a in result.attempts)):
+            # An earlier write got through and the device has since left this receiver
+            outcome = hidpp.LEFT
+        result.attempts.append((started, time.monotonic(), outcome))
+        result.outcome, result.error = outcome, error
+        if result.success:
+            break
 
-        if success_msg in result.stdout:
-            return True
+        if outcome == hidpp.ERROR:
+            print(f'Attempt {attempt}: device replied {hidpp.error_name(error)}')
+            if error not in hidpp.RETRYABLE_ERRORS:
+                break
+        elif outcome == hidpp.TIMEOUT:
+            print(f'Attempt {attempt}: no response within {timer.timeout() * 1000:.0f} ms')
         else:
             print(f'Attempt {attempt}: Failed to write command')
-            if attempt < max_retries:
-                time.sleep(0.1)
+        if attempt < max_retries:
+            if cancelled is None:
+                time.sleep(timer.backoff(attempt))
+            elif cancelled.wait(timer.backoff(attempt)):
+                print(f'Attempt {attempt}: superseded by a newer switch, giving up')
+                result.outcome = CANCELLED
+                break
+
+    result.finished = time.monotonic()
+    return result
+
 
-    return False
+def _create_backend(receiver):
+    # LCS_HID_BACKEND=fake runs the tray without hardware, for development
+    return create_backend(os.environ.get('LCS_HID_BACKEND') or config.HID_BACKEND, receiver.get('path'))
 
 
 class Flow:
-    def __init__(self, screens):
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.check_mouse_position)
-        screen_geometries = [s.geometry() for s in screens]
-        self.rightmost_edge = max([geometry.x() + geometry.width() for geometry in screen_geometries])
-        self.leftmost_edge = min([geometry.x() for geometry in screen_geometries])
-        self.topmost_edge = min([geometry.y() for geometry in screen_geometries])
-        self.bottommost_edge = max([geometry.y() + geometry.height() for geometry in screen_geometries])
+    # Switch state machine:
+    #   idle -> switching -> switched_away -> rearming -> idle
+    # switched_away ignores the edge it switched on until the cursor has
+    # left the edge band (REARM_BAND_PX) for REARM_DELAY_MS, so jitter at the
+    # edge or the cursor still sitting there when control comes back does
+    # not start another switch. A different target can switch from any
+    # state, superseding a switch that is still running.
+    IDLE = 'idle'
+    SWITCHING = 'switching'
+    SWITCHED_AWAY = 'switched_away'
+    REARMING = 'rearming'
+
+    def __init__(self, screens, cursor_source=None):
+        # Cursor motion is pushed into the edge check; polling is only the fallback
+        self._cursor_source_config = None if cursor_source else (config.CURSOR_SOURCE, config.REQUIRE_CTRL)
+        self.cursor_source = cursor_source or create_cursor_source(config.CURSOR_SOURCE, config.REQUIRE_CTRL)
+        self.cursor_source.moved.connect(self.check_mouse_position)
+        self._running = False
         self.offsets = {
             'left': QPoint(1, 0),
             'right': QPoint(-1, 0),
             'top': QPoint(0, 1),
             'bottom': QPoint(0, -1)
         }
-        self._switch_thread = None
+        self.state = self.IDLE
+        self._active_target = None
+        # Last channel each device was successfully switched to. We cannot see
+        # where devices go once they leave, only when they are back with our
+        # receiver (a connection notification or a reply), which drops them
+        # from it; so does a receiver reconnect, which may have hidden both.
+        self.channel_cache = {}
+        # Re-arming a bit late is harmless, so it can share a wakeup
+        self._rearm_task = get_scheduler().add('flow rearm', self._rearm, slack=0.05)
+        self._latest_trace = None
+        self.latency = LatencyRecorder()
+        self.prediction = PredictiveTrigger(config.PREDICT_MIN_SPEED)
+        # Threads are only started as needed, so the cap just bounds how many
+        # devices of one target are written at the same time
+        self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='hid-write')
+        # Wake-up pings get their own worker so they never hold up a switch
+        self._wake_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='hid-wake')
+        self._last_wake = {}  # device -> monotonic time of the last ping
+        # One receiver handle per receiver, kept open for the lifetime of Flow
+        self._hid_backend_name = config.HID_BACKEND
+        self._receivers = config.RECEIVERS
+        self.registry = DeviceRegistry(config.RECEIVERS, config.DEVICES)
+        self._worker = SwitchWorker(self._executor, self._create_transports())
+        self._worker.finished.connect(self._on_switch_finished)
+        self._worker.link_changed.connect(self._on_link_changed)
+        self.update_screens(screens)
+
+    def _create_transports(self):
+        # Reported on reader threads, handled on the GUI thread
+        return TransportPool(_create_backend, lambda *link: self._worker.link_changed.emit(*link))
+
+    @property
+    def transports(self):
+        return self._worker.transports
+
+    @transports.setter
+    def transports(self, transports):
+        self._worker.transports = transports
+
+    def watch_screens(self, app):
+        """Recompile the edge/zone index whenever the monitor layout changes."""
+        app.screenAdded.connect(self._on_screen_added)
+        app.screenRemoved.connect(lambda _screen: self.update_screens(QGuiApplication.screens()))
+        for screen in app.screens():
+            screen.geometryChanged.connect(lambda _geometry: self.update_screens(QGuiApplication.screens()))
+
+    def _on_screen_added(self, screen):
+        screen.geometryChanged.connect(lambda _geometry: self.update_screens(QGuiApplication.screens()))
+        self.update_screens(QGuiApplication.screens())
+
+    def update_screens(self, screens):
+        screen_geometries = [s.geometry() for s in screens]
+        self.rightmost_edge = max([geometry.x() + geometry.width() for geometry in screen_geometries])
+        self.leftmost_edge = min([geometry.x() for geometry in screen_geometries])
+        self.topmost_edge = min([geometry.y() for geometry in screen_geometries])
+        self.bottommost_edge = max([geometry.y() + geometry.height() for geometry in screen_geometries])
+        self._compile_targets()
+
+    def _compile_targets(self):
+        # #3: Use -1/+1 margin so edge conditions can actually trigger
+        self.zone_index = ZoneIndex(
+            config.TARGETS, self.leftmost_edge, self.rightmost_edge,
+            self.topmost_edge, self.bottommost_edge, margin=1)
+        # Targets were rebuilt, so the active one no longer matches by identity
+        if self.state != self.SWITCHING:
+            self._rearm()
+
+    def reload_config(self):
+        """Apply a changed config without recreating Flow."""
+        self._compile_targets()
+        self.prediction = PredictiveTrigger(config.PREDICT_MIN_SPEED)
+        self.registry = DeviceRegistry(config.RECEIVERS, config.DEVICES)
+        # Cached by name, which may now stand for another device
+        self.channel_cache = {device: channel for device, channel in self.channel_cache.items()
+                              if device in self.registry}
+        if config.HID_BACKEND != self._hid_backend_name or config.RECEIVERS != self._receivers:
+            self.transports.close()
+            self._hid_backend_name = config.HID_BACKEND
+            self._receivers = config.RECEIVERS
+            self.channel_cache.clear()
+            self.transports = self._create_transports()
+        if (self._cursor_source_config is not None
+                and (config.CURSOR_SOURCE, config.REQUIRE_CTRL) != self._cursor_source_config):
+            self.cursor_source.stop()
+            self._cursor_source_config = (config.CURSOR_SOURCE, config.REQUIRE_CTRL)
+            self.cursor_source = create_cursor_source(config.CURSOR_SOURCE, config.REQUIRE_CTRL)
+            self.cursor_source.moved.connect(self.check_mouse_position)
+            if self._running:
+                self.cursor_source.start()
 
     def start(self):
-        self.timer.start(300)
+        self._running = True
+        self._rearm()
+        self.cursor_source.start()
 
     def stop(self):
-        self.timer.stop()
-        if self._switch_thread and self._switch_thread.isRunning():
-            self._switch_thread.wait(3000)
+        self._running = False
+        self.cursor_source.stop()
+        self._rearm_task.stop()
+
+    def close(self):
+        self.stop()
+        self._worker.stop()
+        self._wake_executor.shutdown(wait=True)
+        self._executor.shutdown(wait=True)
+        self.transports.close()
+
+    def _rearm(self):
+        self._rearm_task.stop()
+        self.state = self.IDLE
+        self._active_target = None
+        self.prediction.reset()
 
-    def _on_switch_finished(self, success_ms, success_kb, position):
-        if success_ms and success_kb:
-            QCursor.setPos(QCursor.pos() + self.offsets[position])
+    def _in_edge_band(self, x, y, position):
+        band = config.REARM_BAND_PX
+        if position == 'left':
+            return x <= self.leftmost_edge + band
+        if position == 'right':
+            return x >= self.rightmost_edge - band
+        if position == 'top':
+            return y <= self.topmost_edge + band
+        return y >= self.bottommost_edge - band
 
-    def check_mouse_position(self):
-        # #13: Don't start a new switch if one is already running
-        if self._switch_thread and self._switch_thread.isRunning():
+    def _update_rearm(self, x, y):
+        if self._in_edge_band(x, y, self._active_target['position']):
+            if self.state == self.REARMING:
+                self._rearm_task.stop()
+                self.state = self.SWITCHED_AWAY
+        elif self.state == self.SWITCHED_AWAY:
+            self.state = self.REARMING
+            self._rearm_task.start(config.REARM_DELAY_MS / 1000)
+
+    def _on_link_changed(self, receiver, device_index, connected):
+        if not connected:
+            return  # leaving is what a switch away does, the cache already says where to
+        for device in self.registry.names_on(receiver['name'], device_index):
+            if self.channel_cache.pop(device, None) is not None:
+                print(f'{device} is back on {receiver["name"]}, no longer assumed on its last channel')
+
+    def _on_switch_finished(self, trace):
+        trace.finished = time.monotonic()
+        for result in trace.results:
+            print(f'Switch {result.device}: {result.outcome} in {result.duration * 1000:.1f} ms '
+                  f'({len(result.attempts)} attempt(s))')
+            if result.success:
+                self.channel_cache[result.device] = trace.channel
+            else:
+                self.channel_cache.pop(result.device, None)
+        if trace is not self._latest_trace:
+            # Superseded by a newer switch, which owns the state, or a
+            # switch_channel request, which is outside the state machine
             return
+        self._latest_trace = None
+        self.latency.record_trace(trace)
+        if all(result.success for result in trace.results):
+            self.state = self.SWITCHED_AWAY
+            # A predicted switch fires before the cursor is at the edge, so there is nothing to nudge
+            if not trace.predicted:
+                QCursor.setPos(QCursor.pos() + self.offsets[trace.position])
+        else:
+            # Let the next edge contact retry
+            self.state = self.IDLE
+            self._active_target = None
+
+    def _prediction_lead_time(self):
+        """Fire predictive switches this many seconds before the edge: the
+        measured median switch time, capped by PREDICT_MAX_LEAD_MS."""
+        max_lead = config.PREDICT_MAX_LEAD_MS / 1000.0
+        measured = self.latency.percentile('all', 'edge_to_done', 50)
+        if measured is None:
+            return max_lead
+        return min(measured / 1000.0, max_lead)
 
-        if config.REQUIRE_CTRL and not (QApplication.keyboardModifiers() & Qt.KeyboardModifier.ControlModifier):
+    def check_mouse_position(self, x, y):
+        target = self.zone_index.lookup(x, y)
+        if self.state != self.IDLE:
+            self._update_rearm(x, y)
+            # While switching or before re-arming only a different zone can switch
+            if target is None or target is self._active_target:
+                return
+        elif target is None:
+            self._wake_devices(x, y)
+
+        # Asks the window system: keyboardModifiers() only follows key events
+        # sent to our own windows, and the tray app has none in focus
+        if config.REQUIRE_CTRL and not (QGuiApplication.queryKeyboardModifiers() & Qt.KeyboardModifier.ControlModifier):
             return
 
-        mouse_pos = QCursor.pos()
-        targets = [
-            {'position': config.TARGET1_POS, 'channel': 1,
-             'mode': config.TARGET1_MODE, 'zone_size': config.TARGET1_ZONE_SIZE, 'zone_anchor': config.TARGET1_ZONE_ANCHOR},
-            {'position': config.TARGET2_POS, 'channel': 2,
-             'mode': config.TARGET2_MODE, 'zone_size': config.TARGET2_ZONE_SIZE, 'zone_anchor': config.TARGET2_ZONE_ANCHOR},
-            {'position': config.TARGET3_POS, 'channel': 3,
-             'mode': config.TARGET3_MODE, 'zone_size': config.TARGET3_ZONE_SIZE, 'zone_anchor': config.TARGET3_ZONE_ANCHOR},
-        ]
-        for target in targets:
-            position, channel = target['position'], target['channel']
-            # #3: Use -1/+1 margin so edge conditions can actually trigger
-            if not (
-                (position == 'left' and mouse_pos.x() <= self.leftmost_edge + 1)
-                or (position == 'right' and mouse_pos.x() >= self.rightmost_edge - 1)
-                or (position == 'top' and mouse_pos.y() <= self.topmost_edge + 1)
-                or (position == 'bottom' and mouse_pos.y() >= self.bottommost_edge - 1)
-            ):
+        predicted = False
+        if target is None:
+            if not config.PREDICTIVE:
+                return
+            target = self.prediction.update(time.monotonic(), x, y, self.zone_index, self._prediction_lead_time())
+            if target is None:
+                return
+            predicted = True
+            print(f"Predicted edge hit on {target['position']}, switching ahead")
+        else:
+            self.prediction.reset()
+        self._start_switch(target, predicted)
+
+    def _wake_devices(self, x, y):
+        """Ping the devices of the target the cursor is approaching so they
+        are awake by the time the switch command is sent."""
+        if not config.WAKE_BAND_PX:
+            return
+        target = self.zone_index.lookup(x, y, margin=config.WAKE_BAND_PX)
+        if target is None:
+            return
+        now = time.monotonic()
+        for device in target['devices']:
+            if device not in self.registry:
+                continue
+            if now - self._last_wake.get(device, -config.WAKE_INTERVAL_S) < config.WAKE_INTERVAL_S:
                 continue
+            self._last_wake[device] = now
+            receiver = self.registry.receiver(device)
+            self._wake_executor.submit(self._send_ping, receiver, self.registry.ping(device))
 
-            # Zone trigger filtering
-            if target['mode'] == 'zone':
-                zone_size = target['zone_size']
-                anchor = target['zone_anchor']
-                if position in ('left', 'right'):
-                    if anchor == 'start':
-                        in_zone = mouse_pos.y() <= self.topmost_edge + zone_size
-                    else:
-                        in_zone = mouse_pos.y() >= self.bottommost_edge - zone_size
-                else:  # top/bottom
-                    if anchor == 'start':
-                        in_zone = mouse_pos.x() <= self.leftmost_edge + zone_size
-                    else:
-                        in_zone = mouse_pos.x() >= self.rightmost_edge - zone_size
-                if not in_zone:
-                    continue
+    def _send_ping(self, receiver, ping):
+        try:
+            # The answer also feeds the device's response time estimate
+            outcome, _ = self.transports.get(receiver).request(receiver['vendor_id'], receiver['product_id'], ping)
+            if outcome == hidpp.ACK:
+                # Answering through our receiver, so not on any other host
+                self._worker.link_changed.emit(receiver, ping[1], True)
+        except Exception as e:
+            print('Error sending wake-up ping: {}'.format(e))
 
-            if config.PROTOCOL == 'bolt':
-                ms_cmd = [0x11, config.MS_RECEIVER_SLOT, config.MOUSE_ID, 0x1E, channel - 1] + [0x00] * 15
-                kb_cmd = [0x11, config.KB_RECEIVER_SLOT, config.KEYBOARD_ID, 0x1E, channel - 1] + [0x00] * 15
-            else:  # unifying
-                ms_cmd = [0x10, config.MS_RECEIVER_SLOT, config.MOUSE_ID, 0x1C, channel - 1, 0x00, 0x00]
-                kb_cmd = [0x10, config.KB_RECEIVER_SLOT, config.KEYBOARD_ID, 0x1C, channel - 1, 0x00, 0x00]
-            # #13: Run HID commands in a thread
-            self._switch_thread = ChannelSwitchThread(ms_cmd, kb_cmd, position)
-            self._switch_thread.finished.connect(self._on_switch_finished)
-            self._switch_thread.start()
-            break
+    def status(self):
+        return {
+            'running': self._running,
+            'state': self.state,
+            'active_channel': self._active_target['channel'] if self._active_target else None,
+            'channel_cache': dict(self.channel_cache),
+            'targets': len(config.TARGETS),
+            'devices': self.registry.names(),
+            'latency': self.latency.summary(),
+        }
+
+    def switch_channel(self, channel, devices=None):
+        """Switch devices (default: every registered device) to channel now,
+        outside the edge state machine. Returns the names switched."""
+        devices = devices or self.registry.names()
+        unknown = [device for device in devices if device not in self.registry]
+        if unknown:
+            raise ValueError(f"Unknown device(s): {', '.join(unknown)}")
+        trace = SwitchTrace(None, channel)
+        commands = [(device, self.registry.receiver(device), self.registry.switch_command(device, channel))
+                    for device in devices]
+        if not self._worker.isRunning():
+            self._worker.start()
+        self._worker.submit(trace, commands)
+        return devices
+
+    def _start_switch(self, target, predicted):
+        trace = SwitchTrace(target['position'], target['channel'], predicted)
+        self._active_target = target
+        channel = target['channel']
+        commands = []
+        for device in target['devices']:
+            if device not in self.registry:
+                print(f'Unknown device {device}, skipping')
+                continue
+            # Skip devices that are already on the target channel
+            if self.channel_cache.get(device) != channel:
+                commands.append((device, self.registry.receiver(device), self.registry.switch_command(device, channel)))
+        if not commands:
+            print(f'All devices already on channel {channel}, nothing to send')
+            self._latest_trace = None
+            self.state = self.SWITCHED_AWAY
+            return
+
+        # #13: Run HID commands in the worker thread
+        self.state = self.SWITCHING
+        self._latest_trace = trace
+        if not self._worker.isRunning():
+            self._worker.start()
+        self._worker.submit(trace, commands)
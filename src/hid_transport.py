@@ -0,0 +1,504 @@
+import os
+import platform
+import select
+import subprocess
+import threading
+import time
+
+import hidpp
+from utils import get_absolute_file_data_path, creation_flags
+
+
+class HidBackend:
+    """Interface for a handle on the receiver's HID++ interface."""
+    name = 'base'
+
+    def open(self, vendor_id, product_id):
+        raise NotImplementedError
+
+    def write(self, report):
+        """Write one output report (report ID first), return bytes written."""
+        raise NotImplementedError
+
+    def read(self, timeout):
+        """Return the next input report as a list of ints, or None after timeout seconds."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def is_open(self):
+        raise NotImplementedError
+
+
+class HidrawBackend(HidBackend):
+    """Linux hidraw node opened once and written to directly."""
+    name = 'hidraw'
+    SYSFS_ROOT = '/sys/class/hidraw'
+
+    def __init__(self, path=None):
+        self.path = path  # fixed /dev/hidrawN, otherwise the first matching receiver
+        self._fd = None
+
+    @classmethod
+    def available(cls):
+        return platform.system() == 'Linux' and os.path.isdir(cls.SYSFS_ROOT)
+
+    def open(self, vendor_id, product_id):
+        path = self.path or self.find_device(vendor_id, product_id)
+        if path is None:
+            raise OSError(f"No hidraw HID++ interface found for {vendor_id:04X}:{product_id:04X}")
+        self._fd = os.open(path, os.O_RDWR)
+
+    def write(self, report):
+        return os.write(self._fd, bytes(report))
+
+    def read(self, timeout):
+        fd = self._fd
+        if fd is None:
+            time.sleep(timeout)
+            return None
+        readable, _, _ = select.select([fd], [], [], timeout)
+        if not readable:
+            return None
+        return list(os.read(fd, 64))
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def is_open(self):
+        return self._fd is not None
+
+    @classmethod
+    def find_device(cls, vendor_id, product_id):
+        for entry in sorted(os.listdir(cls.SYSFS_ROOT)):
+            device_dir = os.path.join(cls.SYSFS_ROOT, entry, 'device')
+            try:
+                with open(os.path.join(device_dir, 'uevent')) as f:
+                    uevent = f.read()
+                with open(os.path.join(device_dir, 'report_descriptor'), 'rb') as f:
+                    descriptor = f.read()
+            except OSError:
+                continue
+            if _parse_hid_id(uevent) != (vendor_id, product_id):
+                continue
+            # The receiver exposes several interfaces; only the one with the
+            # vendor page (0xFF00) and HID++ report IDs accepts our packets.
+            if b'\x06\x00\xff' in descriptor and (b'\x85\x10' in descriptor or b'\x85\x11' in descriptor):
+                return os.path.join('/dev', entry)
+        return None
+
+
+def _parse_hid_id(uevent):
+    # HID_ID=0003:0000046D:0000C548
+    for line in uevent.splitlines():
+        if line.startswith('HID_ID='):
+            parts = line.split('=', 1)[1].split(':')
+            if len(parts) == 3:
+                return int(parts[1], 16), int(parts[2], 16)
+    return None
+
+
+class HidapitesterBackend(HidBackend):
+    """Fallback that runs the bundled hidapitester binary for every write.
+
+    hidapitester cannot keep a handle open between invocations, so this is
+    only used where no in-process backend is available (macOS, Windows).
+    Each invocation also reads up to max_reads input reports, each within
+    read_timeout_ms, and stops at the first one that answers the request;
+    read() hands them out afterwards. Notifications from other devices on
+    the receiver can arrive before the answer, hence more than one read.
+    """
+    name = 'hidapitester'
+    SHORT_LENGTH = 7
+    LONG_LENGTH = 20
+
+    def __init__(self, path=None, read_timeout_ms=250, max_reads=4):
+        self.path = path  # hidapi device path, otherwise opened by VID:PID and usage
+        self._vidpid = None
+        self.read_timeout_ms = read_timeout_ms
+        self.max_reads = max_reads
+        self._responses = []
+        self._condition = threading.Condition()
+
+    def open(self, vendor_id, product_id):
+        self._vidpid = f'{vendor_id:04X}:{product_id:04X}'
+
+    def write(self, report):
+        cmd = self.build_command(report)
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+                                   creationflags=creation_flags)
+        written = 0
+        reading = False
+        # hidapitester prints each read as a "read N bytes:" line with the
+        # hex bytes on the next; stop it once the answer has come in
+        for line in process.stdout:
+            if f"wrote {len(report)} bytes" in line:
+                written = len(report)
+            elif reading:
+                reading = False
+                response = _parse_hidapitester_bytes(line)
+                if not response:
+                    continue
+                with self._condition:
+                    self._responses.append(response)
+                    self._condition.notify_all()
+                if hidpp.match_response(report, response):
+                    process.kill()
+                    break
+            elif 'read' in line and 'bytes' in line and 'read 0 bytes' not in line:
+                reading = True
+        process.stdout.close()
+        process.wait()
+        return written
+
+    def read(self, timeout):
+        with self._condition:
+            if not self._responses:
+                self._condition.wait(timeout)
+            if self._responses:
+                return self._responses.pop(0)
+        return None
+
+    def close(self):
+        self._vidpid = None
+
+    def is_open(self):
+        return self._vidpid is not None
+
+    def build_command(self, report):
+        hex_string = ','.join(f'0x{byte:02X}' for byte in report)
+        length = str(len(report))
+        long_report = report[0] == hidpp.LONG_REPORT
+        usage = '2' if long_report else '1'
+        # The collection opened by usage only carries reports of its own ID
+        read_length = str(self.LONG_LENGTH if long_report else self.SHORT_LENGTH)
+        if self.path:
+            target = ['--open-path', self.path]
+        else:
+            target = ['--vidpid', self._vidpid, '--usage', usage, '--usagePage', '0xFF00', '--open']
+        return [
+            get_hidapi_executable_full_path(), *target,
+            '--length', length, '--send-output', hex_string,
+            '--timeout', str(self.read_timeout_ms), '--length', read_length,
+            *['--read-input'] * self.max_reads,
+        ]
+
+
+def _parse_hidapitester_bytes(line):
+    try:
+        return [int(b, 16) for b in line.split()] or None
+    except ValueError:
+        return None
+
+
+class FakeHidBackend(HidBackend):
+    """In-memory receiver for measuring switch latency without hardware.
+
+    latency: seconds each write takes.
+    fail_writes: number of upcoming writes that should fail.
+    response: what the device answers, hidpp.ACK, hidpp.ERROR, hidpp.LEFT
+        (link-lost notification) or None for silence.
+    response_latency: seconds between write and response.
+    error: (error report type, code) sent for hidpp.ERROR.
+    """
+    name = 'fake'
+
+    def __init__(self, path=None, latency=0.0, fail_writes=0, response=hidpp.ACK, response_latency=0.0,
+                 error=(hidpp.HIDPP10_ERROR, 0x09)):
+        self.path = path
+        self.latency = latency
+        self.fail_writes = fail_writes
+        self.response = response
+        self.response_latency = response_latency
+        self.error = error
+        self.open_count = 0
+        self.writes = []  # (monotonic timestamp, report)
+        self._open = False
+        self._pending = []  # (due, report)
+        self._condition = threading.Condition()
+
+    def open(self, vendor_id, product_id):
+        self.open_count += 1
+        self._open = True
+
+    def write(self, report):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.fail_writes > 0:
+            self.fail_writes -= 1
+            return 0
+        self.writes.append((time.monotonic(), list(report)))
+        response = self.build_response(report)
+        if response:
+            with self._condition:
+                self._pending.append((time.monotonic() + self.response_latency, response))
+                self._condition.notify_all()
+        return len(report)
+
+    def build_response(self, report):
+        if self.response == hidpp.ACK:
+            return list(report)
+        if self.response == hidpp.ERROR:
+            kind, code = self.error
+            return [report[0], report[1], kind, report[2], report[3], code] + [0x00] * (len(report) - 6)
+        if self.response == hidpp.LEFT:
+            return [hidpp.SHORT_REPORT, report[1], hidpp.DEVICE_CONNECTION, 0x00, hidpp.LINK_NOT_ESTABLISHED, 0x00, 0x00]
+        return None
+
+    def read(self, timeout):
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                if self._pending and self._pending[0][0] <= now:
+                    return self._pending.pop(0)[1]
+                if now >= deadline:
+                    return None
+                wait = deadline - now
+                if self._pending:
+                    wait = min(wait, self._pending[0][0] - now)
+                self._condition.wait(wait)
+
+    def close(self):
+        self._open = False
+
+    def is_open(self):
+        return self._open
+
+
+BACKENDS = {
+    'hidraw': HidrawBackend,
+    'hidapitester': HidapitesterBackend,
+    'fake': FakeHidBackend,
+}
+
+
+def create_backend(name='auto', path=None):
+    if name == 'auto':
+        name = 'hidraw' if HidrawBackend.available() else 'hidapitester'
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown HID backend: {name}")
+    return BACKENDS[name](path or None)
+
+
+class ResponseTimer:
+    """Smoothed response time per device, TCP RTO style (RFC 6298).
+
+    Gives the timeout to wait for a device's response and the back-off
+    before retrying it, both derived from what the device has actually
+    taken to answer so far.
+    """
+    INITIAL_TIMEOUT = 0.2
+    MIN_TIMEOUT = 0.02
+    MAX_TIMEOUT = 1.0
+
+    def __init__(self):
+        self.srtt = None
+        self.rttvar = None
+
+    def observe(self, rtt):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+
+    def timeout(self):
+        if self.srtt is None:
+            return self.INITIAL_TIMEOUT
+        return min(self.MAX_TIMEOUT, max(self.MIN_TIMEOUT, self.srtt + 4 * self.rttvar))
+
+    def backoff(self, attempt):
+        """Delay before retry number `attempt` (1-based), doubling each time."""
+        base = self.srtt if self.srtt is not None else self.INITIAL_TIMEOUT / 4
+        return min(self.MAX_TIMEOUT, max(0.01, base) * 2 ** (attempt - 1))
+
+
+class _Waiter:
+    def __init__(self, request):
+        self.request = request
+        self.event = threading.Event()
+        self.outcome = None
+        self.error = None
+
+
+class HidTransport:
+    """Keeps one receiver handle open and shares it between writers.
+
+    The handle is opened on first use and reopened only when the receiver
+    VID:PID changes or a write fails at the OS level. A reader thread owns
+    all reads and routes each input report to the request it answers, so
+    concurrent requests for different devices never steal each other's
+    responses.
+
+    on_link(device_index, connected), if given, is called on the reader
+    thread for every device connection notification from the receiver,
+    and with device_index None after the handle had to be reopened, when
+    any device may have come and gone unseen.
+    """
+
+    def __init__(self, backend, on_link=None):
+        self.backend = backend
+        self.on_link = on_link
+        self._lock = threading.Lock()
+        self._vidpid = None
+        self._waiters = []
+        self._reader = None
+        self._reader_stop = threading.Event()
+        self._timers = {}
+
+    def _ensure_open(self, vendor_id, product_id):
+        if self._vidpid == (vendor_id, product_id) and self.backend.is_open():
+            return
+        self.backend.close()
+        self._vidpid = None
+        self.backend.open(vendor_id, product_id)
+        self._vidpid = (vendor_id, product_id)
+        if self._reader is None:
+            self._reader_stop.clear()
+            self._reader = threading.Thread(target=self._read_loop, name='hid-reader', daemon=True)
+            self._reader.start()
+
+    def _read_loop(self):
+        while not self._reader_stop.is_set():
+            try:
+                report = self.backend.read(0.1)
+            except (OSError, ValueError):
+                # Handle is being reopened or closed
+                time.sleep(0.05)
+                continue
+            if not report:
+                continue
+            with self._lock:
+                waiters = list(self._waiters)
+            for waiter in waiters:
+                match = hidpp.match_response(waiter.request, report)
+                if match:
+                    waiter.outcome, waiter.error = match
+                    waiter.event.set()
+            link = hidpp.link_change(report)
+            if link is not None and self.on_link is not None:
+                self.on_link(*link)
+
+    def write(self, vendor_id, product_id, report):
+        # Only opening is serialised; each write is a single report, so
+        # writes for different devices can go out from parallel threads.
+        with self._lock:
+            self._ensure_open(vendor_id, product_id)
+        try:
+            written = self.backend.write(report)
+        except OSError:
+            # Receiver was unplugged or re-enumerated; try once with a fresh handle
+            with self._lock:
+                self.backend.close()
+                self._vidpid = None
+                self._ensure_open(vendor_id, product_id)
+            if self.on_link is not None:
+                self.on_link(None, True)
+            written = self.backend.write(report)
+        return written == len(report)
+
+    def request(self, vendor_id, product_id, report, timeout=None):
+        """Write report and wait for its HID++ response.
+
+        Returns (outcome, error) with outcome one of hidpp.ACK, ERROR, LEFT,
+        TIMEOUT or WRITE_FAILED; error is (report type, code) for ERROR.
+        """
+        timer = self.response_timer(report[1])
+        if timeout is None:
+            timeout = timer.timeout()
+        waiter = _Waiter(report)
+        with self._lock:
+            self._waiters.append(waiter)
+        started = time.monotonic()
+        try:
+            if not self.write(vendor_id, product_id, report):
+                return hidpp.WRITE_FAILED, None
+            if not waiter.event.wait(timeout):
+                return hidpp.TIMEOUT, None
+            timer.observe(time.monotonic() - started)
+            return waiter.outcome, waiter.error
+        finally:
+            with self._lock:
+                self._waiters.remove(waiter)
+
+    def response_timer(self, device_index):
+        if device_index not in self._timers:
+            self._timers[device_index] = ResponseTimer()
+        return self._timers[device_index]
+
+    def close(self):
+        self._reader_stop.set()
+        if self._reader is not None:
+            self._reader.join(1.0)
+            self._reader = None
+        with self._lock:
+            self.backend.close()
+            self._vidpid = None
+
+
+class TransportPool:
+    """One HidTransport, and so one open handle, per receiver.
+
+    backend_factory(receiver) returns a new HidBackend for a receiver dict
+    (see devices.default_receiver). Transports are created on first use
+    and keyed by receiver name. on_link(receiver, device_index, connected)
+    is each transport's on_link with the receiver added.
+    """
+
+    def __init__(self, backend_factory, on_link=None):
+        self._backend_factory = backend_factory
+        self._on_link = on_link
+        self._lock = threading.Lock()
+        self._transports = {}
+
+    def get(self, receiver):
+        with self._lock:
+            transport = self._transports.get(receiver['name'])
+            if transport is None:
+                on_link = None
+                if self._on_link is not None:
+                    on_link = lambda index, connected, receiver=receiver: self._on_link(receiver, index, connected)
+                transport = HidTransport(self._backend_factory(receiver), on_link)
+                self._transports[receiver['name']] = transport
+            return transport
+
+    def transports(self):
+        with self._lock:
+            return dict(self._transports)
+
+    def close(self):
+        with self._lock:
+            transports, self._transports = self._transports, {}
+        for transport in transports.values():
+            transport.close()
+
+
+def get_hidapi_executable_full_path():
+    arch = platform.machine()
+    system = platform.system().lower()
+    executable = None
+
+    if system == 'windows':
+        if arch in ('x86_64', 'AMD64'):
+            executable = 'hidapitester-windows-x86_64.exe'
+    elif system == 'linux':
+        if arch == 'x86_64':
+            executable = 'hidapitester-linux-x86_64'
+        elif arch == 'armv7l':
+            executable = 'hidapitester-linux-armv7l'
+    elif system == 'darwin':
+        if arch == 'arm64':
+            executable = 'hidapitester-macos-arm64'
+        elif arch == 'x86_64':
+            executable = 'hidapitester-macos-x86_64'
+
+    # #2: Raise instead of UnboundLocalError on unsupported arch
+    if executable is None:
+        raise RuntimeError(f"Unsupported platform: {system} {arch}")
+
+    return get_absolute_file_data_path('hidapitester', executable)
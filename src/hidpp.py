@@ -0,0 +1,72 @@
+SHORT_REPORT = 0x10
+LONG_REPORT = 0x11
+
+HIDPP10_ERROR = 0x8F
+HIDPP20_ERROR = 0xFF
+# Receiver notification sent when a paired device connects or disconnects
+DEVICE_CONNECTION = 0x41
+LINK_NOT_ESTABLISHED = 0x40
+
+# Request outcomes
+ACK = 'ack'
+ERROR = 'error'
+LEFT = 'left'  # device dropped its link to this receiver, i.e. it switched host
+TIMEOUT = 'timeout'
+WRITE_FAILED = 'write_failed'
+
+HIDPP10_ERRORS = {
+    0x01: 'INVALID_SUBID', 0x02: 'INVALID_ADDRESS', 0x03: 'INVALID_VALUE', 0x04: 'CONNECT_FAIL',
+    0x05: 'TOO_MANY_DEVICES', 0x06: 'ALREADY_EXISTS', 0x07: 'BUSY', 0x08: 'UNKNOWN_DEVICE',
+    0x09: 'RESOURCE_ERROR', 0x0A: 'REQUEST_UNAVAILABLE', 0x0B: 'INVALID_PARAM_VALUE', 0x0C: 'WRONG_PIN_CODE',
+}
+HIDPP20_ERRORS = {
+    0x01: 'UNKNOWN', 0x02: 'INVALID_ARGUMENT', 0x03: 'OUT_OF_RANGE', 0x04: 'HW_ERROR',
+    0x05: 'LOGITECH_INTERNAL', 0x06: 'INVALID_FEATURE_INDEX', 0x07: 'INVALID_FUNCTION_ID',
+    0x08: 'BUSY', 0x09: 'UNSUPPORTED',
+}
+
+# Errors worth another attempt: the device is asleep, busy or momentarily out of range
+RETRYABLE_ERRORS = {(HIDPP10_ERROR, 0x07), (HIDPP10_ERROR, 0x08), (HIDPP10_ERROR, 0x09),
+                    (HIDPP20_ERROR, 0x04), (HIDPP20_ERROR, 0x08)}
+# The receiver can no longer reach the device
+UNREACHABLE_ERRORS = {(HIDPP10_ERROR, 0x08), (HIDPP10_ERROR, 0x09)}
+
+
+def ping_message(protocol, device_index):
+    """IRoot ping (feature 0x00, function 1, swID 0xF), the same probe
+    tools/probe_devices.py uses. Cheap, and enough to wake a sleeping device."""
+    if protocol == 'bolt':
+        return [LONG_REPORT, device_index, 0x00, 0x1F, 0x00, 0x00, 0xAA] + [0x00] * 13
+    return [SHORT_REPORT, device_index, 0x00, 0x1F, 0x00, 0x00, 0xAA]
+
+
+def link_change(report):
+    """(device index, connected) if report is a receiver's device connection
+    notification, else None."""
+    if len(report) >= 5 and report[2] == DEVICE_CONNECTION:
+        return report[1], not report[4] & LINK_NOT_ESTABLISHED
+    return None
+
+
+def match_response(request, response):
+    """Classify an input report against an outstanding request.
+
+    Returns (outcome, error) where error is (error_report_type, code) for
+    ERROR, or None if the report does not belong to this request.
+    """
+    if len(response) < 4 or response[1] != request[1]:
+        return None
+    if response[2] == request[2] and response[3] == request[3]:
+        return ACK, None
+    if response[2] in (HIDPP10_ERROR, HIDPP20_ERROR) and len(response) >= 6 \
+            and response[3] == request[2] and response[4] == request[3]:
+        return ERROR, (response[2], response[5])
+    if response[2] == DEVICE_CONNECTION and len(response) >= 5 and response[4] & LINK_NOT_ESTABLISHED:
+        return LEFT, None
+    return None
+
+
+def error_name(error):
+    kind, code = error
+    names = HIDPP10_ERRORS if kind == HIDPP10_ERROR else HIDPP20_ERRORS
+    return f"{names.get(code, 'UNKNOWN')} (0x{kind:02X}/0x{code:02X})"
@@ -0,0 +1,228 @@
+import ctypes
+import ctypes.util
+import os
+import platform
+import time
+
+from PyQt6.QtGui import QCursor
+
+
+class IdleProvider:
+    """Answers "seconds since the user's last input" from the OS.
+
+    precise is False for providers that can only notice input when asked,
+    so callers should keep polling them rather than sleep until the idle
+    threshold.
+    """
+    name = 'base'
+    precise = True
+
+    def idle_seconds(self):
+        """Seconds since the last keyboard or pointer input, or None if unknown."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class XScreenSaverIdleProvider(IdleProvider):
+    """X11: XScreenSaverQueryInfo from libXss, the server's own idle counter."""
+    name = 'xscreensaver'
+
+    class _Info(ctypes.Structure):
+        _fields_ = [
+            ('window', ctypes.c_ulong),
+            ('state', ctypes.c_int),
+            ('kind', ctypes.c_int),
+            ('til_or_since', ctypes.c_ulong),
+            ('idle', ctypes.c_ulong),
+            ('eventMask', ctypes.c_ulong),
+        ]
+
+    def __init__(self):
+        self._xlib = ctypes.cdll.LoadLibrary(ctypes.util.find_library('X11'))
+        self._xss = ctypes.cdll.LoadLibrary(ctypes.util.find_library('Xss'))
+        self._xlib.XOpenDisplay.restype = ctypes.c_void_p
+        self._xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        self._xlib.XDefaultRootWindow.restype = ctypes.c_ulong
+        self._xlib.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        self._xlib.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        self._xlib.XFree.argtypes = [ctypes.c_void_p]
+        self._xss.XScreenSaverAllocInfo.restype = ctypes.POINTER(self._Info)
+        self._xss.XScreenSaverQueryInfo.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(self._Info)]
+        self._display = self._xlib.XOpenDisplay(None)
+        if not self._display:
+            raise OSError('Cannot open X display')
+        self._root = self._xlib.XDefaultRootWindow(self._display)
+        self._info = self._xss.XScreenSaverAllocInfo()
+
+    @classmethod
+    def available(cls):
+        return (platform.system() == 'Linux' and bool(os.environ.get('DISPLAY'))
+                and not os.environ.get('WAYLAND_DISPLAY')
+                and ctypes.util.find_library('X11') is not None
+                and ctypes.util.find_library('Xss') is not None)
+
+    def idle_seconds(self):
+        if not self._xss.XScreenSaverQueryInfo(self._display, self._root, self._info):
+            return None
+        return self._info.contents.idle / 1000.0
+
+    def close(self):
+        if self._display:
+            self._xlib.XFree(self._info)
+            self._xlib.XCloseDisplay(self._display)
+            self._display = None
+
+
+class LogindIdleProvider(IdleProvider):
+    """systemd-logind IdleHint of the current session, over D-Bus.
+
+    Works on Wayland, but only as fine as the desktop's own idle timeout:
+    the session counts as active until the desktop sets IdleHint.
+    """
+    name = 'logind'
+    # An answer of 0 only means the hint is not set yet, not that there was
+    # input just now: sleeping the whole threshold on it would overshoot
+    precise = False
+    SERVICE = 'org.freedesktop.login1'
+    SESSION_PATH = '/org/freedesktop/login1/session/auto'
+    SESSION_INTERFACE = 'org.freedesktop.login1.Session'
+
+    def __init__(self, bus=None):
+        from PyQt6.QtDBus import QDBusConnection, QDBusInterface
+        self._bus = bus if bus is not None else QDBusConnection.systemBus()
+        self._properties = QDBusInterface(
+            self.SERVICE, self.SESSION_PATH, 'org.freedesktop.DBus.Properties', self._bus)
+
+    @classmethod
+    def available(cls):
+        return platform.system() == 'Linux' and os.path.isdir('/run/systemd/sessions')
+
+    def _get(self, name):
+        reply = self._properties.call('Get', self.SESSION_INTERFACE, name)
+        arguments = reply.arguments()
+        if not arguments:
+            return None
+        value = arguments[0]
+        return value.variant() if hasattr(value, 'variant') else value
+
+    def idle_seconds(self):
+        if not self._get('IdleHint'):
+            return 0.0 if self._properties.isValid() else None
+        # CLOCK_MONOTONIC in microseconds, the clock time.monotonic() uses on Linux
+        since = self._get('IdleSinceHintMonotonic')
+        if not since:
+            return None
+        return max(0.0, time.monotonic() - since / 1e6)
+
+
+class WindowsIdleProvider(IdleProvider):
+    """Windows: GetLastInputInfo, milliseconds of tick count since the last input."""
+    name = 'windows'
+
+    class _LastInputInfo(ctypes.Structure):
+        _fields_ = [('cbSize', ctypes.c_uint), ('dwTime', ctypes.c_uint)]
+
+    def __init__(self):
+        self._user32 = ctypes.windll.user32
+        self._kernel32 = ctypes.windll.kernel32
+        self._info = self._LastInputInfo()
+        self._info.cbSize = ctypes.sizeof(self._info)
+
+    @classmethod
+    def available(cls):
+        return platform.system() == 'Windows'
+
+    def idle_seconds(self):
+        if not self._user32.GetLastInputInfo(ctypes.byref(self._info)):
+            return None
+        # Both are 32-bit tick counts, so wrap-around is handled by the mask
+        return ((self._kernel32.GetTickCount() - self._info.dwTime) & 0xFFFFFFFF) / 1000.0
+
+
+class MacIdleProvider(IdleProvider):
+    """macOS: CGEventSourceSecondsSinceLastEventType for any input event."""
+    name = 'macos'
+    COMBINED_SESSION_STATE = 0
+    ANY_INPUT_EVENT = 0xFFFFFFFF
+
+    def __init__(self):
+        self._quartz = ctypes.cdll.LoadLibrary(ctypes.util.find_library('ApplicationServices'))
+        self._quartz.CGEventSourceSecondsSinceLastEventType.restype = ctypes.c_double
+        self._quartz.CGEventSourceSecondsSinceLastEventType.argtypes = [ctypes.c_int32, ctypes.c_uint32]
+
+    @classmethod
+    def available(cls):
+        return platform.system() == 'Darwin'
+
+    def idle_seconds(self):
+        return self._quartz.CGEventSourceSecondsSinceLastEventType(
+            self.COMBINED_SESSION_STATE, self.ANY_INPUT_EVENT)
+
+
+class CursorIdleProvider(IdleProvider):
+    """Fallback: time since QCursor.pos() was last seen to change.
+
+    Misses keyboard-only activity and only notices movement when asked.
+    """
+    name = 'cursor'
+    precise = False
+
+    def __init__(self):
+        self._position = QCursor.pos()
+        self._changed = time.monotonic()
+
+    def idle_seconds(self):
+        position = QCursor.pos()
+        if position != self._position:
+            self._position = position
+            self._changed = time.monotonic()
+        return time.monotonic() - self._changed
+
+
+class FakeIdleProvider(IdleProvider):
+    """Scripted idle time for tests: idle time grows with the real clock
+    from whatever set_idle() or user_input() last set."""
+    name = 'fake'
+
+    def __init__(self, idle=0.0):
+        self.set_idle(idle)
+
+    def set_idle(self, seconds):
+        self._last_input = time.monotonic() - seconds
+
+    def user_input(self):
+        self.set_idle(0.0)
+
+    def idle_seconds(self):
+        return time.monotonic() - self._last_input
+
+
+IDLE_PROVIDERS = {
+    'xscreensaver': XScreenSaverIdleProvider,
+    'logind': LogindIdleProvider,
+    'windows': WindowsIdleProvider,
+    'macos': MacIdleProvider,
+    'cursor': CursorIdleProvider,
+    'fake': FakeIdleProvider,
+}
+
+
+def create_idle_provider(name='auto'):
+    if name == 'auto':
+        for candidate in ('windows', 'macos', 'xscreensaver', 'logind'):
+            if IDLE_PROVIDERS[candidate].available():
+                try:
+                    provider = IDLE_PROVIDERS[candidate]()
+                except (OSError, AttributeError, ImportError) as e:
+                    print(f'Idle provider {candidate} unavailable: {e}')
+                    continue
+                # e.g. no system bus or no session for this process
+                if provider.idle_seconds() is not None:
+                    return provider
+                provider.close()
+        return CursorIdleProvider()
+    if name not in IDLE_PROVIDERS:
+        raise ValueError(f"Unknown idle provider: {name}")
+    return IDLE_PROVIDERS[name]()
@@ -0,0 +1,199 @@
+import ctypes
+import os
+import platform
+import shutil
+import subprocess
+
+APP_NAME = 'Logitech Channel Switcher'
+REASON = 'Keep Me Awake'
+
+
+class Inhibitor:
+    """Keeps the screen and system awake between start() and stop().
+
+    start() raises OSError when the OS refuses, so the caller can fall back
+    to another inhibitor.
+    """
+    name = 'base'
+
+    def start(self):
+        raise NotImplementedError
+
+    def stop(self):
+        raise NotImplementedError
+
+
+def _check_reply(reply):
+    from PyQt6.QtDBus import QDBusMessage
+    if reply.type() == QDBusMessage.MessageType.ErrorMessage:
+        raise OSError(reply.errorMessage() or reply.errorName())
+    return reply.arguments()
+
+
+class ScreenSaverInhibitor(Inhibitor):
+    """freedesktop ScreenSaver Inhibit/UnInhibit on the session bus.
+
+    Implemented by GNOME, KDE, Xfce and most Wayland compositors' portals.
+    The inhibit lasts until UnInhibit or until our bus connection closes.
+    """
+    name = 'screensaver'
+    SERVICE = 'org.freedesktop.ScreenSaver'
+    PATH = '/org/freedesktop/ScreenSaver'
+    INTERFACE = 'org.freedesktop.ScreenSaver'
+
+    def __init__(self, bus=None):
+        from PyQt6.QtDBus import QDBusConnection, QDBusInterface
+        self._bus = bus if bus is not None else QDBusConnection.sessionBus()
+        self._interface = QDBusInterface(self.SERVICE, self.PATH, self.INTERFACE, self._bus)
+        self._cookie = None
+
+    @classmethod
+    def available(cls, bus=None):
+        from PyQt6.QtDBus import QDBusConnection
+        bus = bus if bus is not None else QDBusConnection.sessionBus()
+        return bus.isConnected() and bus.interface().isServiceRegistered(cls.SERVICE).value()
+
+    def start(self):
+        if self._cookie is None:
+            self._cookie = _check_reply(self._interface.call('Inhibit', APP_NAME, REASON))[0]
+
+    def stop(self):
+        if self._cookie is not None:
+            from PyQt6.QtCore import QVariant, QMetaType
+            # UnInhibit takes a uint32, a plain Python int would be sent as int32
+            cookie = QVariant(self._cookie)
+            cookie.convert(QMetaType(QMetaType.Type.UInt.value))
+            try:
+                _check_reply(self._interface.call('UnInhibit', cookie))
+            except OSError as e:
+                # Nothing to fall back to; the inhibit ends with our bus connection at the latest
+                print(f'ScreenSaver UnInhibit of cookie {self._cookie} failed: {e}')
+            self._cookie = None
+
+
+class LogindInhibitor(Inhibitor):
+    """systemd-logind idle and sleep inhibitor lock on the system bus.
+
+    logind hands back a file descriptor; the lock is held for as long as
+    it stays open. We keep a dup of it and close that in stop(), rather
+    than rely on the reply's copy being garbage collected.
+    """
+    name = 'logind'
+    SERVICE = 'org.freedesktop.login1'
+    PATH = '/org/freedesktop/login1'
+    INTERFACE = 'org.freedesktop.login1.Manager'
+
+    def __init__(self, bus=None):
+        from PyQt6.QtDBus import QDBusConnection, QDBusInterface
+        self._bus = bus if bus is not None else QDBusConnection.systemBus()
+        self._interface = QDBusInterface(self.SERVICE, self.PATH, self.INTERFACE, self._bus)
+        self._fd = None
+
+    @classmethod
+    def available(cls, bus=None):
+        from PyQt6.QtDBus import QDBusConnection
+        bus = bus if bus is not None else QDBusConnection.systemBus()
+        return bus.isConnected() and bus.interface().isServiceRegistered(cls.SERVICE).value()
+
+    def start(self):
+        if self._fd is None:
+            lock = _check_reply(self._interface.call('Inhibit', 'idle:sleep', APP_NAME, REASON, 'block'))[0]
+            if not lock.isValid():
+                raise OSError('logind Inhibit returned no file descriptor')
+            # The reply's own copy closes whenever it is collected
+            self._fd = os.dup(lock.fileDescriptor())
+
+    def stop(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class WindowsInhibitor(Inhibitor):
+    """SetThreadExecutionState: the system and display stay on while set.
+
+    The state belongs to the calling thread, so start() and stop() must
+    both run on the GUI thread.
+    """
+    name = 'windows'
+    ES_CONTINUOUS = 0x80000000
+    ES_SYSTEM_REQUIRED = 0x00000001
+    ES_DISPLAY_REQUIRED = 0x00000002
+
+    def __init__(self):
+        self._kernel32 = ctypes.windll.kernel32
+        self._kernel32.SetThreadExecutionState.restype = ctypes.c_uint
+        self._kernel32.SetThreadExecutionState.argtypes = [ctypes.c_uint]
+
+    @classmethod
+    def available(cls):
+        return platform.system() == 'Windows'
+
+    def start(self):
+        flags = self.ES_CONTINUOUS | self.ES_SYSTEM_REQUIRED | self.ES_DISPLAY_REQUIRED
+        if not self._kernel32.SetThreadExecutionState(flags):
+            raise OSError('SetThreadExecutionState failed')
+
+    def stop(self):
+        self._kernel32.SetThreadExecutionState(self.ES_CONTINUOUS)
+
+
+class MacInhibitor(Inhibitor):
+    """caffeinate -di, tied to our pid so it cannot outlive the app."""
+    name = 'macos'
+
+    def __init__(self):
+        self._process = None
+
+    @classmethod
+    def available(cls):
+        return platform.system() == 'Darwin' and shutil.which('caffeinate') is not None
+
+    def start(self):
+        if self._process is None:
+            self._process = subprocess.Popen(['caffeinate', '-d', '-i', '-w', str(os.getpid())])
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            self._process.wait()
+            self._process = None
+
+
+class EmulationInhibitor(Inhibitor):
+    """Fallback: move the cursor and press F15 while the user is idle."""
+    name = 'emulation'
+
+    def __init__(self):
+        from mouse_emulation import MouseEmulation
+        self.mouse_emulation = MouseEmulation()
+
+    @classmethod
+    def available(cls):
+        return True
+
+    def start(self):
+        self.mouse_emulation.start()
+
+    def stop(self):
+        self.mouse_emulation.stop()
+
+
+INHIBITORS = {
+    'screensaver': ScreenSaverInhibitor,
+    'logind': LogindInhibitor,
+    'windows': WindowsInhibitor,
+    'macos': MacInhibitor,
+    'emulation': EmulationInhibitor,
+}
+
+
+def create_inhibitor(name='auto'):
+    if name == 'auto':
+        for candidate in ('windows', 'macos', 'screensaver', 'logind'):
+            if INHIBITORS[candidate].available():
+                return INHIBITORS[candidate]()
+        return EmulationInhibitor()
+    if name not in INHIBITORS:
+        raise ValueError(f"Unknown inhibitor: {name}")
+    return INHIBITORS[name]()
@@ -0,0 +1,247 @@
+import json
+import os
+import platform
+import struct
+import time
+
+from PyQt6.QtCore import QObject, QTimer, QSocketNotifier, Qt, pyqtSignal
+from PyQt6.QtGui import QCursor
+
+from scheduler import get_scheduler
+
+
+class CursorSource(QObject):
+    """Pushes cursor positions to Flow instead of Flow asking for them."""
+    moved = pyqtSignal(int, int)
+    name = 'base'
+
+    def start(self):
+        raise NotImplementedError
+
+    def stop(self):
+        raise NotImplementedError
+
+
+class PollingCursorSource(CursorSource):
+    """Fallback: sample QCursor.pos() on a fixed interval."""
+    name = 'poll'
+
+    def __init__(self, interval=300):
+        super().__init__()
+        self.interval = interval
+        self.task = None
+
+    def start(self):
+        # Registered only while running, Flow replaces its source on reload
+        if self.task is None:
+            self.task = get_scheduler().add('cursor poll', self._poll, self.interval / 1000)
+        self.task.start()
+
+    def stop(self):
+        if self.task is not None:
+            get_scheduler().remove(self.task)
+            self.task = None
+
+    def _poll(self):
+        # Emit every tick, even when the cursor is still, so holding Ctrl
+        # against an edge still triggers with REQUIRE_CTRL
+        pos = QCursor.pos()
+        self.moved.emit(pos.x(), pos.y())
+
+
+class EvdevCursorSource(CursorSource):
+    """Linux: wake up only when a pointer device reports motion.
+
+    Reads raw input_event records from /dev/input/event* of every device the
+    kernel attaches a mouse handler to. The events only say that the pointer
+    moved; the position itself still comes from QCursor.pos(). Bursts from
+    high polling rate mice are coalesced to at most one push per
+    min_interval ms.
+
+    With watch_ctrl keyboards are read too, for Ctrl presses and releases
+    only, so a cursor already resting at an edge is checked again when Ctrl
+    goes down. If no device can be opened (typically a user outside the
+    input group) it polls like PollingCursorSource instead.
+    """
+    name = 'evdev'
+    EVENT_FORMAT = 'llHHi'
+    EVENT_SIZE = struct.calcsize(EVENT_FORMAT)
+    EV_KEY = 0x01
+    EV_REL = 0x02
+    EV_ABS = 0x03
+    KEY_LEFTCTRL = 29
+    KEY_RIGHTCTRL = 97
+
+    def __init__(self, min_interval=8, watch_ctrl=False):
+        super().__init__()
+        self._fds = []
+        self._notifiers = []
+        self._fallback = None
+        self.watch_ctrl = watch_ctrl
+        self._min_interval = min_interval
+        self._last_emit = 0.0
+        self._deferred = QTimer()
+        self._deferred.setSingleShot(True)
+        self._deferred.setTimerType(Qt.TimerType.PreciseTimer)
+        self._deferred.timeout.connect(self._emit_position)
+
+    @classmethod
+    def available(cls):
+        if platform.system() != 'Linux':
+            return False
+        for path in cls.pointer_devices():
+            if os.access(path, os.R_OK):
+                return True
+        return False
+
+    @staticmethod
+    def pointer_devices(handler='mouse'):
+        """event devices the kernel gives a handler starting with handler."""
+        try:
+            with open('/proc/bus/input/devices') as f:
+                blocks = f.read().split('\n\n')
+        except OSError:
+            return []
+        paths = []
+        for block in blocks:
+            for line in block.splitlines():
+                if not line.startswith('H: Handlers='):
+                    continue
+                handlers = line.split('=', 1)[1].split()
+                if not any(h.startswith(handler) for h in handlers):
+                    continue
+                paths += [os.path.join('/dev/input', h) for h in handlers if h.startswith('event')]
+        return paths
+
+    def start(self):
+        if self._fds or self._fallback is not None:
+            return
+        paths = self.pointer_devices()
+        if self.watch_ctrl:
+            # Receivers with a keyboard and a mouse show up under both
+            paths += [path for path in self.pointer_devices('kbd') if path not in paths]
+        for path in paths:
+            try:
+                fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+            except OSError as e:
+                print(f'Cannot open {path}: {e}')
+                continue
+            notifier = QSocketNotifier(fd, QSocketNotifier.Type.Read)
+            notifier.activated.connect(lambda _socket, fd=fd: self._on_readable(fd))
+            self._fds.append(fd)
+            self._notifiers.append(notifier)
+        if not self._fds:
+            print('No readable input device in /dev/input (is this user in the input group?), '
+                  'polling the cursor instead')
+            self._fallback = PollingCursorSource()
+            self._fallback.moved.connect(self.moved)
+            self._fallback.start()
+
+    def stop(self):
+        if self._fallback is not None:
+            self._fallback.stop()
+            self._fallback = None
+        self._deferred.stop()
+        for notifier in self._notifiers:
+            notifier.setEnabled(False)
+        for fd in self._fds:
+            os.close(fd)
+        self._notifiers = []
+        self._fds = []
+
+    def _on_readable(self, fd):
+        moved = False
+        while True:
+            try:
+                data = os.read(fd, self.EVENT_SIZE * 64)
+            except BlockingIOError:
+                break
+            except OSError:
+                # Device unplugged
+                break
+            if not data:
+                break
+            for offset in range(0, len(data) - self.EVENT_SIZE + 1, self.EVENT_SIZE):
+                _, _, ev_type, code, value = struct.unpack_from(self.EVENT_FORMAT, data, offset)
+                if ev_type in (self.EV_REL, self.EV_ABS):
+                    moved = True
+                elif (ev_type == self.EV_KEY and code in (self.KEY_LEFTCTRL, self.KEY_RIGHTCTRL)
+                        and value in (0, 1)):
+                    # Not a move, but with REQUIRE_CTRL the edge check may now pass
+                    moved = True
+        if not moved or self._deferred.isActive():
+            return
+        elapsed = (time.monotonic() - self._last_emit) * 1000
+        if elapsed >= self._min_interval:
+            self._emit_position()
+        else:
+            self._deferred.start(int(self._min_interval - elapsed) + 1)
+
+    def _emit_position(self):
+        self._last_emit = time.monotonic()
+        pos = QCursor.pos()
+        self.moved.emit(pos.x(), pos.y())
+
+
+class ReplayCursorSource(CursorSource):
+    """Replays recorded or synthetic cursor samples for benchmarks.
+
+    samples: list of (seconds_from_start, x, y). Each emission is logged in
+    `emitted` as (monotonic timestamp, x, y) so consumers can measure the
+    latency from a sample to whatever it triggered.
+    """
+    name = 'replay'
+
+    def __init__(self, samples, speed=1.0):
+        super().__init__()
+        self.samples = list(samples)
+        self.speed = speed
+        self.emitted = []
+        self._index = 0
+        self._started_at = None
+        self.timer = QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.timeout.connect(self._step)
+
+    @classmethod
+    def load(cls, path, speed=1.0):
+        with open(path) as f:
+            return cls([tuple(sample) for sample in json.load(f)], speed)
+
+    def finished(self):
+        return self._index >= len(self.samples)
+
+    def start(self):
+        self._index = 0
+        self.emitted = []
+        self._started_at = time.monotonic()
+        self._schedule()
+
+    def stop(self):
+        self.timer.stop()
+
+    def _schedule(self):
+        if self.finished():
+            return
+        due = self._started_at + self.samples[self._index][0] / self.speed
+        self.timer.start(max(0, int((due - time.monotonic()) * 1000)))
+
+    def _step(self):
+        _, x, y = self.samples[self._index]
+        self._index += 1
+        self.emitted.append((time.monotonic(), x, y))
+        self.moved.emit(x, y)
+        self._schedule()
+
+
+def create_cursor_source(name='auto', watch_ctrl=False):
+    """watch_ctrl: also push the position when Ctrl is pressed or released,
+    for REQUIRE_CTRL (the polling source pushes it every tick anyway)."""
+    if name == 'auto':
+        name = 'evdev' if EvdevCursorSource.available() else 'poll'
+    if name == 'evdev':
+        return EvdevCursorSource(watch_ctrl=watch_ctrl)
+    if name == 'poll':
+        return PollingCursorSource()
+    raise ValueError(f"Unknown cursor source: {name}")
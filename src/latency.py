@@ -0,0 +1,116 @@
+import json
+import math
+import time
+from collections import deque
+
+
+class LatencyHistogram:
+    """Fixed-size ring of the most recent samples (ms) for one stage."""
+
+    def __init__(self, size=512):
+        self._samples = deque(maxlen=size)
+
+    def record(self, value_ms):
+        self._samples.append(value_ms)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, p):
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        # Nearest-rank percentile
+        rank = math.ceil(p / 100.0 * len(ordered))
+        return ordered[max(0, min(len(ordered), rank) - 1)]
+
+    def summary(self):
+        if not self._samples:
+            return {'count': 0}
+        return {
+            'count': len(self._samples),
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'max': max(self._samples),
+        }
+
+
+class SwitchTrace:
+    """time.monotonic() timestamps of one switch, from edge hit to finish."""
+
+    def __init__(self, position, channel=None, predicted=False):
+        self.position = position
+        self.channel = channel
+        self.predicted = predicted  # fired by the predictor before the edge was reached
+        self.edge_detected = time.monotonic()
+        self.thread_started = None  # first write of the switch picked up by the worker
+        self.finished = None
+        self.results = []  # SwitchResult per device, with per-attempt timings
+
+
+class LatencyRecorder:
+    """Per device, per stage latency histograms fed from SwitchTraces.
+
+    Stages:
+      edge_to_thread  edge detected -> switch picked up by the worker thread
+      attempt         one write attempt (spawn/write + device I/O)
+      retry_wait      time spent sleeping between attempts
+      write           all attempts for the device, including retries
+      edge_to_ack     edge detected -> device write acknowledged
+      edge_to_done    edge detected -> Flow._on_switch_finished (device 'all')
+    """
+    STAGES = ('edge_to_thread', 'attempt', 'retry_wait', 'write', 'edge_to_ack', 'edge_to_done')
+
+    def __init__(self, size=512):
+        self.size = size
+        self._histograms = {}
+
+    def _record(self, device, stage, seconds):
+        key = (device, stage)
+        if key not in self._histograms:
+            self._histograms[key] = LatencyHistogram(self.size)
+        self._histograms[key].record(seconds * 1000)
+
+    def record_trace(self, trace):
+        if trace.thread_started is not None:
+            self._record('all', 'edge_to_thread', trace.thread_started - trace.edge_detected)
+        for result in trace.results:
+            for started, finished, _ in result.attempts:
+                self._record(result.device, 'attempt', finished - started)
+            for previous, following in zip(result.attempts, result.attempts[1:]):
+                self._record(result.device, 'retry_wait', following[0] - previous[1])
+            self._record(result.device, 'write', result.duration)
+            if result.success:
+                self._record(result.device, 'edge_to_ack', result.finished - trace.edge_detected)
+        if trace.finished is not None:
+            self._record('all', 'edge_to_done', trace.finished - trace.edge_detected)
+
+    def percentile(self, device, stage, p):
+        histogram = self._histograms.get((device, stage))
+        return histogram.percentile(p) if histogram else None
+
+    def summary(self):
+        result = {}
+        for (device, stage), histogram in sorted(self._histograms.items()):
+            result.setdefault(device, {})[stage] = histogram.summary()
+        return result
+
+    def format_summary(self):
+        summary = self.summary()
+        if not summary:
+            return 'No switches recorded yet.'
+        lines = []
+        for device, stages in summary.items():
+            lines.append(f'{device}:')
+            for stage in self.STAGES:
+                if stage not in stages:
+                    continue
+                s = stages[stage]
+                lines.append(f"  {stage:<15} n={s['count']:<4} p50={s['p50']:7.1f}  "
+                             f"p95={s['p95']:7.1f}  p99={s['p99']:7.1f} ms")
+        return '\n'.join(lines)
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump({'window': self.size, 'unit': 'ms', 'devices': self.summary()}, f, indent=2)
@@ -1,38 +1,48 @@
-from PyQt6.QtWidgets import QApplication, QSystemTrayIcon, QMenu, QLineEdit, QInputDialog, QMessageBox
+from PyQt6.QtWidgets import QApplication, QSystemTrayIcon, QMenu, QLineEdit, QInputDialog, QMessageBox, QFileDialog
 from PyQt6.QtGui import QIcon, QPainter, QPixmap, QBrush
-from PyQt6.QtCore import Qt, QRectF
+from PyQt6.QtCore import Qt, QRectF, QTimer
 
+import json
+import os
 import sys
 
-from mouse_emulation import MouseEmulation
-from flow import Flow
 from utils import get_absolute_file_data_path
-from settings import SettingsDialog, config, trigger_config_save
-from uniclip import Uniclip
+from settings import config, settings_manager, trigger_config_save
 
 app = QApplication(sys.argv)
 
+DAEMON_TIMEOUT_MS = 2000
+
 
 class SystemTrayIcon(QSystemTrayIcon):
     def __init__(self, icon, parent=None):
         super().__init__(icon, parent)
         self.green_circle_icon = self.create_green_circle_pixmap()
         self.menu = QMenu(parent)
-        self.flow = Flow(QApplication.screens())
+        # Subsystems (and their imports) are created on first use from the menu
+        self._flow = None
+        self._keep_awake = None
+        self._keep_awake_setting = None
+        self._uniclip = None
+        self._settings_dialog = None
+        # Whether the headless daemon runs, as last probed when the menu opened
+        self._daemon_running = False
+        self.menu.aboutToShow.connect(self._probe_daemon)
         self.flow_action = self.menu.addAction('Flow')
         self.flow_action.setCheckable(True)
         self.flow_action.setChecked(False)
         self.flow_action.triggered.connect(self.toggle_flow)
+        self.latency_menu = self.menu.addMenu('Switch Latency')
+        self.latency_menu.addAction('Show', self.show_switch_latency)
+        self.latency_menu.addAction('Dump to File...', self.dump_switch_latency)
         self.menu.addSeparator()
 
-        self.mouse_emulation = MouseEmulation()
-        self.mouse_emulation_action = self.menu.addAction('Keep Me Awake')
-        self.mouse_emulation_action.setCheckable(True)
-        self.mouse_emulation_action.setChecked(False)
-        self.mouse_emulation_action.triggered.connect(self.toggle_mouse_emulation)
+        self.keep_awake_action = self.menu.addAction('Keep Me Awake')
+        self.keep_awake_action.setCheckable(True)
+        self.keep_awake_action.setChecked(False)
+        self.keep_awake_action.triggered.connect(self.toggle_keep_awake)
 
         self.menu.addSeparator()
-        self.uniclip = Uniclip()
         self.start_server_action = self.menu.addAction('Start Clipboard Server')
         self.start_server_action.setCheckable(True)
         self.start_server_action.setChecked(False)
@@ -46,26 +56,145 @@ class SystemTrayIcon(QSystemTrayIcon):
         self.connect_client_action.setCheckable(True)
         self.connect_client_action.setChecked(False)
         self.connect_client_action.triggered.connect(self.toggle_uniclip_client)
+        self.menu.addAction('Clipboard Statistics', self.show_clipboard_stats)
+        self.history_menu = self.menu.addMenu('Clipboard History')
+        self.history_menu.aboutToShow.connect(self.update_history_menu)
         self.menu.addSeparator()
 
-        # #15: Create settings dialog once, reuse it
-        self.settings_dialog = SettingsDialog()
-
         self.settings_action = self.menu.addAction('Settings')
         self.settings_action.triggered.connect(self.show_settings_dialog)
 
         self.menu.addAction('Quit', self.quit)
         self.setContextMenu(self.menu)
 
-    def toggle_mouse_emulation(self, checked):
+    def toggle_keep_awake(self, checked):
         if checked:
-            self.mouse_emulation.start()
-            self.mouse_emulation_action.setChecked(True)
+            if self._keep_awake is not None and self._keep_awake_setting != config.KEEP_AWAKE:
+                self._keep_awake = None  # the setting changed while stopped
+            try:
+                self.keep_awake.start()
+            except OSError as e:
+                # e.g. the inhibit service went away, move the cursor instead
+                print(f"Cannot inhibit sleep with {self._keep_awake.name}: {e}")
+                from inhibit import EmulationInhibitor
+                self._keep_awake = EmulationInhibitor()
+                self._keep_awake.start()
+            self.keep_awake_action.setChecked(True)
         else:
-            self.mouse_emulation.stop()
-            self.mouse_emulation_action.setChecked(False)
+            self.keep_awake.stop()
+            self.keep_awake_action.setChecked(False)
+
+    @property
+    def flow(self):
+        if self._flow is None:
+            from flow import Flow
+            self._flow = Flow(QApplication.screens())
+            self._flow.watch_screens(app)
+        return self._flow
+
+    @property
+    def keep_awake(self):
+        if self._keep_awake is None:
+            from inhibit import create_inhibitor
+            self._keep_awake = create_inhibitor(config.KEEP_AWAKE)
+            self._keep_awake_setting = config.KEEP_AWAKE
+        return self._keep_awake
+
+    @property
+    def uniclip(self):
+        if self._uniclip is None:
+            from uniclip import Uniclip
+            self._uniclip = Uniclip()
+            self._uniclip.server_state_changed.connect(self.on_server_state_changed)
+            self._uniclip.client_state_changed.connect(self.on_client_state_changed)
+        return self._uniclip
+
+    @property
+    def settings_dialog(self):
+        # #15: Create settings dialog once, reuse it
+        if self._settings_dialog is None:
+            from settings_dialog import SettingsDialog
+            self._settings_dialog = SettingsDialog()
+            self._settings_dialog.config_changed.connect(self._on_config_changed)
+        return self._settings_dialog
+
+    def _probe_daemon(self):
+        # Connecting to a local socket answers long before a menu entry can
+        # be clicked, so the handlers below only read the cached result
+        self._daemon_request(None)
+
+    def _daemon_request(self, command, on_failed=None):
+        # Everything on the control socket goes through Qt's event loop, so
+        # a daemon that is gone or wedged never holds up the GUI thread.
+        # With command None this only checks that the daemon is there.
+        from PyQt6.QtNetwork import QLocalSocket
+        from daemon import find_socket_path
+        connection = QLocalSocket(self)
+        timeout = QTimer(connection)
+        timeout.setSingleShot(True)
+
+        def done(error=None, gone=True):
+            timeout.stop()
+            connection.connected.disconnect()
+            connection.readyRead.disconnect()
+            connection.errorOccurred.disconnect()
+            connection.abort()
+            connection.deleteLater()
+            if command is None:
+                self._daemon_running = error is None
+            elif error is not None:
+                print(f"Headless daemon did not take '{command}': {error}")
+                if gone:
+                    self._daemon_running = False
+                    if on_failed is not None:
+                        on_failed()
+
+        def on_connected():
+            if command is None:
+                done()
+            else:
+                connection.write((command + '\n').encode())
+
+        def on_ready_read():
+            if not connection.canReadLine():
+                return
+            try:
+                reply = json.loads(bytes(connection.readLine()).decode())
+            except ValueError as e:
+                reply = {'error': f'unreadable reply: {e}'}
+            done(None if reply.get('ok') else reply.get('error', 'failed'), gone=False)
+
+        connection.connected.connect(on_connected)
+        connection.readyRead.connect(on_ready_read)
+        connection.errorOccurred.connect(lambda error: done(connection.errorString()))
+        # A wedged daemon is reported but not taken over from: it may yet act
+        timeout.timeout.connect(lambda: done('no reply', gone=False))
+        timeout.start(DAEMON_TIMEOUT_MS)
+        connection.connectToServer(find_socket_path())
+
+    def _send_to_daemon(self, command, on_failed=None):
+        """Send command to the headless daemon without waiting for it; False
+        if none was found running, for the tray to do it itself. on_failed
+        runs instead should the daemon turn out to be gone."""
+        if not self._daemon_running:
+            return False
+        self._daemon_request(command, on_failed)
+        return True
+
+    def _on_config_changed(self):
+        if self._flow is not None:
+            self._flow.reload_config()
+        self._send_to_daemon('reload')
 
     def toggle_flow(self, checked):
+        # With the headless daemon running (src/daemon.py) the tray only controls it,
+        # so the two never switch at the same time
+        if self._send_to_daemon('start' if checked else 'stop', lambda: self._toggle_own_flow(checked)):
+            self.flow_action.setChecked(checked)
+            return
+        self._toggle_own_flow(checked)
+
+    def _toggle_own_flow(self, checked):
         if checked:
             self.flow.start()
             self.flow_action.setChecked(True)
@@ -73,17 +202,73 @@ class SystemTrayIcon(QSystemTrayIcon):
             self.flow.stop()
             self.flow_action.setChecked(False)
 
+    def show_switch_latency(self):
+        summary = self._flow.latency.format_summary() if self._flow else 'No switches recorded yet.'
+        QMessageBox.information(None, 'Switch Latency', summary)
+
+    def dump_switch_latency(self):
+        if self._flow is None:
+            QMessageBox.information(None, 'Switch Latency', 'No switches recorded yet.')
+            return
+        default_path = str(settings_manager.config_path.with_name('switch_latency.json'))
+        path, _ = QFileDialog.getSaveFileName(None, 'Dump Switch Latency', default_path, 'JSON (*.json)')
+        if path:
+            self.flow.latency.dump(path)
+
     def toggle_uniclip_server(self, checked):
         if checked:
-            ip_port = self.uniclip.start_server()
             self.start_server_action.setChecked(True)
-            self.update_server_info_action(ip_port, True)
-            self.showMessage("Uniclip", f"Server started. IP and port: {ip_port}")
+            self.uniclip.start_server()
         else:
             self.uniclip.stop_server()
             self.start_server_action.setChecked(False)
             self.update_server_info_action("", False)
 
+    def on_server_state_changed(self, state, detail):
+        from uniclip import Uniclip
+        if state == Uniclip.RUNNING:
+            self.update_server_info_action(detail, True)
+            self.showMessage("Uniclip", f"Server started. IP and port: {detail}")
+        elif state == Uniclip.RETRYING:
+            self.server_info_action.setIcon(QIcon())
+            self.server_info_action.setText(f"Restarting: {detail}")
+            self.server_info_action.setVisible(True)
+
+    def on_client_state_changed(self, ip_port, state, detail):
+        from uniclip import Uniclip
+        states = self.uniclip.client_states()
+        connected = [name for name, s in states.items() if s == Uniclip.RUNNING]
+        if not states:
+            self.connect_client_action.setText('Connect Clipboard Server')
+            self.connect_client_action.setChecked(False)
+        elif len(states) == 1 and connected:
+            self.connect_client_action.setText(f"Connected to {connected[0]}")
+        elif len(states) == 1:
+            self.connect_client_action.setText("Connecting to Clipboard Server...")
+        else:
+            self.connect_client_action.setText(f"Connected to {len(connected)}/{len(states)} Clipboard Servers")
+        if state == Uniclip.FAILED:
+            QMessageBox.warning(None, 'Clipboard Connection Failed', f'{ip_port}: {detail}')
+
+    def show_clipboard_stats(self):
+        summary = self._uniclip.format_summary() if self._uniclip else 'Clipboard sync has not been started.'
+        QMessageBox.information(None, 'Clipboard Statistics', summary)
+
+    def update_history_menu(self):
+        self.history_menu.clear()
+        entries = self._uniclip.history.entries() if self._uniclip else []
+        if not entries:
+            self.history_menu.addAction('Nothing copied while clipboard sync was on').setEnabled(False)
+            return
+        for entry in entries:
+            # A single & would mark a shortcut key
+            action = self.history_menu.addAction(entry.label().replace('&', '&&'))
+            action.triggered.connect(lambda _, digest=entry.digest: self.recall_clipboard(digest))
+
+    def recall_clipboard(self, digest):
+        if not self.uniclip.recall(digest):
+            self.showMessage('Clipboard History', 'That entry is no longer kept.')
+
     def update_server_info_action(self, ip_port, visible):
         if visible:
             self.server_info_action.setIcon(self.green_circle_icon)
@@ -97,29 +282,25 @@ class SystemTrayIcon(QSystemTrayIcon):
         if checked:
             text, ok_pressed = QInputDialog.getText(
                 self.menu.parent(), "Connect to Clipboard Server",
-                "Enter IP and Port in the format 'IP:port':",
+                "Enter IP and Port in the format 'IP:port', several separated by commas:",
                 QLineEdit.EchoMode.Normal, config.UNICLIP_SERVER_IP
             )
             if ok_pressed and text.strip():
-                ip_port = text.strip()
+                from uniclip import parse_peers
                 # #4: Validate IP:port format
                 try:
-                    ip, port = ip_port.split(':')
-                    int(port)  # validate port is numeric
+                    peers = parse_peers(text.strip())
                 except ValueError:
                     QMessageBox.warning(
                         None, 'Invalid Input',
-                        "Please enter address in the format 'IP:port' (e.g. 192.168.1.1:55555)."
+                        "Please enter address in the format 'IP:port' (e.g. 192.168.1.1:55555), "
+                        "several separated by commas."
                     )
                     self.connect_client_action.setChecked(False)
                     return
-                config.UNICLIP_SERVER_IP = f'{ip}:{port}'
+                config.UNICLIP_SERVER_IP = ', '.join('%s:%d' % peer for peer in peers)
                 trigger_config_save()
-                try:
-                    self.uniclip.start_client(ip_port)
-                except Exception as e:
-                    print(f"An error occurred while starting the Uniclip client: {str(e)}")
-                    self.connect_client_action.setChecked(False)
+                self.uniclip.start_client(config.UNICLIP_SERVER_IP)
             else:
                 self.connect_client_action.setChecked(False)
         else:
@@ -134,9 +315,12 @@ class SystemTrayIcon(QSystemTrayIcon):
 
     def quit(self):
         # #16: Cleanup all running services before quitting
-        self.flow.stop()
-        self.mouse_emulation.stop()
-        self.uniclip.stop_all()
+        if self._flow is not None:
+            self._flow.close()
+        if self._keep_awake is not None:
+            self._keep_awake.stop()
+        if self._uniclip is not None:
+            self._uniclip.stop_all()
         app.quit()
 
     def create_green_circle_pixmap(self):
@@ -164,4 +348,7 @@ tray_icon = SystemTrayIcon(
 
 # #1: No more infinite while-True loop catching BaseException
 tray_icon.show()
+if os.environ.get('LCS_STARTUP_PROBE'):
+    # tools/bench_startup.py: report once the event loop runs with the tray shown, then exit
+    QTimer.singleShot(0, lambda: (print('LCS_TRAY_VISIBLE', flush=True), tray_icon.quit()))
 sys.exit(app.exec())
@@ -1,4 +1,3 @@
-import sys
 import random
 import time
 import math
@@ -6,12 +5,15 @@ import logging
 import platform
 
 from PyQt6.QtWidgets import QApplication, QWidget
-from PyQt6.QtCore import QTimer, QThread, pyqtSignal, Qt, QPoint
+from PyQt6.QtCore import QTimer, Qt
 from PyQt6.QtGui import QCursor
 from PyQt6.QtTest import QTest
-from scipy import interpolate
 import numpy as np
 
+from idle import create_idle_provider
+from scheduler import get_scheduler
+from settings import config
+
 if platform.system() == 'Windows':
     import win32com.client
 
@@ -21,111 +23,180 @@ logger = logging.getLogger(__name__)
 def point_dist(x1, y1, x2, y2):
     return math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
 
-class MoveMouseThread(QThread):
-    # #7: Use signal to move cursor from the GUI thread
-    move_cursor = pyqtSignal(int, int)
-
-    def __init__(self, start_pos, screen_rect):
-        super().__init__()
-        self._running = True
-        self._start_pos = start_pos
-        self._screen_rect = screen_rect
-
-    def stop(self):
-        self._running = False
-
-    def run(self):
-        logger.debug("Starting mouse movement.")
-        cp = random.randint(3, 5)
-        x1, y1 = self._start_pos.x(), self._start_pos.y()
-        # #18: Use provided full virtual desktop geometry
-        screen_width = self._screen_rect.width()
-        screen_height = self._screen_rect.height()
-        x2 = random.randint(self._screen_rect.x(), self._screen_rect.x() + screen_width)
-        y2 = random.randint(self._screen_rect.y(), self._screen_rect.y() + screen_height)
-        x = np.linspace(x1, x2, num=cp, dtype='int')
-        y = np.linspace(y1, y2, num=cp, dtype='int')
-
-        RND = 10
-        xr = [random.randint(-RND, RND) for k in range(cp)]
-        yr = [random.randint(-RND, RND) for k in range(cp)]
-        xr[0] = yr[0] = xr[-1] = yr[-1] = 0
-        x += xr
-        y += yr
-
-        degree = 3 if cp > 3 else cp - 1
-        tck, u = interpolate.splprep([x, y], k=degree)
-        u = np.linspace(0, 1, num=2+int(point_dist(x1, y1, x2, y2) / 50.0))
-        points = interpolate.splev(u, tck)
-
-        duration = 0.1
-        timeout = duration / len(points[0])
-        point_list = zip(*(i.astype(int) for i in points))
-
-        for point in point_list:
-            # #8: Check flag instead of relying on terminate()
-            if not self._running:
-                break
-            self.move_cursor.emit(int(point[0]), int(point[1]))
-            time.sleep(timeout)
-        logger.debug("Mouse movement completed.")
+class PathGenerator:
+    """Human-looking cursor path from (x1, y1) to (x2, y2).
+
+    A Catmull-Rom spline through 3-5 control points spread along the
+    straight line, each jittered by up to `jitter` px (the end points stay
+    put). All samples are evaluated at once as [1, t, t^2, t^3] @ BASIS
+    weights applied to their four control points, into buffers that are
+    reused between calls, so the returned array is only valid until the
+    next generate().
+    """
+    BASIS = 0.5 * np.array([[0, 2, 0, 0], [-1, 0, 1, 0], [2, -5, 4, -1], [-1, 3, -3, 1]], dtype=float)
+    _NEIGHBOURS = np.arange(4)
+
+    def __init__(self, jitter=10, spacing=50.0, capacity=256):
+        self.jitter = jitter
+        self.spacing = spacing  # px between samples
+        self._control = np.empty((7, 2))  # up to 5 control points plus the two phantom ends
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self._capacity = capacity
+        self._powers = np.ones((capacity, 4))
+        self._weights = np.empty((capacity, 4))
+        self._curve = np.empty((capacity, 1, 2))
+        self._points = np.empty((capacity, 2), dtype=np.int64)
+
+    def generate(self, x1, y1, x2, y2, rng=random):
+        """Return an (n, 2) int array of cursor positions, start and end included."""
+        cp = rng.randint(3, 5)
+        control = self._control[:cp + 2]
+        control[1:-1] = np.linspace((x1, y1), (x2, y2), num=cp)
+        for i in range(2, cp):
+            control[i, 0] += rng.randint(-self.jitter, self.jitter)
+            control[i, 1] += rng.randint(-self.jitter, self.jitter)
+        # Phantom end points so the curve starts and ends on the real ones
+        control[0] = 2 * control[1] - control[2]
+        control[-1] = 2 * control[-2] - control[-3]
+
+        n = 2 + int(point_dist(x1, y1, x2, y2) / self.spacing)
+        if n > self._capacity:
+            self._allocate(max(n, 2 * self._capacity))
+
+        # Global parameter -> segment index and local t in [0, 1]
+        u = np.linspace(0, cp - 1, num=n)
+        segment = np.minimum(u.astype(np.int64), cp - 2)
+        powers = self._powers[:n]
+        np.subtract(u, segment, out=powers[:, 1])
+        np.multiply(powers[:, 1], powers[:, 1], out=powers[:, 2])
+        np.multiply(powers[:, 2], powers[:, 1], out=powers[:, 3])
+        weights = np.matmul(powers, self.BASIS, out=self._weights[:n])
+        neighbours = control[segment[:, None] + self._NEIGHBOURS]
+        curve = np.matmul(weights[:, None, :], neighbours, out=self._curve[:n])
+
+        points = self._points[:n]
+        np.copyto(points, curve[:, 0], casting='unsafe')
+        return points
 
 class MouseEmulation:
-    def __init__(self):
-        self.mouse_activity_timer = QTimer()
-        self.mouse_activity_timer.timeout.connect(self.check_user_activity)
-        self.mouse_activity_timer.setInterval(10000)
-        self.move_mouse_thread = None
-        self.last_mouse_position = None
-        self.user_inactive_time = 0
-
-        self.keypress_timer = QTimer()
-        self.keypress_timer.setInterval(30000)
-        self.keypress_timer.timeout.connect(self.simulate_keypress)
+    # Duration of one keep-awake movement
+    MOVE_DURATION = 0.1
+    # Seconds without input before the cursor is moved
+    IDLE_THRESHOLD = 45
+    # Re-check interval for providers that only see input when polled
+    POLL_INTERVAL = 10
+
+    def __init__(self, idle_provider=None):
+        # Pass an idle provider to pin it (tests); otherwise it follows config.IDLE_PROVIDER
+        self._idle_provider_name = None if idle_provider else config.IDLE_PROVIDER
+        self.idle_provider = idle_provider
+        # Instead of polling, sleep until the moment the idle threshold would
+        # be crossed and ask the OS again then
+        scheduler = get_scheduler()
+        self.idle_check_task = scheduler.add('idle check', self.check_user_activity, slack=1.0)
+        # Movement is animated on the GUI thread: one precise timer steps
+        # through a precomputed path, about once per display frame
+        self.path_generator = PathGenerator()
+        self._path = None
+        self._path_index = -1  # last point moved to
+        self._path_started = None
+        self.animation_timer = QTimer()
+        self.animation_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.animation_timer.timeout.connect(self._animation_step)
+        self._last_emulated = None
+
+        self.keypress_task = scheduler.add('F15 keypress', self.simulate_keypress, 30, slack=5.0)
+        self._keypress_target = None
 
         self.is_windows = platform.system() == 'Windows'
 
     def start(self):
         logger.debug("Starting MouseEmulation.")
-        self.last_mouse_position = QCursor.pos()
-        self.user_inactive_time = 0
-        self.mouse_activity_timer.start()
-        self.keypress_timer.start()
+        if self._idle_provider_name is not None and (
+                self.idle_provider is None or config.IDLE_PROVIDER != self._idle_provider_name):
+            if self.idle_provider is not None:
+                self.idle_provider.close()
+            self._idle_provider_name = config.IDLE_PROVIDER
+            self.idle_provider = create_idle_provider(config.IDLE_PROVIDER)
+        logger.debug(f"Idle provider: {self.idle_provider.name}")
+        self._last_emulated = None
+        self.check_user_activity()
+        self.keypress_task.start()
 
     def stop(self):
         logger.debug("Stopping MouseEmulation.")
-        self.mouse_activity_timer.stop()
-        self.keypress_timer.stop()
-        # #8: Graceful thread stop instead of terminate()
-        if self.move_mouse_thread and self.move_mouse_thread.isRunning():
-            self.move_mouse_thread.stop()
-            self.move_mouse_thread.wait(2000)
-            self.move_mouse_thread = None
+        self.idle_check_task.stop()
+        self.keypress_task.stop()
+        self._stop_animation()
+
+    def idle_seconds(self):
+        """Seconds since the last input, user or our own emulated movement.
+
+        Synthetic cursor moves do not reset every OS idle counter, so our
+        own last movement counts as input here; without that a provider that
+        ignores it would have us move again on every check.
+        """
+        idle = self.idle_provider.idle_seconds()
+        if idle is None:
+            idle = 0.0
+        if self._last_emulated is not None:
+            idle = min(idle, time.monotonic() - self._last_emulated)
+        return idle
 
     def check_user_activity(self):
-        current_mouse_position = QCursor.pos()
-        if self.last_mouse_position != current_mouse_position:
-            logger.debug("User activity detected. Resetting inactivity timer.")
-            self.user_inactive_time = 0
-        else:
-            self.user_inactive_time += 10
-            if self.user_inactive_time >= 45:
-                self.start_mouse_movement()
-        self.last_mouse_position = current_mouse_position
+        idle = self.idle_seconds()
+        if idle >= self.IDLE_THRESHOLD:
+            self.start_mouse_movement()
+            idle = 0.0
+        remaining = self.IDLE_THRESHOLD - idle
+        if not self.idle_provider.precise:
+            remaining = min(remaining, self.POLL_INTERVAL)
+        logger.debug(f"Idle for {idle:.1f}s, next check in {remaining:.1f}s.")
+        self.idle_check_task.start(remaining)
 
     def _on_move_cursor(self, x, y):
         QCursor.setPos(x, y)
 
+    def is_moving(self):
+        return self._path is not None
+
     def start_mouse_movement(self):
-        if not self.move_mouse_thread or not self.move_mouse_thread.isRunning():
-            logger.debug("Starting mouse movement.")
-            # #18: Use virtual desktop geometry (all monitors combined)
-            screen_rect = QApplication.primaryScreen().virtualGeometry()
-            self.move_mouse_thread = MoveMouseThread(QCursor.pos(), screen_rect)
-            # #7: Connect signal so cursor is moved from the GUI thread
-            self.move_mouse_thread.move_cursor.connect(self._on_move_cursor)
-            self.move_mouse_thread.start()
-            self.user_inactive_time = 0
+        if self.is_moving():
+            return
+        logger.debug("Starting mouse movement.")
+        # #18: Use virtual desktop geometry (all monitors combined)
+        screen = QApplication.primaryScreen()
+        screen_rect = screen.virtualGeometry()
+        start = QCursor.pos()
+        x2 = random.randint(screen_rect.x(), screen_rect.x() + screen_rect.width())
+        y2 = random.randint(screen_rect.y(), screen_rect.y() + screen_rect.height())
+        self._path = self.path_generator.generate(start.x(), start.y(), x2, y2)
+        self._path_index = -1
+        self._path_started = time.monotonic()
+        refresh_rate = screen.refreshRate() or 60
+        self.animation_timer.start(max(1, int(1000 / refresh_rate)))
+        self._animation_step()
+        self._last_emulated = time.monotonic()
+
+    def _animation_step(self):
+        # The point is chosen from elapsed time, not from ticks, so a late
+        # tick skips ahead instead of stretching the movement
+        elapsed = time.monotonic() - self._path_started
+        last = len(self._path) - 1
+        index = min(last, int(elapsed / self.MOVE_DURATION * last))
+        if index > self._path_index:
+            x, y = self._path[index]
+            self._on_move_cursor(int(x), int(y))
+            self._path_index = index
+        if index == last:
+            logger.debug("Mouse movement completed.")
+            self._stop_animation()
+
+    def _stop_animation(self):
+        self.animation_timer.stop()
+        self._path = None
 
     def simulate_keypress(self):
         if self.is_windows:
@@ -134,4 +205,6 @@ class MouseEmulation:
             shell.SendKeys('{F15}')
         else:
             logger.debug("Simulating F15 keypress.")
-            QTest.keyPress(QWidget(), Qt.Key.Key_F15)
+            if self._keypress_target is None:
+                self._keypress_target = QWidget()
+            QTest.keyPress(self._keypress_target, Qt.Key.Key_F15)
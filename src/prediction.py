@@ -0,0 +1,113 @@
+from collections import deque
+
+
+class EdgePredictor:
+    """Estimates cursor velocity from recent samples and extrapolates where
+    and when the cursor will reach the desktop edge.
+
+    Velocity is the least-squares slope of the samples inside `window`
+    seconds, which is far less noisy than the last two samples alone.
+    """
+
+    def __init__(self, window=0.06, min_samples=3):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=64)
+
+    def reset(self):
+        self._samples.clear()
+
+    def add_sample(self, t, x, y):
+        self._samples.append((t, x, y))
+        while self._samples and t - self._samples[0][0] > self.window:
+            self._samples.popleft()
+
+    def velocity(self):
+        """(vx, vy) in px/s, or None without enough recent samples."""
+        n = len(self._samples)
+        if n < self.min_samples:
+            return None
+        mean_t = sum(s[0] for s in self._samples) / n
+        mean_x = sum(s[1] for s in self._samples) / n
+        mean_y = sum(s[2] for s in self._samples) / n
+        var_t = sum((s[0] - mean_t) ** 2 for s in self._samples)
+        if var_t == 0:
+            return None
+        vx = sum((s[0] - mean_t) * (s[1] - mean_x) for s in self._samples) / var_t
+        vy = sum((s[0] - mean_t) * (s[2] - mean_y) for s in self._samples) / var_t
+        return vx, vy
+
+    def predict(self, zone_index, min_speed):
+        """Return (target, seconds_to_edge) for the zone the cursor is
+        heading into, or (None, None) if it is too slow or heading nowhere."""
+        velocity = self.velocity()
+        if velocity is None:
+            return None, None
+        vx, vy = velocity
+        if (vx * vx + vy * vy) ** 0.5 < min_speed:
+            return None, None
+        _, x, y = self._samples[-1]
+        margin = zone_index.margin
+        candidates = []
+        if vx < 0:
+            candidates.append(('left', (zone_index.left + margin - x) / vx))
+        if vx > 0:
+            candidates.append(('right', (zone_index.right - margin - x) / vx))
+        if vy < 0:
+            candidates.append(('top', (zone_index.top + margin - y) / vy))
+        if vy > 0:
+            candidates.append(('bottom', (zone_index.bottom - margin - y) / vy))
+        if not candidates:
+            return None, None
+        edge, time_to_edge = min(candidates, key=lambda item: item[1])
+        time_to_edge = max(0.0, time_to_edge)
+        if edge in ('left', 'right'):
+            coord = int(round(y + vy * time_to_edge))
+        else:
+            coord = int(round(x + vx * time_to_edge))
+        return zone_index.lookup_edge(edge, coord), time_to_edge
+
+
+class PredictiveTrigger:
+    """Arm / commit / cancel decisions for predictive switching.
+
+    Armed once the predicted time to the edge drops below arm_factor times
+    the lead time; committed (the HID command is sent) once it drops below
+    the lead time, which should be the measured switch latency. While armed,
+    a prediction that no longer points at the same target cancels - this is
+    free because nothing has been sent yet. Pure Python, so recorded traces
+    can be replayed offline (tools/replay_prediction.py).
+    """
+
+    def __init__(self, min_speed=800, arm_factor=2.0, window=0.06):
+        self.predictor = EdgePredictor(window)
+        self.min_speed = min_speed
+        self.arm_factor = arm_factor
+        self.armed_target = None
+        self.armed_count = 0
+        self.commit_count = 0
+        self.cancel_count = 0
+
+    def reset(self):
+        self.predictor.reset()
+        self.armed_target = None
+
+    def update(self, t, x, y, zone_index, lead_time):
+        """Feed one sample; return the target to switch to now, or None."""
+        self.predictor.add_sample(t, x, y)
+        target, time_to_edge = self.predictor.predict(zone_index, self.min_speed)
+        if self.armed_target is not None and target is not self.armed_target:
+            # Turned away, slowed down or now heading into another zone
+            self.cancel_count += 1
+            self.armed_target = None
+        if target is None:
+            return None
+        if self.armed_target is None and time_to_edge <= lead_time * self.arm_factor:
+            self.armed_count += 1
+            self.armed_target = target
+        if self.armed_target is not None and time_to_edge <= lead_time:
+            self.commit_count += 1
+            self.armed_target = None
+            self.predictor.reset()
+            return target
+        return None
@@ -0,0 +1,160 @@
+import math
+import time
+
+from PyQt6.QtCore import QTimer, Qt
+
+
+class Task:
+    """A callback run by the Scheduler once, or every `interval` seconds.
+
+    A task may run up to `slack` seconds after it is due, so that tasks due
+    around the same time share one wakeup instead of each waking the
+    process on its own.
+    """
+
+    def __init__(self, scheduler, name, callback, interval=None, slack=0.0):
+        self.scheduler = scheduler
+        self.name = name
+        self.callback = callback
+        self.interval = interval
+        self.slack = slack
+        self.due = None
+        self.runs = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.total_late = 0.0
+
+    def is_active(self):
+        return self.due is not None
+
+    def start(self, delay=None):
+        """Run after `delay` seconds, by default one interval from now."""
+        delay = self.interval if delay is None else delay
+        self.due = self.scheduler._clock() + delay
+        self.scheduler._arm()
+
+    def stop(self):
+        if self.due is not None:
+            self.due = None
+            self.scheduler._arm()
+
+    def stats(self):
+        return {
+            'interval': self.interval,
+            'slack': self.slack,
+            'runs': self.runs,
+            'mean_ms': self.total_time / self.runs * 1000 if self.runs else None,
+            'max_ms': self.max_time * 1000,
+            'mean_late_ms': self.total_late / self.runs * 1000 if self.runs else None,
+        }
+
+
+class Scheduler:
+    """One timer for all periodic and delayed work in the app.
+
+    The single QTimer is armed for the earliest time any task must run by
+    (its due time plus slack); every task that is due by then runs in the
+    same wakeup. Work that needs exact timing (frame-paced animation,
+    replayed cursor traces) keeps its own precise QTimer instead.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.tasks = []
+        self.wakeups = 0
+        self._clock = clock
+        self._running = False
+        self._armed_for = None
+        self._timer = QTimer()
+        self._timer.setSingleShot(True)
+        # Lateness is already bounded by each task's slack
+        self._timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self._timer.timeout.connect(self._wake)
+
+    def add(self, name, callback, interval=None, slack=None):
+        """Register a task, stopped until its start() is called.
+
+        interval=None makes a one-shot task. The default slack is 5% of the
+        interval (what Qt's coarse timers allow), none for one-shot tasks.
+        """
+        if slack is None:
+            slack = interval * 0.05 if interval else 0.0
+        task = Task(self, name, callback, interval, slack)
+        self.tasks.append(task)
+        return task
+
+    def remove(self, task):
+        task.stop()
+        self.tasks.remove(task)
+
+    def next_wakeup(self):
+        deadlines = [task.due + task.slack for task in self.tasks if task.due is not None]
+        return min(deadlines) if deadlines else None
+
+    def run_due(self, now):
+        """Run every task due by `now`; returns how many ran."""
+        self._running = True
+        ran = 0
+        try:
+            for task in [task for task in self.tasks if task.due is not None and task.due <= now]:
+                # A callback may have stopped or restarted this task meanwhile
+                if task.due is None or task.due > now:
+                    continue
+                late = now - task.due
+                if task.interval:
+                    # Keep the cadence, unless we fell more than an interval behind
+                    task.due += task.interval
+                    if task.due <= now:
+                        task.due = now + task.interval
+                else:
+                    task.due = None
+                started = self._clock()
+                task.callback()
+                duration = self._clock() - started
+                task.runs += 1
+                task.total_time += duration
+                task.max_time = max(task.max_time, duration)
+                task.total_late += late
+                ran += 1
+        finally:
+            self._running = False
+        return ran
+
+    def _arm(self):
+        if self._running:
+            return  # _wake re-arms once all due tasks have run
+        wakeup = self.next_wakeup()
+        if wakeup is None:
+            self._timer.stop()
+            self._armed_for = None
+        elif wakeup != self._armed_for or not self._timer.isActive():
+            self._armed_for = wakeup
+            self._timer.start(max(0, math.ceil((wakeup - self._clock()) * 1000)))
+
+    def _wake(self):
+        self.wakeups += 1
+        self._armed_for = None
+        # Timers have millisecond resolution, so allow for firing a little early
+        self.run_due(self._clock() + 0.001)
+        self._arm()
+
+    def stats(self):
+        return {'wakeups': self.wakeups, 'tasks': {task.name: task.stats() for task in self.tasks}}
+
+    def format_summary(self):
+        lines = [f'{self.wakeups} wakeups']
+        for task in self.tasks:
+            s = task.stats()
+            mean = f"{s['mean_ms']:.2f} ms" if s['runs'] else '-'
+            lines.append(f"{task.name}: {s['runs']} runs, mean {mean}, max {s['max_ms']:.2f} ms")
+        return '\n'.join(lines)
+
+
+_scheduler = None
+
+
+def get_scheduler():
+    """The app-wide scheduler, created on first use (after the QApplication)."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = Scheduler()
+    return _scheduler
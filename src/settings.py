@@ -2,67 +2,113 @@ import os
 import platform
 from pathlib import Path
 import json
-from PyQt6.QtWidgets import QDialog, QLabel, QLineEdit, QVBoxLayout, QMessageBox, QComboBox, QPushButton, QCheckBox
-from PyQt6.QtGui import QIcon
-from PyQt6.QtCore import Qt
-from utils import get_absolute_file_data_path
+from devices import default_receiver, default_devices
+from zones import default_target
 
 class Config:
     def __init__(
         self,
-        PROTOCOL="bolt",
-        VENDOR_ID=0x046D,
-        PRODUCT_ID=0xC548,
-        KB_RECEIVER_SLOT=0x01,
-        MS_RECEIVER_SLOT=0x02,
-        KEYBOARD_ID=0x09,
-        MOUSE_ID=0x0a,
+        RECEIVERS=None,
+        DEVICES=None,
         UNICLIP_SERVER_IP="192.168.50.50",
         UNICLIP_PASSWORD="lcs1234",
-        TARGET1_POS="right",
-        TARGET2_POS="none",
-        TARGET3_POS="none",
-        TARGET1_MODE="full",
-        TARGET1_ZONE_SIZE=200,
-        TARGET1_ZONE_ANCHOR="start",
-        TARGET2_MODE="full",
-        TARGET2_ZONE_SIZE=200,
-        TARGET2_ZONE_ANCHOR="start",
-        TARGET3_MODE="full",
-        TARGET3_ZONE_SIZE=200,
-        TARGET3_ZONE_ANCHOR="start",
+        CLIPBOARD_MAX_BYTES=None,
+        CLIPBOARD_HISTORY_ENTRIES=50,
+        CLIPBOARD_HISTORY_BYTES=256 * 1024 * 1024,
+        CLIPBOARD_POLL=False,
+        TARGETS=None,
         REQUIRE_CTRL=False,
+        HID_BACKEND="auto",
+        CURSOR_SOURCE="auto",
+        KEEP_AWAKE="auto",
+        IDLE_PROVIDER="auto",
+        PREDICTIVE=False,
+        PREDICT_MIN_SPEED=800,
+        PREDICT_MAX_LEAD_MS=150,
+        REARM_BAND_PX=20,
+        REARM_DELAY_MS=300,
+        WAKE_BAND_PX=150,
+        WAKE_INTERVAL_S=10,
     ):
-        self.PROTOCOL = PROTOCOL
-        self.VENDOR_ID = VENDOR_ID
-        self.PRODUCT_ID = PRODUCT_ID
-        self.KB_RECEIVER_SLOT = KB_RECEIVER_SLOT
-        self.MS_RECEIVER_SLOT = MS_RECEIVER_SLOT
-        self.KEYBOARD_ID = KEYBOARD_ID
-        self.MOUSE_ID = MOUSE_ID
+        # Device registry, see devices.default_receiver / default_devices for the schema.
+        # Targets name the devices they switch.
+        self.RECEIVERS = RECEIVERS if RECEIVERS is not None else [default_receiver()]
+        self.DEVICES = DEVICES if DEVICES is not None else default_devices()
         self.UNICLIP_SERVER_IP = UNICLIP_SERVER_IP
         self.UNICLIP_PASSWORD = UNICLIP_PASSWORD
-        self.TARGET1_POS = TARGET1_POS
-        self.TARGET2_POS = TARGET2_POS
-        self.TARGET3_POS = TARGET3_POS
-        self.TARGET1_MODE = TARGET1_MODE
-        self.TARGET1_ZONE_SIZE = TARGET1_ZONE_SIZE
-        self.TARGET1_ZONE_ANCHOR = TARGET1_ZONE_ANCHOR
-        self.TARGET2_MODE = TARGET2_MODE
-        self.TARGET2_ZONE_SIZE = TARGET2_ZONE_SIZE
-        self.TARGET2_ZONE_ANCHOR = TARGET2_ZONE_ANCHOR
-        self.TARGET3_MODE = TARGET3_MODE
-        self.TARGET3_ZONE_SIZE = TARGET3_ZONE_SIZE
-        self.TARGET3_ZONE_ANCHOR = TARGET3_ZONE_ANCHOR
+        # Clipboard formats to sync and the largest size (bytes) sent or accepted
+        # for each. Formats not listed are never synced.
+        self.CLIPBOARD_MAX_BYTES = CLIPBOARD_MAX_BYTES if CLIPBOARD_MAX_BYTES is not None else {
+            'text/plain': 16 * 1024 * 1024,
+            'text/html': 16 * 1024 * 1024,
+            'text/uri-list': 1024 * 1024,
+            'image/png': 50 * 1024 * 1024,
+        }
+        # Recent clipboard contents kept for the tray's Clipboard History,
+        # bounded by both; 0 entries turns it off
+        self.CLIPBOARD_HISTORY_ENTRIES = CLIPBOARD_HISTORY_ENTRIES
+        self.CLIPBOARD_HISTORY_BYTES = CLIPBOARD_HISTORY_BYTES
+        # Wayland without wl-paste --watch: check the clipboard once a second
+        # for copies made in other apps, which Qt does not signal there
+        self.CLIPBOARD_POLL = CLIPBOARD_POLL
+        # List of trigger targets, see zones.default_target for the schema
+        self.TARGETS = TARGETS if TARGETS is not None else [default_target()]
         self.REQUIRE_CTRL = REQUIRE_CTRL
+        self.HID_BACKEND = HID_BACKEND
+        self.CURSOR_SOURCE = CURSOR_SOURCE
+        # How Keep Me Awake works, see inhibit.INHIBITORS. 'emulation' moves the cursor.
+        self.KEEP_AWAKE = KEEP_AWAKE
+        # Where cursor emulation reads the time since the last input, see idle.IDLE_PROVIDERS
+        self.IDLE_PROVIDER = IDLE_PROVIDER
+        self.PREDICTIVE = PREDICTIVE
+        self.PREDICT_MIN_SPEED = PREDICT_MIN_SPEED  # px/s
+        self.PREDICT_MAX_LEAD_MS = PREDICT_MAX_LEAD_MS
+        self.REARM_BAND_PX = REARM_BAND_PX
+        self.REARM_DELAY_MS = REARM_DELAY_MS
+        # Ping a target's devices when the cursor is this close to its zone,
+        # at most once per WAKE_INTERVAL_S per device. 0 disables.
+        self.WAKE_BAND_PX = WAKE_BAND_PX
+        self.WAKE_INTERVAL_S = WAKE_INTERVAL_S
 
     def to_dict(self):
         return self.__dict__
 
     @classmethod
     def from_dict(cls, data):
+        if 'TARGETS' not in data:
+            data = dict(data, TARGETS=cls._migrate_numbered_targets(data))
+        if 'RECEIVERS' not in data:
+            data = dict(data, **cls._migrate_single_receiver(data))
         return cls(**{k: v for k, v in data.items() if k in cls.__init__.__code__.co_varnames})
 
+    @staticmethod
+    def _migrate_numbered_targets(data):
+        """Convert the old TARGET{1,2,3}_* fields to the TARGETS list."""
+        targets = []
+        for channel in (1, 2, 3):
+            position = data.get(f'TARGET{channel}_POS', 'right' if channel == 1 else 'none')
+            if position == 'none':
+                continue
+            target = default_target(position, channel)
+            target['mode'] = data.get(f'TARGET{channel}_MODE', 'full')
+            target['zone_size'] = data.get(f'TARGET{channel}_ZONE_SIZE', 200)
+            target['zone_anchor'] = data.get(f'TARGET{channel}_ZONE_ANCHOR', 'start')
+            targets.append(target)
+        return targets
+
+    @staticmethod
+    def _migrate_single_receiver(data):
+        """Convert the old PROTOCOL/VENDOR_ID/PRODUCT_ID and KB_*/MS_* fields
+        to a one-receiver registry with the keyboard and mouse on it."""
+        receiver = default_receiver(
+            protocol=data.get('PROTOCOL', 'bolt'),
+            vendor_id=data.get('VENDOR_ID', 0x046D),
+            product_id=data.get('PRODUCT_ID', 0xC548))
+        devices = default_devices(receiver['name'])
+        devices[0].update(slot=data.get('KB_RECEIVER_SLOT', 0x01), feature_index=data.get('KEYBOARD_ID', 0x09))
+        devices[1].update(slot=data.get('MS_RECEIVER_SLOT', 0x02), feature_index=data.get('MOUSE_ID', 0x0a))
+        return {'RECEIVERS': [receiver], 'DEVICES': devices}
+
 class SettingsManager:
     def __init__(self):
         self.CONFIG_FOLDER_NAME = '.lcs_config'
@@ -93,221 +139,6 @@ class SettingsManager:
         if platform.system().lower() != 'windows':
             os.chmod(self.config_path, 0o600)
 
-class SettingsDialog(QDialog):
-    def __init__(self):
-        super().__init__()
-        screen_locations = ['top', 'bottom', 'right', 'left', 'none']
-        self.setWindowTitle('Settings')
-        self.setWindowIcon(QIcon(get_absolute_file_data_path('icon', 'icon.png')))
-        self.setWindowFlags(Qt.WindowType.WindowCloseButtonHint)
-
-        self.protocol_combo = QComboBox()
-        self.protocol_combo.addItems(['bolt', 'unifying'])
-
-        self.vendor_id_edit = QLineEdit()
-        self.product_id_edit = QLineEdit()
-        self.kb_receiver_slot_edit = QLineEdit()
-        self.ms_receiver_slot_edit = QLineEdit()
-        self.keyboard_id_edit = QLineEdit()
-        self.mouse_id_edit = QLineEdit()
-        self.uniclip_password_edit = QLineEdit()
-
-        self.target1_combo = QComboBox()
-        self.target1_combo.addItems(screen_locations)
-        self.target2_combo = QComboBox()
-        self.target2_combo.addItems(screen_locations)
-        self.target3_combo = QComboBox()
-        self.target3_combo.addItems(screen_locations)
-
-        trigger_modes = ['full', 'zone']
-        zone_anchors = ['start', 'end']
-
-        self.target1_mode_combo = QComboBox()
-        self.target1_mode_combo.addItems(trigger_modes)
-        self.target1_zone_size_edit = QLineEdit()
-        self.target1_zone_anchor_combo = QComboBox()
-        self.target1_zone_anchor_combo.addItems(zone_anchors)
-        self.target1_mode_combo.currentTextChanged.connect(
-            lambda mode: self._toggle_zone_fields(mode, self.target1_zone_size_edit, self.target1_zone_anchor_combo))
-
-        self.target2_mode_combo = QComboBox()
-        self.target2_mode_combo.addItems(trigger_modes)
-        self.target2_zone_size_edit = QLineEdit()
-        self.target2_zone_anchor_combo = QComboBox()
-        self.target2_zone_anchor_combo.addItems(zone_anchors)
-        self.target2_mode_combo.currentTextChanged.connect(
-            lambda mode: self._toggle_zone_fields(mode, self.target2_zone_size_edit, self.target2_zone_anchor_combo))
-
-        self.target3_mode_combo = QComboBox()
-        self.target3_mode_combo.addItems(trigger_modes)
-        self.target3_zone_size_edit = QLineEdit()
-        self.target3_zone_anchor_combo = QComboBox()
-        self.target3_zone_anchor_combo.addItems(zone_anchors)
-        self.target3_mode_combo.currentTextChanged.connect(
-            lambda mode: self._toggle_zone_fields(mode, self.target3_zone_size_edit, self.target3_zone_anchor_combo))
-
-        self.require_ctrl_checkbox = QCheckBox('Require Ctrl held to switch')
-
-        self.save_button = QPushButton('Save')
-        self.save_button.clicked.connect(self.save_and_close)
-
-        layout = QVBoxLayout()
-        layout.addWidget(QLabel('Protocol'))
-        layout.addWidget(self.protocol_combo)
-        layout.addWidget(QLabel('Vendor ID'))
-        layout.addWidget(self.vendor_id_edit)
-        layout.addWidget(QLabel('Product ID'))
-        layout.addWidget(self.product_id_edit)
-        layout.addWidget(QLabel('Keyboard Receiver Slot'))
-        layout.addWidget(self.kb_receiver_slot_edit)
-        layout.addWidget(QLabel('Mouse Receiver Slot'))
-        layout.addWidget(self.ms_receiver_slot_edit)
-        layout.addWidget(QLabel('Keyboard ID'))
-        layout.addWidget(self.keyboard_id_edit)
-        layout.addWidget(QLabel('Mouse ID'))
-        layout.addWidget(self.mouse_id_edit)
-        layout.addWidget(QLabel('Target 1'))
-        layout.addWidget(self.target1_combo)
-        layout.addWidget(QLabel('Target 1 Mode'))
-        layout.addWidget(self.target1_mode_combo)
-        layout.addWidget(QLabel('Target 1 Zone Size (px)'))
-        layout.addWidget(self.target1_zone_size_edit)
-        layout.addWidget(QLabel('Target 1 Zone Anchor'))
-        layout.addWidget(self.target1_zone_anchor_combo)
-        layout.addWidget(QLabel('Target 2'))
-        layout.addWidget(self.target2_combo)
-        layout.addWidget(QLabel('Target 2 Mode'))
-        layout.addWidget(self.target2_mode_combo)
-        layout.addWidget(QLabel('Target 2 Zone Size (px)'))
-        layout.addWidget(self.target2_zone_size_edit)
-        layout.addWidget(QLabel('Target 2 Zone Anchor'))
-        layout.addWidget(self.target2_zone_anchor_combo)
-        layout.addWidget(QLabel('Target 3'))
-        layout.addWidget(self.target3_combo)
-        layout.addWidget(QLabel('Target 3 Mode'))
-        layout.addWidget(self.target3_mode_combo)
-        layout.addWidget(QLabel('Target 3 Zone Size (px)'))
-        layout.addWidget(self.target3_zone_size_edit)
-        layout.addWidget(QLabel('Target 3 Zone Anchor'))
-        layout.addWidget(self.target3_zone_anchor_combo)
-        layout.addWidget(self.require_ctrl_checkbox)
-        layout.addWidget(QLabel('Uniclip Password'))
-        layout.addWidget(self.uniclip_password_edit)
-        layout.addWidget(self.save_button)
-        self.setLayout(layout)
-
-        self.setGeometry(350, 350, 300, 800)
-
-    @staticmethod
-    def _toggle_zone_fields(mode, size_edit, anchor_combo):
-        enabled = mode == 'zone'
-        size_edit.setEnabled(enabled)
-        anchor_combo.setEnabled(enabled)
-
-    def load_values(self):
-        self.protocol_combo.setCurrentIndex(self.protocol_combo.findText(config.PROTOCOL))
-        self.vendor_id_edit.setText(f'{config.VENDOR_ID:04X}')
-        self.product_id_edit.setText(f'{config.PRODUCT_ID:04X}')
-        self.kb_receiver_slot_edit.setText(f'{config.KB_RECEIVER_SLOT:02X}')
-        self.ms_receiver_slot_edit.setText(f'{config.MS_RECEIVER_SLOT:02X}')
-        self.keyboard_id_edit.setText(f'{config.KEYBOARD_ID:02X}')
-        self.mouse_id_edit.setText(f'{config.MOUSE_ID:02X}')
-        self.uniclip_password_edit.setText(config.UNICLIP_PASSWORD)
-        self.target1_combo.setCurrentIndex(self.target1_combo.findText(config.TARGET1_POS))
-        self.target2_combo.setCurrentIndex(self.target2_combo.findText(config.TARGET2_POS))
-        self.target3_combo.setCurrentIndex(self.target3_combo.findText(config.TARGET3_POS))
-
-        self.target1_mode_combo.setCurrentIndex(self.target1_mode_combo.findText(config.TARGET1_MODE))
-        self.target1_zone_size_edit.setText(str(config.TARGET1_ZONE_SIZE))
-        self.target1_zone_anchor_combo.setCurrentIndex(self.target1_zone_anchor_combo.findText(config.TARGET1_ZONE_ANCHOR))
-        self._toggle_zone_fields(config.TARGET1_MODE, self.target1_zone_size_edit, self.target1_zone_anchor_combo)
-
-        self.target2_mode_combo.setCurrentIndex(self.target2_mode_combo.findText(config.TARGET2_MODE))
-        self.target2_zone_size_edit.setText(str(config.TARGET2_ZONE_SIZE))
-        self.target2_zone_anchor_combo.setCurrentIndex(self.target2_zone_anchor_combo.findText(config.TARGET2_ZONE_ANCHOR))
-        self._toggle_zone_fields(config.TARGET2_MODE, self.target2_zone_size_edit, self.target2_zone_anchor_combo)
-
-        self.target3_mode_combo.setCurrentIndex(self.target3_mode_combo.findText(config.TARGET3_MODE))
-        self.target3_zone_size_edit.setText(str(config.TARGET3_ZONE_SIZE))
-        self.target3_zone_anchor_combo.setCurrentIndex(self.target3_zone_anchor_combo.findText(config.TARGET3_ZONE_ANCHOR))
-        self._toggle_zone_fields(config.TARGET3_MODE, self.target3_zone_size_edit, self.target3_zone_anchor_combo)
-
-        self.require_ctrl_checkbox.setChecked(config.REQUIRE_CTRL)
-
-    # #14: Accept close event properly so the dialog can be reused
-    def closeEvent(self, event):
-        self.hide()
-        event.accept()
-
-    def save_and_close(self):
-        reply = QMessageBox.question(
-            self, 'Message', 'Do you want to save the changes?',
-            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No, QMessageBox.StandardButton.No
-        )
-
-        if reply == QMessageBox.StandardButton.Yes:
-            # #11: Validate hex inputs before saving
-            hex_fields = [
-                ('Vendor ID', self.vendor_id_edit),
-                ('Product ID', self.product_id_edit),
-                ('Keyboard Receiver Slot', self.kb_receiver_slot_edit),
-                ('Mouse Receiver Slot', self.ms_receiver_slot_edit),
-                ('Keyboard ID', self.keyboard_id_edit),
-                ('Mouse ID', self.mouse_id_edit),
-            ]
-            for name, field in hex_fields:
-                try:
-                    int(field.text(), 16)
-                except ValueError:
-                    QMessageBox.warning(self, 'Invalid Input', f'{name} must be a valid hex value.')
-                    return
-
-            # Validate zone size fields for targets in "zone" mode
-            zone_fields = [
-                ('Target 1 Zone Size', self.target1_mode_combo, self.target1_zone_size_edit),
-                ('Target 2 Zone Size', self.target2_mode_combo, self.target2_zone_size_edit),
-                ('Target 3 Zone Size', self.target3_mode_combo, self.target3_zone_size_edit),
-            ]
-            for name, mode_combo, size_edit in zone_fields:
-                if mode_combo.currentText() == 'zone':
-                    try:
-                        val = int(size_edit.text())
-                        if val <= 0:
-                            raise ValueError
-                    except ValueError:
-                        QMessageBox.warning(self, 'Invalid Input', f'{name} must be a positive integer.')
-                        return
-
-            config.PROTOCOL = self.protocol_combo.currentText()
-            config.VENDOR_ID = int(self.vendor_id_edit.text(), 16)
-            config.PRODUCT_ID = int(self.product_id_edit.text(), 16)
-            config.KB_RECEIVER_SLOT = int(self.kb_receiver_slot_edit.text(), 16)
-            config.MS_RECEIVER_SLOT = int(self.ms_receiver_slot_edit.text(), 16)
-            config.KEYBOARD_ID = int(self.keyboard_id_edit.text(), 16)
-            config.MOUSE_ID = int(self.mouse_id_edit.text(), 16)
-            config.TARGET1_POS = self.target1_combo.currentText()
-            config.TARGET2_POS = self.target2_combo.currentText()
-            config.TARGET3_POS = self.target3_combo.currentText()
-            config.TARGET1_MODE = self.target1_mode_combo.currentText()
-            config.TARGET1_ZONE_SIZE = int(self.target1_zone_size_edit.text())
-            config.TARGET1_ZONE_ANCHOR = self.target1_zone_anchor_combo.currentText()
-            config.TARGET2_MODE = self.target2_mode_combo.currentText()
-            config.TARGET2_ZONE_SIZE = int(self.target2_zone_size_edit.text())
-            config.TARGET2_ZONE_ANCHOR = self.target2_zone_anchor_combo.currentText()
-            config.TARGET3_MODE = self.target3_mode_combo.currentText()
-            config.TARGET3_ZONE_SIZE = int(self.target3_zone_size_edit.text())
-            config.TARGET3_ZONE_ANCHOR = self.target3_zone_anchor_combo.currentText()
-            config.REQUIRE_CTRL = self.require_ctrl_checkbox.isChecked()
-            config.UNICLIP_PASSWORD = self.uniclip_password_edit.text()
-            settings_manager.save_config(config)
-        else:
-            # #6: Reload config from file and apply to the global config object
-            saved = settings_manager.load_config()
-            if saved:
-                config.__dict__.update(saved.__dict__)
-
-        self.hide()
-
 settings_manager = SettingsManager()
 
 config = settings_manager.load_config()
@@ -317,3 +148,12 @@ if config is None:
 
 def trigger_config_save():
     settings_manager.save_config(config)
+
+def trigger_config_reload():
+    """Re-read the config file into the global config object; False if it
+    is missing or unreadable."""
+    saved = settings_manager.load_config()
+    if saved is None:
+        return False
+    config.__dict__.update(saved.__dict__)
+    return True
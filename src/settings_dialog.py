@@ -0,0 +1,347 @@
+from PyQt6.QtWidgets import (
+    QDialog, QLabel, QLineEdit, QVBoxLayout, QHBoxLayout, QMessageBox, QComboBox, QPushButton, QCheckBox,
+    QTableWidget, QHeaderView, QSpinBox,
+)
+from PyQt6.QtGui import QIcon
+from PyQt6.QtCore import Qt, pyqtSignal
+from utils import get_absolute_file_data_path
+from devices import PROTOCOLS, default_receiver
+from settings import config, settings_manager, trigger_config_reload
+from zones import EDGES, default_target
+
+class SettingsDialog(QDialog):
+    # Emitted after the global config changed (saved or reverted)
+    config_changed = pyqtSignal()
+
+    RECEIVER_COLUMNS = ['Name', 'Protocol', 'Vendor ID', 'Product ID', 'Path (optional)']
+    DEVICE_COLUMNS = ['Name', 'Receiver', 'Receiver Slot', 'Change Host Feature Index']
+    TARGET_COLUMNS = ['Edge', 'Channel', 'Mode', 'Zone Anchor', 'Zone Offset (px)', 'Zone Size (px)', 'Devices']
+
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle('Settings')
+        self.setWindowIcon(QIcon(get_absolute_file_data_path('icon', 'icon.png')))
+        self.setWindowFlags(Qt.WindowType.WindowCloseButtonHint)
+
+        self.hid_backend_combo = QComboBox()
+        self.hid_backend_combo.addItems(['auto', 'hidraw', 'hidapitester'])
+
+        self.cursor_source_combo = QComboBox()
+        self.cursor_source_combo.addItems(['auto', 'evdev', 'poll'])
+
+        self.keep_awake_combo = QComboBox()
+        self.keep_awake_combo.addItems(['auto', 'screensaver', 'logind', 'windows', 'macos', 'emulation'])
+
+        self.idle_provider_combo = QComboBox()
+        self.idle_provider_combo.addItems(['auto', 'xscreensaver', 'logind', 'windows', 'macos', 'cursor'])
+
+        self.uniclip_password_edit = QLineEdit()
+
+        self.receivers_table = QTableWidget(0, len(self.RECEIVER_COLUMNS))
+        self.receivers_table.setHorizontalHeaderLabels(self.RECEIVER_COLUMNS)
+        self.receivers_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.add_receiver_button = QPushButton('Add Receiver')
+        self.add_receiver_button.clicked.connect(
+            lambda: self._add_receiver_row(default_receiver(f'receiver{self.receivers_table.rowCount() + 1}')))
+        self.remove_receiver_button = QPushButton('Remove Receiver')
+        self.remove_receiver_button.clicked.connect(lambda: self._remove_selected_rows(self.receivers_table))
+        receiver_buttons = QHBoxLayout()
+        receiver_buttons.addWidget(self.add_receiver_button)
+        receiver_buttons.addWidget(self.remove_receiver_button)
+
+        self.devices_table = QTableWidget(0, len(self.DEVICE_COLUMNS))
+        self.devices_table.setHorizontalHeaderLabels(self.DEVICE_COLUMNS)
+        self.devices_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.add_device_button = QPushButton('Add Device')
+        self.add_device_button.clicked.connect(self._add_new_device_row)
+        self.remove_device_button = QPushButton('Remove Device')
+        self.remove_device_button.clicked.connect(lambda: self._remove_selected_rows(self.devices_table))
+        device_buttons = QHBoxLayout()
+        device_buttons.addWidget(self.add_device_button)
+        device_buttons.addWidget(self.remove_device_button)
+
+        self.targets_table = QTableWidget(0, len(self.TARGET_COLUMNS))
+        self.targets_table.setHorizontalHeaderLabels(self.TARGET_COLUMNS)
+        self.targets_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.add_target_button = QPushButton('Add Target')
+        self.add_target_button.clicked.connect(lambda: self._add_target_row(default_target()))
+        self.remove_target_button = QPushButton('Remove Target')
+        self.remove_target_button.clicked.connect(lambda: self._remove_selected_rows(self.targets_table))
+        target_buttons = QHBoxLayout()
+        target_buttons.addWidget(self.add_target_button)
+        target_buttons.addWidget(self.remove_target_button)
+
+        self.require_ctrl_checkbox = QCheckBox('Require Ctrl held to switch')
+
+        self.rearm_band_spin = QSpinBox()
+        self.rearm_band_spin.setRange(1, 1000)
+        self.rearm_delay_spin = QSpinBox()
+        self.rearm_delay_spin.setRange(0, 10000)
+        self.wake_band_spin = QSpinBox()
+        self.wake_band_spin.setRange(0, 2000)
+
+        self.predictive_checkbox = QCheckBox('Predictive switching (switch before the cursor reaches the edge)')
+        self.predict_min_speed_spin = QSpinBox()
+        self.predict_min_speed_spin.setRange(100, 20000)
+        self.predict_max_lead_spin = QSpinBox()
+        self.predict_max_lead_spin.setRange(10, 1000)
+        self.predictive_checkbox.toggled.connect(self.predict_min_speed_spin.setEnabled)
+        self.predictive_checkbox.toggled.connect(self.predict_max_lead_spin.setEnabled)
+
+        self.save_button = QPushButton('Save')
+        self.save_button.clicked.connect(self.save_and_close)
+
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel('HID Backend'))
+        layout.addWidget(self.hid_backend_combo)
+        layout.addWidget(QLabel('Cursor Source'))
+        layout.addWidget(self.cursor_source_combo)
+        layout.addWidget(QLabel('Keep Me Awake Method'))
+        layout.addWidget(self.keep_awake_combo)
+        layout.addWidget(QLabel('Idle Time Source (emulation)'))
+        layout.addWidget(self.idle_provider_combo)
+        layout.addWidget(QLabel('Receivers (IDs in hex)'))
+        layout.addWidget(self.receivers_table)
+        layout.addLayout(receiver_buttons)
+        layout.addWidget(QLabel('Devices (slot and feature index in hex, see tools/probe_devices.py)'))
+        layout.addWidget(self.devices_table)
+        layout.addLayout(device_buttons)
+        layout.addWidget(QLabel('Targets (first matching row wins where zones overlap)'))
+        layout.addWidget(self.targets_table)
+        layout.addLayout(target_buttons)
+        layout.addWidget(self.require_ctrl_checkbox)
+        layout.addWidget(QLabel('Re-arm Edge Band (px)'))
+        layout.addWidget(self.rearm_band_spin)
+        layout.addWidget(QLabel('Re-arm Delay (ms)'))
+        layout.addWidget(self.rearm_delay_spin)
+        layout.addWidget(QLabel('Wake Devices Within (px of a target, 0 = off)'))
+        layout.addWidget(self.wake_band_spin)
+        layout.addWidget(self.predictive_checkbox)
+        layout.addWidget(QLabel('Predictive Minimum Speed (px/s)'))
+        layout.addWidget(self.predict_min_speed_spin)
+        layout.addWidget(QLabel('Predictive Maximum Lead (ms)'))
+        layout.addWidget(self.predict_max_lead_spin)
+        layout.addWidget(QLabel('Uniclip Password'))
+        layout.addWidget(self.uniclip_password_edit)
+        layout.addWidget(self.save_button)
+        self.setLayout(layout)
+
+        self.setGeometry(350, 350, 760, 900)
+
+    @staticmethod
+    def _toggle_zone_fields(mode, *fields):
+        enabled = mode == 'zone'
+        for field in fields:
+            field.setEnabled(enabled)
+
+    def _add_target_row(self, target):
+        row = self.targets_table.rowCount()
+        self.targets_table.insertRow(row)
+
+        edge_combo = QComboBox()
+        edge_combo.addItems(EDGES)
+        edge_combo.setCurrentIndex(edge_combo.findText(target['position']))
+        channel_spin = QSpinBox()
+        channel_spin.setRange(1, 3)
+        channel_spin.setValue(target['channel'])
+        mode_combo = QComboBox()
+        mode_combo.addItems(['full', 'zone'])
+        mode_combo.setCurrentIndex(mode_combo.findText(target['mode']))
+        anchor_combo = QComboBox()
+        anchor_combo.addItems(['start', 'end'])
+        anchor_combo.setCurrentIndex(anchor_combo.findText(target['zone_anchor']))
+        offset_spin = QSpinBox()
+        offset_spin.setRange(0, 100000)
+        offset_spin.setValue(target.get('zone_offset', 0))
+        size_spin = QSpinBox()
+        size_spin.setRange(1, 100000)
+        size_spin.setValue(target['zone_size'])
+        devices_edit = QLineEdit(', '.join(target['devices']))
+
+        mode_combo.currentTextChanged.connect(
+            lambda mode: self._toggle_zone_fields(mode, anchor_combo, offset_spin, size_spin))
+        self._toggle_zone_fields(target['mode'], anchor_combo, offset_spin, size_spin)
+
+        for column, widget in enumerate([edge_combo, channel_spin, mode_combo, anchor_combo,
+                                         offset_spin, size_spin, devices_edit]):
+            self.targets_table.setCellWidget(row, column, widget)
+
+    @staticmethod
+    def _remove_selected_rows(table):
+        rows = sorted({index.row() for index in table.selectedIndexes()}, reverse=True)
+        if not rows and table.rowCount():
+            rows = [table.rowCount() - 1]
+        for row in rows:
+            table.removeRow(row)
+
+    def _add_receiver_row(self, receiver):
+        row = self.receivers_table.rowCount()
+        self.receivers_table.insertRow(row)
+        protocol_combo = QComboBox()
+        protocol_combo.addItems(PROTOCOLS)
+        protocol_combo.setCurrentIndex(protocol_combo.findText(receiver['protocol']))
+        widgets = [
+            QLineEdit(receiver['name']),
+            protocol_combo,
+            QLineEdit(f"{receiver['vendor_id']:04X}"),
+            QLineEdit(f"{receiver['product_id']:04X}"),
+            QLineEdit(receiver.get('path', '')),
+        ]
+        for column, widget in enumerate(widgets):
+            self.receivers_table.setCellWidget(row, column, widget)
+
+    def _add_device_row(self, device):
+        row = self.devices_table.rowCount()
+        self.devices_table.insertRow(row)
+        widgets = [
+            QLineEdit(device['name']),
+            QLineEdit(device['receiver']),
+            QLineEdit(f"{device['slot']:02X}"),
+            QLineEdit(f"{device['feature_index']:02X}"),
+        ]
+        for column, widget in enumerate(widgets):
+            self.devices_table.setCellWidget(row, column, widget)
+
+    def _add_new_device_row(self):
+        receiver = self.receivers_table.cellWidget(0, 0).text() if self.receivers_table.rowCount() else ''
+        row = self.devices_table.rowCount() + 1
+        self._add_device_row({'name': f'device{row}', 'receiver': receiver, 'slot': row, 'feature_index': 0})
+
+    def _read_receivers(self):
+        """Rows as receiver dicts; raises ValueError naming the bad field."""
+        receivers = []
+        for row in range(self.receivers_table.rowCount()):
+            widget = lambda column: self.receivers_table.cellWidget(row, column)
+            receiver = {'name': widget(0).text().strip(), 'protocol': widget(1).currentText(),
+                        'path': widget(4).text().strip()}
+            for key, column in (('vendor_id', 2), ('product_id', 3)):
+                try:
+                    receiver[key] = int(widget(column).text(), 16)
+                except ValueError:
+                    raise ValueError(f'Receiver {row + 1} {self.RECEIVER_COLUMNS[column]} must be a valid hex value.')
+            receivers.append(receiver)
+        return receivers
+
+    def _read_devices(self):
+        """Rows as device dicts; raises ValueError naming the bad field."""
+        devices = []
+        for row in range(self.devices_table.rowCount()):
+            widget = lambda column: self.devices_table.cellWidget(row, column)
+            device = {'name': widget(0).text().strip(), 'receiver': widget(1).text().strip()}
+            for key, column in (('slot', 2), ('feature_index', 3)):
+                try:
+                    device[key] = int(widget(column).text(), 16)
+                except ValueError:
+                    raise ValueError(f'Device {row + 1} {self.DEVICE_COLUMNS[column]} must be a valid hex value.')
+            devices.append(device)
+        return devices
+
+    def _read_targets(self):
+        targets = []
+        for row in range(self.targets_table.rowCount()):
+            widget = lambda column: self.targets_table.cellWidget(row, column)
+            devices = [d.strip() for d in widget(6).text().split(',') if d.strip()]
+            targets.append({
+                'position': widget(0).currentText(),
+                'channel': widget(1).value(),
+                'mode': widget(2).currentText(),
+                'zone_anchor': widget(3).currentText(),
+                'zone_offset': widget(4).value(),
+                'zone_size': widget(5).value(),
+                'devices': devices,
+            })
+        return targets
+
+    def load_values(self):
+        # A backend not offered here (e.g. 'fake' put in config.json by hand) shows as auto
+        self.hid_backend_combo.setCurrentIndex(max(self.hid_backend_combo.findText(config.HID_BACKEND), 0))
+        self.cursor_source_combo.setCurrentIndex(self.cursor_source_combo.findText(config.CURSOR_SOURCE))
+        self.keep_awake_combo.setCurrentIndex(self.keep_awake_combo.findText(config.KEEP_AWAKE))
+        self.idle_provider_combo.setCurrentIndex(self.idle_provider_combo.findText(config.IDLE_PROVIDER))
+        self.uniclip_password_edit.setText(config.UNICLIP_PASSWORD)
+
+        self.receivers_table.setRowCount(0)
+        for receiver in config.RECEIVERS:
+            self._add_receiver_row(receiver)
+        self.devices_table.setRowCount(0)
+        for device in config.DEVICES:
+            self._add_device_row(device)
+
+        self.targets_table.setRowCount(0)
+        for target in config.TARGETS:
+            self._add_target_row(target)
+
+        self.require_ctrl_checkbox.setChecked(config.REQUIRE_CTRL)
+        self.rearm_band_spin.setValue(config.REARM_BAND_PX)
+        self.rearm_delay_spin.setValue(config.REARM_DELAY_MS)
+        self.wake_band_spin.setValue(config.WAKE_BAND_PX)
+        self.predictive_checkbox.setChecked(config.PREDICTIVE)
+        self.predict_min_speed_spin.setValue(config.PREDICT_MIN_SPEED)
+        self.predict_max_lead_spin.setValue(config.PREDICT_MAX_LEAD_MS)
+        self.predict_min_speed_spin.setEnabled(config.PREDICTIVE)
+        self.predict_max_lead_spin.setEnabled(config.PREDICTIVE)
+
+    # #14: Accept close event properly so the dialog can be reused
+    def closeEvent(self, event):
+        self.hide()
+        event.accept()
+
+    def save_and_close(self):
+        reply = QMessageBox.question(
+            self, 'Message', 'Do you want to save the changes?',
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No, QMessageBox.StandardButton.No
+        )
+
+        if reply == QMessageBox.StandardButton.Yes:
+            # #11: Validate hex inputs before saving
+            try:
+                receivers = self._read_receivers()
+                devices = self._read_devices()
+            except ValueError as e:
+                QMessageBox.warning(self, 'Invalid Input', str(e))
+                return
+            receiver_names = [receiver['name'] for receiver in receivers]
+            device_names = [device['name'] for device in devices]
+            if not all(receiver_names) or len(set(receiver_names)) != len(receiver_names):
+                QMessageBox.warning(self, 'Invalid Input', 'Receiver names must be unique and not empty.')
+                return
+            if not all(device_names) or len(set(device_names)) != len(device_names):
+                QMessageBox.warning(self, 'Invalid Input', 'Device names must be unique and not empty.')
+                return
+            for device in devices:
+                if device['receiver'] not in receiver_names:
+                    QMessageBox.warning(
+                        self, 'Invalid Input',
+                        f"Device {device['name']} receiver must be one of: {', '.join(receiver_names)}.")
+                    return
+
+            targets = self._read_targets()
+            for row, target in enumerate(targets, start=1):
+                if not target['devices'] or any(d not in device_names for d in target['devices']):
+                    QMessageBox.warning(
+                        self, 'Invalid Input',
+                        f"Target {row} devices must be a comma separated list of: {', '.join(device_names)}.")
+                    return
+
+            config.HID_BACKEND = self.hid_backend_combo.currentText()
+            config.CURSOR_SOURCE = self.cursor_source_combo.currentText()
+            config.KEEP_AWAKE = self.keep_awake_combo.currentText()
+            config.IDLE_PROVIDER = self.idle_provider_combo.currentText()
+            config.RECEIVERS = receivers
+            config.DEVICES = devices
+            config.TARGETS = targets
+            config.REQUIRE_CTRL = self.require_ctrl_checkbox.isChecked()
+            config.REARM_BAND_PX = self.rearm_band_spin.value()
+            config.REARM_DELAY_MS = self.rearm_delay_spin.value()
+            config.WAKE_BAND_PX = self.wake_band_spin.value()
+            config.PREDICTIVE = self.predictive_checkbox.isChecked()
+            config.PREDICT_MIN_SPEED = self.predict_min_speed_spin.value()
+            config.PREDICT_MAX_LEAD_MS = self.predict_max_lead_spin.value()
+            config.UNICLIP_PASSWORD = self.uniclip_password_edit.text()
+            settings_manager.save_config(config)
+        else:
+            # #6: Reload config from file and apply to the global config object
+            trigger_config_reload()
+
+        self.config_changed.emit()
+        self.hide()
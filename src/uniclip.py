@@ -1,102 +1,223 @@
-import platform
-import re
-import subprocess
-from utils import get_absolute_file_data_path, creation_flags
-from settings import config
-
-class Uniclip:
-    def __init__(self):
-        # #17: Separate process fields for server and client
-        self.server_process = None
-        self.client_process = None
-
-    def get_uniclip_executable_full_path(self):
-        arch = platform.machine()
-        system = platform.system().lower()
-        executable = None
-        if system == 'windows':
-            if arch in ('x86_64', 'AMD64'):
-                executable = 'uniclip-windows-x86_64.exe'
-            elif arch == 'armv6l':
-                executable = 'uniclip-windows-armv6.exe'
-            elif arch == 'x86':
-                executable = 'uniclip-windows-x86.exe'
-        elif system == 'linux':
-            if arch == 'x86_64':
-                executable = 'uniclip-linux-x86_64'
-            elif arch == 'armv6l':
-                executable = 'uniclip-linux-armv6'
-            elif arch in ('arm64', 'aarch64'):
-                executable = 'uniclip-linux-arm64'
-            elif arch == 'x86':
-                executable = 'uniclip-linux-x86'
-        elif system == 'darwin':
-            if arch == 'x86_64':
-                executable = 'uniclip-macos-x86_64'
-            elif arch == 'arm64':
-                executable = 'uniclip-macos-arm64'
-
-        if executable is None:
-            raise RuntimeError(f"Unsupported platform: {system} {arch}")
-
-        return get_absolute_file_data_path('uniclip', executable)
+import random
+
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from cliphistory import ClipboardHistory
+from clipsync import ClipSync, local_ip
+from scheduler import get_scheduler
+from settings import config, settings_manager
+
+
+def parse_peers(text):
+    """'ip:port' or several separated by commas -> [(host, port)]; raises ValueError."""
+    peers = []
+    for item in text.split(','):
+        host, port = item.strip().rsplit(':', 1)
+        if not host:
+            raise ValueError(f'No host in {item.strip()!r}')
+        if (host, int(port)) not in peers:
+            peers.append((host, int(port)))
+    return peers
+
+
+class ClientLink:
+    """One server the client keeps a connection to."""
+
+    def __init__(self, address):
+        self.address = address
+        self.name = '%s:%d' % address
+        self.task = None  # scheduler task for the next reconnect
+        self.peer = None
+        self.attempt = 0
+        self.state = Uniclip.STARTING
+
+
+class Uniclip(QObject):
+    """Shared clipboard: run a server other hosts connect to, connect to
+    one or more servers, or both.
+
+    Backed by the in-process ClipSync engine; all roles share one engine
+    and therefore one clipboard hook, which hands each copy to every peer's
+    own writer thread, so a slow peer only holds up itself. Nothing here
+    blocks the GUI thread: connecting happens in the background, and the
+    outcome, as well as a server or connection that goes away later, is
+    reported through the state signals. The engine's heartbeats notice a
+    connection that died silently. Everything is restarted with backoff
+    until stopped, or until the password turns out to be wrong.
+    """
+    STOPPED = 'stopped'
+    STARTING = 'starting'
+    RUNNING = 'running'
+    RETRYING = 'retrying'
+    FAILED = 'failed'
+
+    # state, detail: ip:port when running, the error otherwise
+    server_state_changed = pyqtSignal(str, str)
+    # ip:port of the server, state, detail
+    client_state_changed = pyqtSignal(str, str, str)
+
+    RESTART_DELAYS = (1, 2, 5, 10, 30, 60)  # seconds, the last one repeats
+
+    def __init__(self, clipboard=None, history=None):
+        super().__init__()
+        self.engine = None
+        self._clipboard = clipboard  # None for the system clipboard
+        if history is None:
+            history = ClipboardHistory(settings_manager.config_path.with_name('clipboard_history'),
+                                       config.CLIPBOARD_HISTORY_ENTRIES, config.CLIPBOARD_HISTORY_BYTES)
+        self.history = history
+        scheduler = get_scheduler()
+        self._server_wanted = False
+        self._server_port = 0
+        self._server_attempt = 0
+        self._server_restart = scheduler.add('clipboard server restart', self._start_listening, slack=0.5)
+        self._links = {}  # (host, port) -> ClientLink, while the client is wanted
+
+    def _get_engine(self):
+        # #9: Use password from config instead of hardcoded value
+        if (self.engine is None or self.engine.password != config.UNICLIP_PASSWORD
+                or self.engine.max_bytes != config.CLIPBOARD_MAX_BYTES
+                or self.engine.poll != config.CLIPBOARD_POLL):
+            replaced = self.engine is not None
+            if replaced:
+                self.engine.close()
+            self.engine = ClipSync(config.UNICLIP_PASSWORD, self._clipboard, config.CLIPBOARD_MAX_BYTES, self.history,
+                                   config.CLIPBOARD_POLL)
+            if replaced and self._server_wanted:
+                # Closing the old engine stopped the server, bring it back on the new one
+                self._server_restart.start(0)
+            self.engine.listening_failed.connect(self._on_listening_failed)
+            self.engine.connected.connect(self._on_connected)
+            self.engine.connect_failed.connect(self._on_connect_failed)
+            self.engine.peer_disconnected.connect(self._on_peer_disconnected)
+        return self.engine
+
+    def _delay(self, attempt):
+        return self.RESTART_DELAYS[min(attempt, len(self.RESTART_DELAYS) - 1)]
 
     def start_server(self):
-        if self.server_process:
-            self.stop_server()
-
-        self.server_process = subprocess.Popen(
-            [self.get_uniclip_executable_full_path(), '--secure'],
-            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-            creationflags=creation_flags
-        )
-
-        # #5: Limit readline attempts to prevent infinite blocking
-        ip_port = ""
-        max_lines = 50
-        for _ in range(max_lines):
-            if self.server_process.poll() is not None:
-                break
-            line = self.server_process.stdout.readline().decode('utf-8').strip()
-            if line:
-                match = re.search(r"uniclip (\d+\.\d+\.\d+\.\d+:\d+)", line)
-                if match:
-                    ip_port = match.group(1)
-                    break
+        """Start listening; returns ip:port, or '' if it is being retried."""
+        self._server_wanted = True
+        self._server_attempt = 0
+        self._server_port = 0
+        return self._start_listening()
+
+    def _start_listening(self):
+        try:
+            # Restarts keep the port, so clients reconnect to the same address
+            self._server_port = self._get_engine().listen(port=self._server_port)
+        except OSError as e:
+            self._retry_server(e)
+            return ''
+        self._server_attempt = 0
+        ip_port = f'{local_ip()}:{self._server_port}'
+        self.server_state_changed.emit(self.RUNNING, ip_port)
         return ip_port
 
+    def _retry_server(self, error):
+        delay = self._delay(self._server_attempt)
+        self._server_attempt += 1
+        print(f'Clipboard server failed ({error}), restarting in {delay}s')
+        self.server_state_changed.emit(self.RETRYING, str(error))
+        self._server_restart.start(delay)
+
+    def _on_listening_failed(self, error):
+        if self._server_wanted:
+            self._retry_server(error)
+
     def stop_server(self):
-        if self.server_process:
-            self.server_process.terminate()
-            self.server_process = None
-
-    def start_client(self, ip_port):
-        if self.client_process:
-            self.stop_client()
-        self.client_process = subprocess.Popen(
-            [self.get_uniclip_executable_full_path(), '--secure', ip_port],
-            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-            creationflags=creation_flags
-        )
-        self.client_process.stdin.flush()
-        self._get_client_output()
-        # #9: Use password from config instead of hardcoded value
-        password = config.UNICLIP_PASSWORD
-        self.client_process.stdin.write(f'{password}\n'.encode('utf-8'))
-        self.client_process.stdin.flush()
-        self._get_client_output()
-        self.client_process.stdin.flush()
+        self._server_wanted = False
+        self._server_restart.stop()
+        if self.engine is not None:
+            self.engine.stop_listening()
+        self.server_state_changed.emit(self.STOPPED, '')
+
+    def start_client(self, peers):
+        """Connect to 'ip:port', or several separated by commas, in the
+        background; raises ValueError for a malformed address."""
+        addresses = parse_peers(peers)
+        self.stop_client()
+        scheduler = get_scheduler()
+        for address in addresses:
+            link = ClientLink(address)
+            link.task = scheduler.add(f'clipboard reconnect {link.name}',
+                                      lambda link=link: self._connect(link), slack=0.5)
+            self._links[address] = link
+            self._connect(link)
+
+    def client_states(self):
+        return {link.name: link.state for link in self._links.values()}
+
+    def _set_client_state(self, link, state, detail=''):
+        link.state = state
+        self.client_state_changed.emit(link.name, state, detail)
+
+    def _connect(self, link):
+        self._set_client_state(link, self.STARTING, link.name)
+        self._get_engine().connect_async(*link.address)
+
+    def _retry_client(self, link, error):
+        # Jittered, so clients that lost the same server do not all come back at once
+        delay = self._delay(link.attempt) * random.uniform(0.5, 1.0)
+        link.attempt += 1
+        print(f'Clipboard connection to {link.name} lost ({error}), retrying in {delay:.1f}s')
+        self._set_client_state(link, self.RETRYING, str(error))
+        link.task.start(delay)
+
+    def _on_connected(self, peer):
+        link = self._links.get(peer.address)
+        if link is None or link.peer is not None:
+            peer.close()  # finished after stop_client() or a newer start_client()
+            return
+        link.peer = peer
+        link.attempt = 0
+        self._set_client_state(link, self.RUNNING, link.name)
+
+    def _on_connect_failed(self, host, port, error):
+        link = self._links.get((host, port))
+        if link is None or link.peer is not None:
+            return
+        if isinstance(error, PermissionError):
+            # Retrying cannot fix a wrong password
+            self._remove_link(link)
+            self._set_client_state(link, self.FAILED, str(error))
+            return
+        self._retry_client(link, error)
+
+    def _on_peer_disconnected(self, peer):
+        link = None if peer.server_side else self._links.get(peer.address)
+        if link is not None and link.peer is peer:
+            link.peer = None
+            self._retry_client(link, 'disconnected')
+
+    def _remove_link(self, link):
+        del self._links[link.address]
+        get_scheduler().remove(link.task)
 
     def stop_client(self):
-        if self.client_process:
-            self.client_process.terminate()
-            self.client_process = None
+        links = list(self._links.values())
+        for link in links:
+            self._remove_link(link)
+        if self.engine is not None:
+            self.engine.disconnect_clients()
+        for link in links:
+            self._set_client_state(link, self.STOPPED)
+
+    def recall(self, digest):
+        """Put a Clipboard History entry back on the clipboard and tell peers;
+        False if it is no longer kept."""
+        return self.engine is not None and self.engine.recall(digest)
+
+    def format_summary(self):
+        if self.engine is None:
+            return 'Clipboard sync has not been started.'
+        h = self.history.stats()
+        return (self.engine.format_summary() + f"\nHistory: {h['entries']} entries, "
+                f"{h['bytes'] / 1024 ** 2:.1f} MiB, {h['on_disk']} on disk")
 
     def stop_all(self):
         self.stop_server()
         self.stop_client()
-
-    def _get_client_output(self):
-        if self.client_process:
-            return self.client_process.stdout.readline().decode('utf-8').strip()
-        return None
+        if self.engine is not None:
+            self.engine.close()
+        self.history.close()
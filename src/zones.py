@@ -0,0 +1,106 @@
+from bisect import bisect_right
+
+EDGES = ('left', 'right', 'top', 'bottom')
+
+
+def default_target(position='right', channel=1):
+    return {
+        'position': position,
+        'channel': channel,
+        'mode': 'full',
+        'zone_anchor': 'start',
+        'zone_offset': 0,
+        'zone_size': 200,
+        'devices': ['mouse', 'keyboard'],
+    }
+
+
+class ZoneIndex:
+    """Trigger targets compiled into a sorted interval list per edge.
+
+    Overlapping zones are split into disjoint segments up front, each owned
+    by the first target in config order that covers it (the same precedence
+    the old linear scan had), so a lookup is one bisect per touched edge.
+    """
+
+    def __init__(self, targets, left, right, top, bottom, margin=1):
+        self.left = left
+        self.right = right
+        self.top = top
+        self.bottom = bottom
+        self.margin = margin
+        self._edges = {}
+        for edge in EDGES:
+            intervals = []
+            for order, target in enumerate(targets):
+                if target['position'] == edge:
+                    start, end = self._interval(target)
+                    if start < end:
+                        intervals.append((order, start, end, target))
+            self._edges[edge] = self._compile(intervals)
+
+    def _interval(self, target):
+        """Half-open [start, end) along the edge axis covered by target."""
+        if target['position'] in ('left', 'right'):
+            low, high = self.top, self.bottom
+        else:
+            low, high = self.left, self.right
+        if target['mode'] != 'zone':
+            return low, high + 1
+        offset, size = target.get('zone_offset', 0), target['zone_size']
+        if target['zone_anchor'] == 'start':
+            return max(low, low + offset), min(high + 1, low + offset + size + 1)
+        return max(low, high - offset - size), min(high + 1, high - offset + 1)
+
+    @staticmethod
+    def _compile(intervals):
+        bounds = sorted({b for _, start, end, _ in intervals for b in (start, end)})
+        starts, ends, owners = [], [], []
+        for seg_start, seg_end in zip(bounds, bounds[1:]):
+            covering = [(order, target) for order, start, end, target in intervals
+                        if start <= seg_start and seg_end <= end]
+            if not covering:
+                continue
+            owner = min(covering, key=lambda item: item[0])
+            # Merge with the previous segment when it has the same owner
+            if owners and ends[-1] == seg_start and owners[-1][0] == owner[0]:
+                ends[-1] = seg_end
+                continue
+            starts.append(seg_start)
+            ends.append(seg_end)
+            owners.append(owner)
+        return starts, ends, owners
+
+    def _find(self, edge, coord):
+        starts, ends, owners = self._edges[edge]
+        i = bisect_right(starts, coord) - 1
+        if i >= 0 and coord < ends[i]:
+            return owners[i]
+        return None
+
+    def lookup_edge(self, edge, coord):
+        """Return the target owning coord on edge, or None."""
+        hit = self._find(edge, coord)
+        return hit[1] if hit else None
+
+    def lookup(self, x, y, margin=None):
+        """Return the target whose zone (x, y) is in, or None.
+
+        margin: distance from the edge that still counts, defaults to the
+        trigger margin; a wider one finds the zone the cursor is approaching.
+        """
+        if margin is None:
+            margin = self.margin
+        hits = []
+        if x <= self.left + margin:
+            hits.append(self._find('left', y))
+        if x >= self.right - margin:
+            hits.append(self._find('right', y))
+        if y <= self.top + margin:
+            hits.append(self._find('top', x))
+        if y >= self.bottom - margin:
+            hits.append(self._find('bottom', x))
+        hits = [hit for hit in hits if hit is not None]
+        if not hits:
+            return None
+        return min(hits, key=lambda item: item[0])[1]
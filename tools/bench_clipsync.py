@@ -0,0 +1,374 @@
+"""
+Clipboard sync latency, throughput and cost per peer, through the same
+Uniclip server and client paths the tray uses.
+
+This process runs a Uniclip server on loopback. Each peer is a separate
+process (this script with --peer) running a Uniclip client, so the CPU
+time and RSS reported for a peer are its own. Every host has an in-memory
+clipboard, so nothing needs a display.
+
+  latency     time from setting text on one clipboard until another host's
+              clipboard signals the change: server -> each peer, peer ->
+              server, and peer -> server -> the other peers (relayed)
+  throughput  payloads from 1 KiB to 50 MiB copied on the server, timed
+              until every peer has them; the payload is random base64 text,
+              which zlib barely shrinks
+  per peer    CPU seconds spent after connecting, peak RSS, engine counters
+
+Peers report what arrived on their stdout and are told what to copy on
+their stdin, so no clock is shared between processes; the pipe hop (tens
+of microseconds) is part of every number. The server's CPU time includes
+this script's own bookkeeping.
+
+Run from project root:
+
+    python tools/bench_clipsync.py [--peers N] [--count N] [--size BYTES]
+        [--sizes 1K,1M,50M] [--repeat N] [--password PW] [--json PATH] [--verbose]
+
+--json writes the results as JSON to PATH (- for stdout, the summary then
+goes to stderr) for comparing runs between releases. --verbose shows the
+peers' own output. Peak RSS needs os.wait4 (Linux, macOS).
+"""
+
+import argparse
+import base64
+import contextlib
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from PyQt6.QtCore import QCoreApplication, QEventLoop, QObject, QTimer, pyqtSignal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+import clipsync
+from cliphistory import ClipboardHistory
+from clipsync import MemoryClipboard
+from settings import config
+from uniclip import Uniclip
+
+DEFAULT_SIZES = '1K,10K,100K,1M,10M,50M'
+PREFIX = 'bench:'
+READY_TIMEOUT = 30.0
+SYNC_TIMEOUT = 300.0
+
+
+def parse_size(text):
+    units = {'K': 1024, 'M': 1024 ** 2}
+    text = text.strip().upper()
+    if text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def parse_sizes(text):
+    return [parse_size(size) for size in text.split(',')]
+
+
+def random_text(size):
+    return base64.b64encode(os.urandom(size * 3 // 4 + 3)).decode('ascii')[:size]
+
+
+def payload(tag, size, filler):
+    head = f'{PREFIX}{tag}:'
+    return head + filler[:max(0, size - len(head))]
+
+
+def tag_of(clipboard):
+    # Only the head, converting 50 MiB to a str just to read the tag would skew the timing
+    head = bytes(clipboard.mimeData().data('text/plain').left(64)).decode('ascii', 'replace')
+    if not head.startswith(PREFIX) or ':' not in head[len(PREFIX):]:
+        return None
+    return head[len(PREFIX):head.index(':', len(PREFIX))]
+
+
+def distribution(samples):
+    samples = sorted(samples)
+    if not samples:
+        return None
+
+    def percentile(p):
+        return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+    return {
+        'count': len(samples),
+        'min': samples[0],
+        'median': statistics.median(samples),
+        'mean': statistics.fmean(samples),
+        'p90': percentile(0.90),
+        'p95': percentile(0.95),
+        'p99': percentile(0.99),
+        'max': samples[-1],
+    }
+
+
+class LineReader(QObject):
+    """Lines from a pipe, handed to the GUI thread with the time they arrived."""
+    line = pyqtSignal(float, str)
+
+    def __init__(self, stream):
+        super().__init__()
+        self._stream = stream
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        for line in self._stream:
+            self.line.emit(time.perf_counter(), line.strip())
+        self.line.emit(time.perf_counter(), 'quit')
+
+
+def run_peer(address, password, max_bytes):
+    """--peer mode: a Uniclip client that reports arrivals as JSON lines."""
+    out = sys.stdout
+    sys.stdout = sys.stderr  # the engine's own prints must not mix with reports
+    app = QCoreApplication(sys.argv)
+    config.UNICLIP_PASSWORD = password
+    config.CLIPBOARD_MAX_BYTES = {'text/plain': max_bytes}
+    clipboard = MemoryClipboard()
+    uniclip = Uniclip(clipboard, ClipboardHistory(tempfile.mkdtemp(prefix='lcs-bench-')))
+    own = set()
+    cpu_at_ready = []
+
+    def report(**message):
+        out.write(json.dumps(message) + '\n')
+        out.flush()
+
+    def on_state(ip_port, state, detail):
+        if state == Uniclip.RUNNING and not cpu_at_ready:
+            cpu_at_ready.append(time.process_time())
+            report(event='ready')
+        elif state == Uniclip.FAILED:
+            report(event='failed', detail=detail)
+            app.quit()
+
+    def on_changed():
+        tag = tag_of(clipboard)
+        if tag is not None and tag not in own:
+            report(event='received', tag=tag)
+
+    def on_command(_, line):
+        command = line.split()
+        if command and command[0] == 'copy':
+            own.add(command[1])
+            size = int(command[2])
+            clipboard.setText(payload(command[1], size, random_text(size)))
+        elif command and command[0] == 'quit':
+            cpu = time.process_time() - cpu_at_ready[0] if cpu_at_ready else None
+            counters = uniclip.engine.stats()['total'] if uniclip.engine else None
+            report(event='done', cpu_s=cpu, counters=counters)
+            uniclip.stop_all()
+            app.quit()
+
+    uniclip.client_state_changed.connect(on_state)
+    clipboard.dataChanged.connect(on_changed)
+    commands = LineReader(sys.stdin)
+    commands.line.connect(on_command)
+    commands.start()
+    uniclip.start_client(address)
+    app.exec()
+
+
+class PeerProcess:
+    def __init__(self, index, address, password, max_bytes, verbose):
+        self.index = index
+        self.arrivals = {}  # tag -> time it reached this peer's clipboard
+        self.ready_at = None
+        self.failed = None
+        self.done = None
+        self.max_rss_mb = None
+        self.started = time.perf_counter()
+        self.proc = subprocess.Popen(
+            [sys.executable, __file__, '--peer', address, '--password', password, '--max-bytes', str(max_bytes)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+            stderr=None if verbose else subprocess.DEVNULL)
+        self.reader = LineReader(self.proc.stdout)
+        self.reader.line.connect(self._on_line)
+        self.reader.start()
+
+    def _on_line(self, at, line):
+        if not line.startswith('{'):
+            return
+        message = json.loads(line)
+        if message['event'] == 'ready':
+            self.ready_at = at
+        elif message['event'] == 'received':
+            self.arrivals[message['tag']] = at
+        elif message['event'] == 'failed':
+            self.failed = message['detail']
+        elif message['event'] == 'done':
+            self.done = message
+
+    def send(self, line):
+        self.proc.stdin.write(line + '\n')
+        self.proc.stdin.flush()
+
+    def finish(self, app):
+        self.send('quit')
+        try:
+            wait_for(app, lambda: self.done is not None, 10.0)
+        except TimeoutError:
+            self.done = {}
+        self.proc.stdin.close()
+        if hasattr(os, 'wait4'):
+            _, _, usage = os.wait4(self.proc.pid, 0)
+            self.proc.returncode = 0
+            # ru_maxrss is KiB on Linux and bytes on macOS
+            self.max_rss_mb = usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+        else:
+            self.proc.wait()
+
+
+def wait_for(app, condition, timeout):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError('Clipboard did not sync in time')
+        # Peer reports and engine hand-offs arrive as events, so this sleeps until one does
+        app.processEvents(QEventLoop.ProcessEventsFlag.WaitForMoreEvents)
+
+
+def run(app, peer_count, count, size, sizes, repeat, password, verbose):
+    max_bytes = max(sizes + [size]) + 1024
+    config.UNICLIP_PASSWORD = password
+    config.CLIPBOARD_MAX_BYTES = {'text/plain': max_bytes}
+    server_clipboard = MemoryClipboard()
+    # Each host's own history, away from the one the tray uses
+    server = Uniclip(server_clipboard, ClipboardHistory(tempfile.mkdtemp(prefix='lcs-bench-')))
+    port = int(server.start_server().rsplit(':', 1)[1])
+    arrivals = {}
+    server_clipboard.dataChanged.connect(lambda: arrivals.setdefault(tag_of(server_clipboard), time.perf_counter()))
+    # Keeps WaitForMoreEvents from sleeping through a timeout
+    ticker = QTimer()
+    ticker.start(100)
+
+    peers = [PeerProcess(i, f'127.0.0.1:{port}', password, max_bytes, verbose) for i in range(peer_count)]
+    try:
+        wait_for(app, lambda: all(p.ready_at or p.failed for p in peers), READY_TIMEOUT)
+    except TimeoutError:
+        raise SystemExit('Peers did not connect in time, run with --verbose to see why')
+    failed = [p.failed for p in peers if p.failed]
+    if failed:
+        raise SystemExit(f'Peer failed to connect: {failed[0]}')
+    cpu_start = time.process_time()
+
+    server_to_peer, peer_to_server, relayed = [], [], []
+    filler = random_text(size)
+    for i in range(count):
+        tag = f'l{i}'
+        start = time.perf_counter()
+        server_clipboard.setText(payload(tag, size, filler))
+        wait_for(app, lambda: all(tag in p.arrivals for p in peers), SYNC_TIMEOUT)
+        server_to_peer.extend((p.arrivals[tag] - start) * 1000 for p in peers)
+
+        tag = f'p{i}'
+        sender = peers[i % peer_count]
+        others = [p for p in peers if p is not sender]
+        start = time.perf_counter()
+        sender.send(f'copy {tag} {size}')
+        wait_for(app, lambda: tag in arrivals and all(tag in p.arrivals for p in others), SYNC_TIMEOUT)
+        peer_to_server.append((arrivals[tag] - start) * 1000)
+        relayed.extend((p.arrivals[tag] - start) * 1000 for p in others)
+
+    throughput = []
+    filler = random_text(max(sizes))
+    for n in sizes:
+        fan_out = []
+        for r in range(repeat):
+            tag = f't{n}-{r}'
+            start = time.perf_counter()
+            server_clipboard.setText(payload(tag, n, filler))
+            wait_for(app, lambda: all(tag in p.arrivals for p in peers), SYNC_TIMEOUT)
+            fan_out.append(max(p.arrivals[tag] for p in peers) - start)
+        seconds = statistics.median(fan_out)
+        throughput.append({'bytes': n, 'seconds': seconds, 'mib_per_s': n / seconds / 1024 ** 2,
+                           'runs': fan_out})
+
+    server_cpu = time.process_time() - cpu_start
+    for p in peers:
+        p.finish(app)
+    server_counters = server.engine.stats()['total']
+    server.stop_all()
+
+    return {
+        'benchmark': 'clipsync',
+        'time': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'protocol_version': clipsync.PROTOCOL_VERSION,
+        'params': {'peers': peer_count, 'count': count, 'size': size, 'sizes': sizes, 'repeat': repeat},
+        'spawn_to_ready_ms': distribution([(p.ready_at - p.started) * 1000 for p in peers]),
+        'latency_ms': {
+            'server_to_peer': distribution(server_to_peer),
+            'peer_to_server': distribution(peer_to_server),
+            'peer_to_peer_relayed': distribution(relayed),
+        },
+        'throughput': throughput,
+        'server': {'cpu_s': server_cpu, 'counters': server_counters},
+        'peers': [{'cpu_s': p.done.get('cpu_s'), 'max_rss_mb': p.max_rss_mb, 'counters': p.done.get('counters')}
+                  for p in peers],
+    }
+
+
+def print_summary(result, out):
+    params = result['params']
+    print(f"\n--- {params['peers']} peers, {params['count']} copies of {params['size']} bytes each way ---\n",
+          file=out)
+    print(f"  peer start to connected: median {result['spawn_to_ready_ms']['median']:8.1f} ms", file=out)
+    for name, d in result['latency_ms'].items():
+        if d is None:
+            continue  # nothing is relayed with a single peer
+        print(f"  {name + ':':22} median {d['median']:6.2f} ms   p95 {d['p95']:6.2f} ms   "
+              f"p99 {d['p99']:6.2f} ms   max {d['max']:6.2f} ms", file=out)
+    print(f"\n  {'size':>10}  {'to all peers':>12}  {'MiB/s':>8}", file=out)
+    for row in result['throughput']:
+        print(f"  {row['bytes']:>10}  {row['seconds'] * 1000:9.1f} ms  {row['mib_per_s']:8.1f}", file=out)
+    print(f"\n  server: {result['server']['cpu_s']:.2f} s CPU", file=out)
+    for i, peer in enumerate(result['peers']):
+        cpu = f"{peer['cpu_s']:.2f} s CPU" if peer['cpu_s'] is not None else 'CPU unknown'
+        rss = f"{peer['max_rss_mb']:.1f} MB peak RSS" if peer['max_rss_mb'] is not None else 'RSS unknown'
+        counters = peer['counters'] or {}
+        print(f"  peer {i}: {cpu}, {rss}, {counters.get('bytes_in', 0) / 1024 ** 2:.1f} MiB in", file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--peers', type=int, metavar='N', default=3, help='peer processes (default 3)')
+    parser.add_argument('--count', type=int, metavar='N', default=100, help='latency samples each way (default 100)')
+    parser.add_argument('--size', type=int, metavar='BYTES', default=64, help='bytes per latency sample (default 64)')
+    parser.add_argument('--sizes', type=parse_sizes, metavar='1K,1M,50M', default=DEFAULT_SIZES,
+                        help=f'throughput payload sizes (default {DEFAULT_SIZES})')
+    parser.add_argument('--repeat', type=int, metavar='N', default=3, help='copies per throughput size (default 3)')
+    parser.add_argument('--password', metavar='PW', default='lcs1234', help='clipboard password of every host')
+    parser.add_argument('--json', metavar='PATH', help='also write the results as JSON, - for stdout')
+    parser.add_argument('--verbose', action='store_true', help="show the peers' own output")
+    # Internal: how the benchmark starts its peer processes
+    parser.add_argument('--peer', metavar='ADDRESS', help=argparse.SUPPRESS)
+    parser.add_argument('--max-bytes', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.peer:
+        run_peer(args.peer, args.password, args.max_bytes)
+        return
+
+    app = QCoreApplication(sys.argv)
+    # With JSON on stdout, everything else goes to stderr
+    out = sys.stderr if args.json == '-' else sys.stdout
+    with contextlib.redirect_stdout(out):
+        result = run(app, args.peers, args.count, args.size, args.sizes, args.repeat, args.password, args.verbose)
+    print_summary(result, out)
+    if args.json == '-':
+        json.dump(result, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark edge-hit latency: time from the cursor sample that reaches the
+edge to the first HID packet leaving Flow.
+
+Replays a synthetic cursor trace (centre of the screen to the right edge)
+through ReplayCursorSource into Flow, with the fake HID backend standing in
+for the receiver, and reports the distribution over several runs. For
+comparison, the old 300 ms poll adds on average 150 ms (uniform 0-300 ms)
+before the edge is even seen.
+
+Run from project root (works headless):
+
+    QT_QPA_PLATFORM=offscreen python tools/bench_edge_latency.py [--runs N] [--rate HZ] [--speed PX_PER_S]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from PyQt6.QtCore import QEventLoop
+from PyQt6.QtWidgets import QApplication
+
+from flow import Flow
+from hid_transport import TransportPool, FakeHidBackend
+from input_source import ReplayCursorSource
+from settings import config
+from zones import default_target
+
+
+def synthetic_trace(start_x, end_x, y, rate, speed):
+    """Straight horizontal movement from start_x to end_x, sampled at rate Hz."""
+    samples = []
+    t = 0.0
+    x = float(start_x)
+    step = speed / rate
+    while x < end_x:
+        samples.append((t, int(x), y))
+        x += step
+        t += 1.0 / rate
+    samples.append((t, end_x, y))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, metavar='N', default=20, help='traces replayed (default 20)')
+    parser.add_argument('--rate', type=int, metavar='HZ', default=125, help='cursor samples per second (default 125)')
+    parser.add_argument('--speed', type=int, metavar='PX_PER_S', default=3000,
+                        help='cursor speed towards the edge (default 3000)')
+    args = parser.parse_args()
+    runs, rate, speed = args.runs, args.rate, args.speed
+
+    app = QApplication(sys.argv)
+    # In-memory overrides only, nothing is saved
+    config.TARGETS = [default_target('right', 1)]
+    config.REQUIRE_CTRL = False
+    # Wake-up pings would be counted as the switch write
+    config.WAKE_BAND_PX = 0
+
+    backend = FakeHidBackend()
+    transports = TransportPool(lambda receiver: backend)
+    latencies = []
+    for _ in range(runs):
+        source = ReplayCursorSource([])
+        flow = Flow(QApplication.screens(), source)
+        flow.transports = transports
+        source.samples = synthetic_trace(
+            (flow.leftmost_edge + flow.rightmost_edge) // 2, flow.rightmost_edge - 1,
+            (flow.topmost_edge + flow.bottommost_edge) // 2, rate, speed)
+        writes_before = len(backend.writes)
+        try:
+            flow.start()
+            while len(backend.writes) == writes_before or not source.finished():
+                app.processEvents(QEventLoop.ProcessEventsFlag.WaitForMoreEvents)
+        finally:
+            # Its switch worker and executors are threads; the pool reopens
+            # the fake receiver on the next run's first write
+            flow.close()
+
+        edge_hit = next(t for t, x, _ in source.emitted if x >= flow.rightmost_edge - 1)
+        latencies.append((backend.writes[writes_before][0] - edge_hit) * 1000)
+
+    print(f'\n--- Edge hit to first HID write, {runs} runs ({rate} Hz samples, {speed} px/s) ---\n')
+    print(f'  min:    {min(latencies):8.3f} ms')
+    print(f'  median: {statistics.median(latencies):8.3f} ms')
+    print(f'  max:    {max(latencies):8.3f} ms')
+    print('  300 ms poll, expected added delay: 150.000 ms mean, 300.000 ms worst case')
+
+
+if __name__ == '__main__':
+    main()
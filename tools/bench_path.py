@@ -0,0 +1,97 @@
+"""
+Micro-benchmark for the keep-awake cursor path generator.
+
+Times PathGenerator (NumPy Catmull-Rom, reused buffers) against the scipy
+splprep/splev B-spline it replaced, over the same random start/end points,
+and reports how far the two paths deviate from the straight line so the
+movement can be checked to look alike. scipy is no longer a dependency;
+without it only PathGenerator is timed.
+
+Run from project root:
+
+    python tools/bench_path.py [--count N] [--width PX] [--height PX]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from mouse_emulation import PathGenerator, point_dist
+
+
+def scipy_path(x1, y1, x2, y2, rng):
+    """The old MoveMouseThread path, kept here for comparison."""
+    from scipy import interpolate
+    cp = rng.randint(3, 5)
+    x = np.linspace(x1, x2, num=cp, dtype='int')
+    y = np.linspace(y1, y2, num=cp, dtype='int')
+    xr = [rng.randint(-10, 10) for _ in range(cp)]
+    yr = [rng.randint(-10, 10) for _ in range(cp)]
+    xr[0] = yr[0] = xr[-1] = yr[-1] = 0
+    x += xr
+    y += yr
+    degree = 3 if cp > 3 else cp - 1
+    tck, _ = interpolate.splprep([x, y], k=degree)
+    u = np.linspace(0, 1, num=2 + int(point_dist(x1, y1, x2, y2) / 50.0))
+    points = interpolate.splev(u, tck)
+    return np.column_stack([p.astype(int) for p in points])
+
+
+def deviation(points, x1, y1, x2, y2):
+    """Largest distance (px) of a path point from the straight start-end line."""
+    length = point_dist(x1, y1, x2, y2)
+    if length == 0:
+        return 0.0
+    cross = (x2 - x1) * (points[:, 1] - y1) - (y2 - y1) * (points[:, 0] - x1)
+    return float(np.abs(cross).max() / length)
+
+
+def bench(generate, endpoints, seed):
+    rng = random.Random(seed)
+    timings = []
+    deviations = []
+    for x1, y1, x2, y2 in endpoints:
+        start = time.perf_counter()
+        points = generate(x1, y1, x2, y2, rng)
+        timings.append((time.perf_counter() - start) * 1e6)
+        deviations.append(deviation(points, x1, y1, x2, y2))
+    return timings, deviations
+
+
+def report(name, timings, deviations):
+    print(f'  {name:<14} median {statistics.median(timings):8.1f} us   p95 '
+          f'{sorted(timings)[int(len(timings) * 0.95)]:8.1f} us   '
+          f'deviation median {statistics.median(deviations):5.1f} px, max {max(deviations):5.1f} px')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, metavar='N', default=2000, help='paths generated (default 2000)')
+    parser.add_argument('--width', type=int, metavar='PX', default=3840, help='desktop width (default 3840)')
+    parser.add_argument('--height', type=int, metavar='PX', default=1080, help='desktop height (default 1080)')
+    args = parser.parse_args()
+    count, width, height = args.count, args.width, args.height
+
+    rng = random.Random(7)
+    endpoints = [(rng.randint(0, width), rng.randint(0, height), rng.randint(0, width), rng.randint(0, height))
+                 for _ in range(count)]
+
+    generator = PathGenerator()
+    print(f'\n--- {count} paths on a {width}x{height} desktop ---\n')
+    report('PathGenerator', *bench(generator.generate, endpoints, 1))
+    try:
+        import scipy  # noqa: F401
+    except ImportError:
+        print('  scipy          not installed, skipped')
+    else:
+        report('scipy spline', *bench(scipy_path, endpoints, 1))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Measure cold start of the tray app: wall-clock time from launching
+`python src/main.py` until the tray icon is shown and the event loop runs,
+and the peak RSS of the process by then.
+
+The app is started with LCS_STARTUP_PROBE=1, which makes it print a marker
+and quit as soon as the tray is visible. Each run is a fresh interpreter.
+Exits with status 1 if the median time or the peak RSS is over budget, so
+it can gate changes that make startup heavier.
+
+Run from project root:
+
+    python tools/bench_startup.py [--runs N] [--budget-ms MS] [--budget-rss-mb MB] [--imports]
+
+--imports also prints the slowest imports of one run (python -X importtime).
+Peak RSS needs os.wait4 (Linux, macOS). Headless machines can use
+QT_QPA_PLATFORM=offscreen.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+MAIN = os.path.join(os.path.dirname(__file__), '..', 'src', 'main.py')
+MARKER = 'LCS_TRAY_VISIBLE'
+
+
+def run_once(extra_args=()):
+    """Return (seconds to tray visible, peak RSS in MB or None, stderr)."""
+    env = dict(os.environ, LCS_STARTUP_PROBE='1')
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, *extra_args, MAIN], env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    visible = None
+    for line in proc.stdout:
+        if line.startswith(MARKER):
+            visible = time.perf_counter() - start
+            break
+    proc.stdout.close()
+    rss_mb = None
+    if hasattr(os, 'wait4'):
+        _, _, usage = os.wait4(proc.pid, 0)
+        proc.returncode = 0
+        # ru_maxrss is KiB on Linux and bytes on macOS
+        rss_mb = usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    else:
+        proc.wait()
+    stderr = proc.stderr.read()
+    proc.stderr.close()
+    if visible is None:
+        raise RuntimeError('App exited before the tray was visible:\n' + stderr)
+    return visible, rss_mb, stderr
+
+
+def slowest_imports(stderr, count=15):
+    # -X importtime lines: "import time: self [us] | cumulative | imported package"
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative), name.rstrip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, metavar='N', default=5, help='cold starts (default 5)')
+    parser.add_argument('--budget-ms', type=float, metavar='MS', default=1000.0,
+                        help='median start time allowed (default 1000)')
+    parser.add_argument('--budget-rss-mb', type=float, metavar='MB', default=80.0,
+                        help='peak RSS allowed (default 80)')
+    parser.add_argument('--imports', action='store_true', help='also print the slowest imports of one run')
+    args = parser.parse_args()
+    runs, budget_ms, budget_rss_mb = args.runs, args.budget_ms, args.budget_rss_mb
+
+    timings = []
+    peaks = []
+    for _ in range(runs):
+        visible, rss_mb, _ = run_once()
+        timings.append(visible * 1000)
+        if rss_mb is not None:
+            peaks.append(rss_mb)
+
+    median = statistics.median(timings)
+    print(f'\n--- {runs} cold starts to tray visible ---\n')
+    print(f'  min:      {min(timings):8.1f} ms')
+    print(f'  median:   {median:8.1f} ms   (budget {budget_ms:.0f} ms)')
+    print(f'  max:      {max(timings):8.1f} ms')
+    peak = max(peaks) if peaks else None
+    if peak is not None:
+        print(f'  peak RSS: {peak:8.1f} MB   (budget {budget_rss_mb:.0f} MB)')
+    else:
+        print('  peak RSS: not available on this platform')
+
+    if args.imports:
+        _, _, stderr = run_once(['-X', 'importtime'])
+        print('\n  slowest imports (cumulative):')
+        for cumulative, name in slowest_imports(stderr):
+            print(f'    {cumulative / 1000:8.1f} ms  {name.strip()}')
+
+    over = median > budget_ms or (peak is not None and peak > budget_rss_mb)
+    print('\n  OVER BUDGET' if over else '\n  within budget')
+    return 1 if over else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+Measure channel switch latency through the HID transport.
+
+Runs a number of switches through the same code path Flow uses: each is
+submitted to a SwitchWorker, which hands it to its thread, writes all
+devices concurrently (one handle per receiver) and signals finished. Prints
+min/median/max per switch, from submit to finished, and the median write
+per device. --burst N submits N switches at once, alternating channels as
+when the cursor crosses edges back and forth, and times them until the
+last one finishes; the worker coalesces or cancels all but the last, which
+shows up in the outcomes. The fake backend
+needs no hardware and simulates --devices devices spread over --receivers
+receivers; the hidraw and hidapitester backends switch the devices
+configured in ~/.lcs_config/config.json.
+
+Run from project root:
+
+    python tools/bench_switch.py [--backend fake|hidraw|hidapitester] [--count N] [--latency SECONDS]
+                                 [--response ack|error|left|none] [--devices N] [--receivers N] [--burst N]
+
+--response sets what the fake device answers, to exercise timeouts and retries.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt6.QtCore import QCoreApplication
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from devices import DeviceRegistry, default_receiver
+from hid_transport import TransportPool, FakeHidBackend, create_backend
+from flow import CANCELLED, SwitchWorker
+from latency import SwitchTrace
+from settings import config
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=('fake', 'hidraw', 'hidapitester'), default='fake',
+                        help='HID backend (default fake)')
+    parser.add_argument('--count', type=int, metavar='N', default=100, help='switches (default 100)')
+    parser.add_argument('--latency', type=float, metavar='SECONDS', default=0.002,
+                        help='time each fake write takes (default 0.002)')
+    parser.add_argument('--response', choices=('ack', 'error', 'left', 'none'), default='ack',
+                        help='what the fake device answers (default ack)')
+    parser.add_argument('--devices', type=int, metavar='N', default=2, help='fake devices (default 2)')
+    parser.add_argument('--receivers', type=int, metavar='N', default=1, help='fake receivers (default 1)')
+    parser.add_argument('--burst', type=int, metavar='N', default=1,
+                        help='switches submitted at once (default 1)')
+    args = parser.parse_args()
+    backend_name, count, latency, response = args.backend, args.count, args.latency, args.response
+    device_count, receiver_count, burst = args.devices, args.receivers, args.burst
+
+    backends = []
+    if backend_name == 'fake':
+        def backend_factory(receiver):
+            backends.append(FakeHidBackend(latency=latency, response=None if response == 'none' else response))
+            return backends[-1]
+        receivers = [default_receiver(f'receiver{i + 1}') for i in range(receiver_count)]
+        devices = [{'name': f'device{i + 1}', 'receiver': receivers[i % receiver_count]['name'],
+                    'slot': i // receiver_count + 1, 'feature_index': 0x09} for i in range(device_count)]
+        registry = DeviceRegistry(receivers, devices)
+    else:
+        def backend_factory(receiver):
+            backends.append(create_backend(backend_name, receiver.get('path')))
+            return backends[-1]
+        registry = DeviceRegistry(config.RECEIVERS, config.DEVICES)
+    transports = TransportPool(backend_factory)
+
+    app = QCoreApplication(sys.argv)
+    executor = ThreadPoolExecutor(max_workers=8)
+    worker = SwitchWorker(executor, transports)
+    finished = []
+    worker.finished.connect(finished.append)
+    worker.start()
+
+    def commands(channel):
+        return [(name, registry.receiver(name), registry.switch_command(name, channel)) for name in registry.names()]
+
+    timings = []
+    device_timings = {name: [] for name in registry.names()}
+    outcomes = {}
+    for _ in range(count):
+        finished.clear()
+        start = time.perf_counter()
+        # The last switch of a burst always goes to channel 1
+        traces = [SwitchTrace(None, 1 + (burst - 1 - i) % 2) for i in range(burst)]
+        for trace in traces:
+            worker.submit(trace, commands(trace.channel))
+        # finished may be delivered on a pool thread or queued to this one
+        while len(finished) < burst:
+            app.processEvents()
+        timings.append((time.perf_counter() - start) * 1000)
+        for trace in traces:
+            for result in trace.results:
+                outcomes[result.outcome] = outcomes.get(result.outcome, 0) + 1
+                if result.outcome != CANCELLED:
+                    device_timings[result.device].append(result.duration * 1000)
+    worker.stop()
+    executor.shutdown()
+    transports.close()
+
+    switches = f'{count} bursts of {burst} switches' if burst > 1 else f'{count} switches'
+    print(f'\n--- {switches} of {len(registry.names())} device(s) on {len(backends)} receiver(s) '
+          f'via {backends[0].name} backend ---\n')
+    print(f'  min:    {min(timings):8.3f} ms')
+    print(f'  median: {statistics.median(timings):8.3f} ms')
+    print(f'  max:    {max(timings):8.3f} ms')
+    for device, values in device_timings.items():
+        print(f'  {device} median: {statistics.median(values):8.3f} ms')
+    print(f'  outcomes: {outcomes}')
+    if backend_name == 'fake':
+        print(f'  handles opened {sum(backend.open_count for backend in backends)} time(s)')
+
+
+if __name__ == '__main__':
+    main()
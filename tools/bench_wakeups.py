@@ -0,0 +1,99 @@
+"""
+Count how often the app's periodic work wakes the process per hour: once
+with every task on its own timer (how it used to be) and once with all of
+them on the shared Scheduler, which lets tasks due close together share a
+wakeup within their slack.
+
+Time is simulated, so an hour takes well under a second. The task set and
+slacks are the ones the app registers; pick which subsystems are running:
+
+Run from project root:
+
+    python tools/bench_wakeups.py [--hours N] [--poll] [--emulation]
+
+--poll       Flow with the 300 ms polling cursor source (no evdev)
+--emulation  Keep Me Awake by cursor emulation (idle check every 45 s, F15 every 30 s)
+
+With no flags both are included. The headless daemon adds no periodic
+task of its own: signals wake it through a socket.
+"""
+
+import argparse
+import os
+import sys
+
+from PyQt6.QtCore import QCoreApplication
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from scheduler import Scheduler
+
+
+class VirtualClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def add_tasks(scheduler, poll, emulation):
+    if poll:
+        scheduler.add('cursor poll', lambda: None, 0.3).start()
+    if emulation:
+        # A user who stays away: the idle check re-arms itself a threshold ahead
+        idle_check = scheduler.add('idle check', lambda: idle_check.start(45), slack=1.0)
+        idle_check.start(45)
+        scheduler.add('F15 keypress', lambda: None, 30, slack=5.0).start()
+
+
+def independent_wakeups(scheduler, seconds):
+    """Each task on its own exact timer wakes once per run."""
+    total = 0
+    for task in scheduler.tasks:
+        period = task.interval or 45
+        total += int(seconds / period)
+    return total
+
+
+def simulate(scheduler, clock, seconds):
+    wakeups = 0
+    while True:
+        wakeup = scheduler.next_wakeup()
+        if wakeup is None or wakeup > seconds:
+            return wakeups
+        clock.now = wakeup
+        scheduler.run_due(wakeup)
+        wakeups += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hours', type=float, metavar='N', default=1.0, help='simulated hours (default 1)')
+    parser.add_argument('--poll', action='store_true', help='Flow with the polling cursor source')
+    parser.add_argument('--emulation', action='store_true', help='Keep Me Awake by cursor emulation')
+    args = parser.parse_args()
+    hours = args.hours
+    chosen = [args.poll, args.emulation]
+    if not any(chosen):
+        chosen = [True, True]
+
+    app = QCoreApplication(sys.argv)  # noqa: F841, the scheduler owns a QTimer
+    clock = VirtualClock()
+    scheduler = Scheduler(clock)
+    add_tasks(scheduler, *chosen)
+    seconds = hours * 3600
+    before = independent_wakeups(scheduler, seconds)
+    after = simulate(scheduler, clock, seconds)
+
+    print(f"\n--- wakeups per hour, tasks: {', '.join(task.name for task in scheduler.tasks)} ---\n")
+    print(f'  separate timers: {before / hours:10.0f}')
+    print(f'  scheduler:       {after / hours:10.0f}   ({(1 - after / before) * 100:.1f}% fewer)')
+    print()
+    for task in scheduler.tasks:
+        stats = task.stats()
+        print(f"  {task.name:<14} {stats['runs'] / hours:8.0f} runs/h, mean {stats['mean_late_ms']:.1f} ms late "
+              f"(slack {task.slack * 1000:.0f} ms)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Check the freedesktop ScreenSaver inhibitor end to end: Inhibit must hand
+back a cookie, and stop() must call UnInhibit with that same cookie as a
+uint32.
+
+The desktop's own screensaver is left alone. The script re-runs itself
+under dbus-run-session, on a private session bus, where a stand-in
+org.freedesktop.ScreenSaver service logs the calls it gets. The stand-in
+runs in a child process: the inhibitor's calls block until answered, so a
+service in the same process could never answer them.
+
+Run from project root:
+
+    python tools/check_inhibit.py
+
+Needs dbus-run-session (from the dbus package) and QtDBus. Exits with
+status 1 if the round trip fails.
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+
+from PyQt6.QtCore import QCoreApplication, QObject, pyqtClassInfo, pyqtSlot
+from PyQt6.QtDBus import QDBusAbstractAdaptor, QDBusConnection
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from inhibit import ScreenSaverInhibitor
+
+# In the int32 range, where a cookie sent back as a plain Python int goes
+# out as an int32 and, like the real service, the stand-in refuses it
+FIRST_COOKIE = 42
+
+
+@pyqtClassInfo('D-Bus Interface', ScreenSaverInhibitor.INTERFACE)
+class ScreenSaverStandIn(QDBusAbstractAdaptor):
+    """Hands out cookies and prints every call on stdout."""
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.next_cookie = FIRST_COOKIE
+
+    @pyqtSlot(str, str, result='uint')
+    def Inhibit(self, application, reason):
+        cookie = self.next_cookie
+        self.next_cookie += 1
+        print(f'Inhibit {cookie}', flush=True)
+        return cookie
+
+    @pyqtSlot('uint')
+    def UnInhibit(self, cookie):
+        print(f'UnInhibit {cookie}', flush=True)
+
+
+def run_stand_in():
+    """--stand-in mode: serve org.freedesktop.ScreenSaver until killed."""
+    app = QCoreApplication(sys.argv)
+    service = QObject()
+    ScreenSaverStandIn(service)
+    bus = QDBusConnection.sessionBus()
+    if not (bus.registerObject(ScreenSaverInhibitor.PATH, service)
+            and bus.registerService(ScreenSaverInhibitor.SERVICE)):
+        print(f'Cannot register {ScreenSaverInhibitor.SERVICE}: {bus.lastError().message()}', file=sys.stderr)
+        sys.exit(1)
+    print('ready', flush=True)
+    app.exec()
+
+
+def check():
+    """--session mode: drive ScreenSaverInhibitor against the stand-in."""
+    app = QCoreApplication(sys.argv)  # noqa: F841, QtDBus needs one
+    stand_in = subprocess.Popen([sys.executable, __file__, '--stand-in'], stdout=subprocess.PIPE, text=True)
+    cookie = None
+    try:
+        if stand_in.stdout.readline().strip() != 'ready':
+            print('Stand-in ScreenSaver service did not start')
+            return False
+        if not ScreenSaverInhibitor.available():
+            print(f'{ScreenSaverInhibitor.SERVICE} not found on the session bus')
+            return False
+        inhibitor = ScreenSaverInhibitor()
+        try:
+            inhibitor.start()
+        except OSError as e:
+            print(f'Inhibit failed: {e}')
+            return False
+        cookie = inhibitor._cookie
+        print(f'  Inhibit returned cookie {cookie}')
+        inhibitor.stop()
+    finally:
+        stand_in.terminate()
+        calls = [line.split() for line in stand_in.communicate()[0].splitlines()]
+    uninhibited = [int(call[1]) for call in calls if call[0] == 'UnInhibit']
+    if not uninhibited:
+        print('  UnInhibit never arrived (the cookie must be sent as a uint32)')
+        return False
+    print(f"  UnInhibit got cookie {', '.join(map(str, uninhibited))}")
+    if uninhibited != [cookie]:
+        print('  UnInhibit did not get the cookie Inhibit returned')
+        return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    # Internal: how the check re-runs itself on the private bus
+    parser.add_argument('--stand-in', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--session', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.stand_in:
+        run_stand_in()
+        return
+    if args.session:
+        ok = check()
+        print('OK' if ok else 'FAILED')
+        sys.exit(0 if ok else 1)
+    dbus_run_session = shutil.which('dbus-run-session')
+    if dbus_run_session is None:
+        print('dbus-run-session not found, it comes with the dbus package')
+        sys.exit(1)
+    sys.exit(subprocess.call([dbus_run_session, '--', sys.executable, __file__, '--session']))
+
+
+if __name__ == '__main__':
+    main()
@@ -7,12 +7,13 @@ Step 2: Query each device for the Change Host (0x1814) feature index.
 
 Run from project root:
 
-    python tools/probe_devices.py [--protocol bolt|unifying] [VID:PID]
+    python tools/probe_devices.py [--protocol bolt|unifying] [--debug] [VID:PID]
 
 Default: Bolt protocol with VID:PID 046D:C548.
 For Unifying: python tools/probe_devices.py --protocol unifying 046D:C52B
 """
 
+import argparse
 import subprocess
 import sys
 import os
@@ -159,24 +160,15 @@ def query_feature_index(exec_path, vidpid, protocol, device_index, feature_id):
 
 
 def main():
-    protocol = 'bolt'
-    vidpid = '046D:C548'
-
-    debug = False
-    args = sys.argv[1:]
-    if '--debug' in args:
-        debug = True
-        args.remove('--debug')
-    if '--protocol' in args:
-        idx = args.index('--protocol')
-        protocol = args[idx + 1]
-        args = args[:idx] + args[idx + 2:]
-
-    if args:
-        vidpid = args[0]
-
-    if protocol == 'unifying' and vidpid == '046D:C548':
-        vidpid = '046D:C52B'
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--protocol', choices=('bolt', 'unifying'), default='bolt',
+                        help='receiver protocol (default bolt)')
+    parser.add_argument('--debug', action='store_true', help="print hidapitester's raw output")
+    parser.add_argument('vidpid', nargs='?', metavar='VID:PID',
+                        help='receiver to probe (default 046D:C548, 046D:C52B for unifying)')
+    args = parser.parse_args()
+    protocol, debug = args.protocol, args.debug
+    vidpid = args.vidpid or ('046D:C52B' if protocol == 'unifying' else '046D:C548')
 
     exec_path = get_hidapitester()
     print(f'Probe v{VERSION} — Probing receiver {vidpid} (protocol: {protocol})')
@@ -233,12 +225,9 @@ def main():
             print(f'  Device index (RECEIVER_SLOT): {dev_idx}')
             print(f'  Change Host feature index (DEVICE_ID): {feat_idx} (0x{feat_idx:02X})')
             print()
-        print('Use these values in config.json:')
-        if len(results) >= 2:
-            print(f'  KB_RECEIVER_SLOT: {results[0][0]}, KEYBOARD_ID: {results[0][1]}')
-            print(f'  MS_RECEIVER_SLOT: {results[1][0]}, MOUSE_ID: {results[1][1]}')
-        elif len(results) == 1:
-            print(f'  RECEIVER_SLOT: {results[0][0]}, DEVICE_ID: {results[0][1]}')
+        print('Use these values in the Settings devices table (or DEVICES in config.json):')
+        for dev_idx, feat_idx in results:
+            print(f'  Receiver Slot: {dev_idx:02X}, Change Host Feature Index: {feat_idx:02X}')
     else:
         print('  No devices with Change Host support found.')
 
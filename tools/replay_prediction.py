@@ -0,0 +1,131 @@
+"""
+Offline replay test for predictive switching.
+
+Feeds cursor traces through PredictiveTrigger (no Qt, no hardware) and
+reports, per minimum speed setting:
+
+  false positive rate  commits after which the cursor never reached the
+                       predicted target within --horizon seconds
+  miss rate            edge hits that were not predicted
+  hidden latency       how long before the real edge hit the switch fired
+
+Traces are JSON lists of [seconds, x, y] samples, the same format
+ReplayCursorSource loads. Without trace files a reproducible synthetic set
+is generated: straight and curved throws at the right edge, plus movements
+that turn away before reaching it.
+
+Run from project root:
+
+    python tools/replay_prediction.py [--lead MS] [--horizon S] [--speeds 400,800,1600] [trace.json ...]
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from prediction import PredictiveTrigger
+from zones import ZoneIndex, default_target
+
+WIDTH, HEIGHT = 1920, 1080
+RATE = 125
+
+
+def synthetic_traces(count=400, seed=1):
+    rng = random.Random(seed)
+    traces = []
+    for i in range(count):
+        turn_away = i % 3 == 0
+        x, y = rng.uniform(200, 1400), rng.uniform(100, HEIGHT - 100)
+        speed = rng.uniform(500, 4000)
+        heading = rng.uniform(-0.6, 0.6)
+        curve = rng.uniform(-2.0, 2.0)
+        turn_at = rng.uniform(20, 300)
+        samples = []
+        t = 0.0
+        while 0 < x < WIDTH - 1 and 0 < y < HEIGHT - 1 and t < 3.0:
+            samples.append((t, int(x), int(y)))
+            if turn_away and WIDTH - x < turn_at:
+                heading += rng.uniform(0.3, 0.6) * (1 if curve >= 0 else -1)
+            heading += curve / RATE
+            x += math.cos(heading) * speed / RATE + rng.gauss(0, 1.5)
+            y += math.sin(heading) * speed / RATE + rng.gauss(0, 1.5)
+            t += 1.0 / RATE
+        samples.append((t, int(min(max(x, 0), WIDTH - 1)), int(min(max(y, 0), HEIGHT - 1))))
+        traces.append(samples)
+    return traces
+
+
+def replay(traces, zone_index, min_speed, lead, horizon):
+    commits = false_positives = edge_hits = missed = 0
+    hidden = []
+    for samples in traces:
+        trigger = PredictiveTrigger(min_speed)
+        committed = None
+        for t, x, y in samples:
+            hit = zone_index.lookup(x, y)
+            if hit is not None:
+                edge_hits += 1
+                if committed and committed[0] is hit and t - committed[1] <= horizon:
+                    hidden.append(t - committed[1])
+                else:
+                    missed += 1
+                break
+            target = trigger.update(t, x, y, zone_index, lead)
+            if target is not None and committed is None:
+                commits += 1
+                committed = (target, t)
+        if committed and not any(zone_index.lookup(x, y) is committed[0]
+                                 for t, x, y in samples if committed[1] <= t <= committed[1] + horizon):
+            false_positives += 1
+    return {
+        'commits': commits,
+        'false_positives': false_positives,
+        'false_positive_rate': false_positives / commits if commits else 0.0,
+        'edge_hits': edge_hits,
+        'miss_rate': missed / edge_hits if edge_hits else 0.0,
+        'hidden_latency_ms': 1000 * sum(hidden) / len(hidden) if hidden else 0.0,
+    }
+
+
+def parse_speeds(value):
+    try:
+        return [int(speed) for speed in value.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'not a comma separated list of speeds: {value}') from None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lead', type=float, metavar='MS', default=50.0,
+                        help='how far ahead of the edge hit to switch (default 50)')
+    parser.add_argument('--horizon', type=float, metavar='S', default=0.5,
+                        help='time the cursor has to reach a predicted target (default 0.5)')
+    parser.add_argument('--speeds', type=parse_speeds, metavar='400,800,1600', default=[400, 800, 1600, 3200],
+                        help='minimum speed settings to compare, px/s (default 400,800,1600,3200)')
+    parser.add_argument('traces', nargs='*', metavar='trace.json', help='recorded traces (default: synthetic)')
+    args = parser.parse_args()
+    lead, horizon, speeds = args.lead / 1000, args.horizon, args.speeds
+
+    if args.traces:
+        traces = []
+        for path in args.traces:
+            with open(path) as f:
+                traces.append([tuple(sample) for sample in json.load(f)])
+    else:
+        traces = synthetic_traces()
+
+    zone_index = ZoneIndex([default_target('right', 1)], 0, WIDTH, 0, HEIGHT)
+    print(f'Replaying {len(traces)} traces, lead {lead * 1000:.0f} ms, horizon {horizon:.2f} s\n')
+    print(f"  {'min speed':>10}  {'commits':>7}  {'FP rate':>7}  {'miss rate':>9}  {'hidden ms':>9}")
+    for min_speed in speeds:
+        r = replay(traces, zone_index, min_speed, lead, horizon)
+        print(f"  {min_speed:>10}  {r['commits']:>7}  {r['false_positive_rate']:>7.1%}  "
+              f"{r['miss_rate']:>9.1%}  {r['hidden_latency_ms']:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()